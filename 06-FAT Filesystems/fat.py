@@ -6,7 +6,8 @@
 import struct
 import sys
 import os.path
-from mbr import Mbr
+import optparse
+from volumes import selectVolumes, addPartitionOption, FAT_FILESYSTEMS
 from vbr import Vbr
 
 __all__=['Fat']
@@ -80,55 +81,44 @@ def usage():
    exit(1)
 
 def main():
-   if len(sys.argv) < 2: 
+   parser=optparse.OptionParser(usage='%prog <image file>')
+   addPartitionOption(parser)
+   (options, args)=parser.parse_args()
+   if len(args) < 1: 
      usage()
 
-   notsupParts = [0x05, 0x0f, 0x85, 0x91, 0x9b, 0xc5, 0xe4, 0xee]
-   swapParts = [0x42, 0x82, 0xb8, 0xc3, 0xfc]
-
-   # read first sector
-   if not os.path.isfile(sys.argv[1]):
-      print("File " + sys.argv[1] + " cannot be openned for reading")
+   if not os.path.isfile(args[0]):
+      print("File " + args[0] + " cannot be openned for reading")
       exit(1)
 
-   with open(sys.argv[1], 'rb') as f:
-      sector = f.read(512)
-
-   mbr=Mbr(sector) # create MBR object
-
-   if mbr.validSignature():
-      print("Looks like a MBR or VBR")
-      mbr.prettyPrint()
+   # the partition tables are only read once per image
+   try:
+      partitions=selectVolumes(args[0], options.partition, FAT_FILESYSTEMS)
+   except ValueError as e:
+      print(e)
+      exit(1)
 
-      for i in range(1,5):
-         if not mbr.isEmpty(i):
-           if mbr.partitionType(i) in notsupParts:
-              print("Sorry GPT and extended partitions are not supported by this script!")
-           else:
-              if mbr.partitionType(i) in swapParts:
-                 print("Skipping swap partition")
-              else:
-                 # let's try and read the VBR
-                 with open(sys.argv[1], 'rb') as f:
-                    f.seek(mbr.reservedSectors(i)*512)
-                    sector=f.read(512)
-                    vbr=Vbr(sector)
-                    if vbr.validSignature():
-                       print('Found Volume with type', vbr.filesystemType())
-                       print('Volume label:', vbr.volumeLabel())
-                       print('Total sectors:', vbr.totalSectors())
-                       s=vbr.sectorFromCluster(14)
-                       print('Cluster 14:', s)
-                       print('Sector:', vbr.clusterFromSector(s))
-                       # grab the FAT
-                       f.seek(mbr.reservedSectors(i)*512+
-                           vbr.sectorFat1()*512)
-                       fatRaw=f.read(512*vbr.sectorsPerFat())
-                       fat=Fat(fatRaw)
-                       print('Cluster 3 allocated:',fat.isAllocated(3))
-                       print('Chain starting at 3:',fat.clusterChain(3))
-   else:
-      print("Doesn't appear to contain valid MBR")
+   for partition in partitions:
+      print('Partition', partition)
+      # let's try and read the VBR
+      with open(args[0], 'rb') as f:
+         f.seek(partition.offset())
+         sector=f.read(512)
+         vbr=Vbr(sector)
+         if vbr.validSignature():
+            print('Found Volume with type', vbr.filesystemType())
+            print('Volume label:', vbr.volumeLabel())
+            print('Total sectors:', vbr.totalSectors())
+            s=vbr.sectorFromCluster(14)
+            print('Cluster 14:', s)
+            print('Sector:', vbr.clusterFromSector(s))
+            # grab the FAT
+            f.seek(partition.offset()+
+                vbr.sectorFat1()*512)
+            fatRaw=f.read(512*vbr.sectorsPerFat())
+            fat=Fat(fatRaw)
+            print('Cluster 3 allocated:',fat.isAllocated(3))
+            print('Chain starting at 3:',fat.clusterChain(3))
  
 if __name__ == "__main__":
    main()        
@@ -0,0 +1,446 @@
+#!/usr/bin/python3
+
+'''Partition discovery shared by the mounting, FAT
+and NTFS scripts.  MBR tables (with the chain of
+extended boot records for logical partitions) and
+GPT tables (primary header with the backup used if
+the primary is damaged, any number and size of
+entries) are read and the first sector of every
+partition checked for a NTFS, FAT or exFAT boot
+sector.  The result is cached per image so a script
+only reads the tables once however many times it
+asks.
+
+Primary MBR partitions are numbered 1-4 and logical
+partitions from 5, GPT partitions are numbered by
+their entry starting from 1.  An image that starts
+with a boot sector (a volume image) has a single
+partition 0.
+Created by Dr. Phil Polstra
+for PentesterAcademy.com'''
+
+__all__=['Partition', 'VolumeSystem', 'openVolumeSystem', 'volumeOffset',
+	'selectVolumes', 'addPartitionOption', 'filesystemType', 'guidString',
+	'NTFS_FILESYSTEMS', 'FAT_FILESYSTEMS']
+
+import os
+import sys
+import zlib
+import struct
+import optparse
+
+SECTOR_SIZE=512
+# enough for the MBR, a GPT header and 128 entries with
+# 512 or 4096 byte sectors
+HEAD_SIZE=65536
+MAX_GPT_ENTRIES=65536
+MAX_LOGICAL_PARTITIONS=1024
+
+EXTENDED_TYPES=(0x05, 0x0F, 0x85, 0x91, 0x9B, 0xC5, 0xE4)
+PROTECTIVE_TYPE=0xEE
+
+NTFS_FILESYSTEMS=('NTFS',)
+FAT_FILESYSTEMS=('FAT12', 'FAT16', 'FAT32', 'FAT')
+
+MBR_TYPES={0x01:'FAT12', 0x04:'FAT16 <32M', 0x05:'Extended', 0x06:'FAT16',
+	0x07:'NTFS/exFAT', 0x0B:'FAT32', 0x0C:'FAT32 LBA', 0x0E:'FAT16 LBA',
+	0x0F:'Extended LBA', 0x11:'Hidden FAT12', 0x14:'Hidden FAT16', 0x17:'Hidden NTFS',
+	0x1B:'Hidden FAT32', 0x1C:'Hidden FAT32 LBA', 0x27:'Windows RE', 0x42:'LDM',
+	0x82:'Linux swap', 0x83:'Linux', 0x85:'Linux extended', 0x8E:'Linux LVM',
+	0xA5:'FreeBSD', 0xA6:'OpenBSD', 0xA8:'Mac OS X', 0xAF:'HFS+', 0xEE:'GPT protective',
+	0xEF:'EFI system', 0xFD:'Linux RAID'}
+
+GPT_TYPES={'EBD0A0A2-B9E5-4433-87C0-68B6B72699C7':'Basic data',
+	'C12A7328-F81F-11D2-BA4B-00A0C93EC93B':'EFI system',
+	'E3C9E316-0B5C-4DB8-817D-F92DF00215AE':'Microsoft reserved',
+	'DE94BBA4-06D1-4D40-A16A-BFD50179D6AC':'Windows RE',
+	'5808C8AA-7E8F-42E0-85D2-E1E90434CFB3':'LDM metadata',
+	'AF9B60A0-1431-4F62-BC68-3311714A69AD':'LDM data',
+	'E75CAF8F-F680-4CEE-AFA3-B001E56EFC2D':'Storage Spaces',
+	'0FC63DAF-8483-4772-8E79-3D69D8477DE4':'Linux',
+	'0657FD6D-A4AB-43C4-84E5-0933C84B4F4F':'Linux swap',
+	'E6D6D379-F507-44C2-A23C-238F2A3DF928':'Linux LVM',
+	'A19D880F-05FC-4D3B-A006-743F0F84911E':'Linux RAID',
+	'21686148-6449-6E6F-744E-656564454649':'BIOS boot',
+	'48465300-0000-11AA-AA11-00306543ECAC':'HFS+',
+	'7C3457EF-0000-11AA-AA11-00306543ECAC':'APFS',
+	'516E7CB4-6ECF-11D6-8FF8-00022D09712B':'FreeBSD'}
+
+def guidString(buffer):
+	'''Text form of a GUID stored with its first three
+	parts little endian.'''
+	if len(buffer)!=16:
+		return '<invalid>'
+	first, second, third=struct.unpack('<LHH', buffer[0:8])
+	return '%08X-%04X-%04X-%s-%s' % (first, second, third, buffer[8:10].hex().upper(),
+		buffer[10:16].hex().upper())
+
+def filesystemType(sector):
+	'''Filesystem whose boot sector this is: NTFS, exFAT,
+	FAT12, FAT16, FAT32, FAT or an empty string.'''
+	if len(sector) < 512:
+		return ''
+	if sector[3:11]==b'NTFS    ':
+		return 'NTFS'
+	if sector[3:11]==b'EXFAT   ':
+		return 'exFAT'
+	if sector[510:512]==b'\x55\xAA':
+		if sector[82:87]==b'FAT32':
+			return 'FAT32'
+		if sector[54:59] in (b'FAT12', b'FAT16'):
+			return sector[54:59].decode('ascii')
+		if sector[54:57]==b'FAT':
+			return 'FAT'
+	return ''
+
+class Partition:
+	'''One partition found in a partition table.'''
+	def __init__(self, number, scheme, start, length, typeCode, sectorSize=SECTOR_SIZE,
+					name='', guid='', bootable=False):
+		self._number=number
+		self._scheme=scheme
+		self._start=start
+		self._length=length
+		self._typeCode=typeCode
+		self._sectorSize=sectorSize
+		self._name=name
+		self._guid=guid
+		self._bootable=bootable
+		self._filesystem=''
+
+	def number(self):
+		return self._number
+
+	def scheme(self):
+		'''MBR, GPT or Volume for a volume image.'''
+		return self._scheme
+
+	def start(self):
+		'''First sector in the table's sector size.'''
+		return self._start
+
+	def length(self):
+		'''Number of sectors in the table's sector size.'''
+		return self._length
+
+	def sectorSize(self):
+		return self._sectorSize
+
+	def offset(self):
+		'''Offset in bytes from the start of the image.'''
+		return self._start * self._sectorSize
+
+	def size(self):
+		return self._length * self._sectorSize
+
+	def startSector(self):
+		'''Start in 512 byte sectors as used by -o.'''
+		return self.offset() // SECTOR_SIZE
+
+	def typeCode(self):
+		'''Partition type byte for MBR or type GUID for GPT.'''
+		return self._typeCode
+
+	def typeName(self):
+		if self._scheme=='GPT':
+			return GPT_TYPES.get(self._typeCode, self._typeCode)
+		if self._scheme=='MBR':
+			return MBR_TYPES.get(self._typeCode, '%02X' % self._typeCode)
+		return ''
+
+	def name(self):
+		'''GPT partition name.'''
+		return self._name
+
+	def guid(self):
+		'''GPT unique partition GUID.'''
+		return self._guid
+
+	def isBootable(self):
+		return self._bootable
+
+	def isExtended(self):
+		return self._scheme=='MBR' and self._typeCode in EXTENDED_TYPES
+
+	def filesystem(self):
+		'''Filesystem found in the first sector (see
+		filesystemType()).'''
+		return self._filesystem
+
+	def setFilesystem(self, filesystem):
+		self._filesystem=filesystem
+
+	def __str__(self):
+		retStr=(str(self._number) + ': ' + self.typeName() + ' at sector ' +
+			str(self.startSector()) + ', ' + str(self.size() // 1048576) + ' MB')
+		if self._filesystem:
+			retStr+=' (' + self._filesystem + ')'
+		if self._name:
+			retStr+=' "' + self._name + '"'
+		return retStr
+
+class VolumeSystem:
+	'''The partitions of an image.  Use openVolumeSystem()
+	to get a cached one.  Problems found with the tables
+	are kept as warnings rather than raised.'''
+	def __init__(self, imageFilename):
+		self._imageFilename=imageFilename
+		self._partitions=[]
+		self._warnings=[]
+		self._scheme=None
+		self._sectorSize=SECTOR_SIZE
+		self._imageSize=os.path.getsize(imageFilename)
+		with open(imageFilename, 'rb') as f:
+			self._f=f
+			self._head=f.read(HEAD_SIZE)
+			self._readTables()
+			for partition in self._partitions:
+				if not partition.isExtended():
+					partition.setFilesystem(filesystemType(self._read(partition.offset(),
+						SECTOR_SIZE)))
+		self._f=None
+		self._head=None
+
+	def _read(self, offset, size):
+		'''Reads from the head buffer when it can so the
+		tables normally cost one read.'''
+		if offset + size <= len(self._head):
+			return self._head[offset:offset+size]
+		self._f.seek(offset)
+		return self._f.read(size)
+
+	def _readTables(self):
+		if filesystemType(self._head[0:SECTOR_SIZE]):
+			# a volume image has no partition table
+			self._scheme='Volume'
+			partition=Partition(0, 'Volume', 0, self._imageSize // SECTOR_SIZE, 0)
+			self._partitions.append(partition)
+			return
+		protective=(self._head[510:512]==b'\x55\xAA' and
+			PROTECTIVE_TYPE in [e[1] for e in self._mbrEntries(self._head)])
+		for sectorSize in (512, 4096):
+			if self._read(sectorSize, 8)==b'EFI PART':
+				self._sectorSize=sectorSize
+				self._scheme='GPT'
+				if not protective:
+					self._warnings.append('GPT found without a protective MBR')
+				self._readGpt()
+				return
+		if protective:
+			# the primary header is gone, try the backup
+			self._scheme='GPT'
+			self._readGpt()
+		elif self._head[510:512]==b'\x55\xAA':
+			self._scheme='MBR'
+			self._readMbr()
+
+	def _gptHeader(self, lba):
+		'''Returns the header fields as a dictionary or None
+		if the header at lba is missing or its CRC is bad.'''
+		sector=self._read(lba * self._sectorSize, self._sectorSize)
+		if len(sector) < 92 or sector[0:8]!=b'EFI PART':
+			return None
+		(revision, headerSize, crc, reserved, currentLba, backupLba, firstUsable,
+			lastUsable, diskGuid, entriesLba, numEntries, entrySize,
+			entriesCrc)=struct.unpack_from('<LLLLQQQQ16sQLLL', sector, 8)
+		if headerSize < 92 or headerSize > len(sector):
+			return None
+		check=bytearray(sector[0:headerSize])
+		check[16:20]=b'\x00\x00\x00\x00'
+		if zlib.crc32(bytes(check))!=crc:
+			return None
+		return {'currentLba':currentLba, 'backupLba':backupLba, 'entriesLba':entriesLba,
+			'numEntries':numEntries, 'entrySize':entrySize, 'entriesCrc':entriesCrc,
+			'diskGuid':guidString(diskGuid)}
+
+	def _readGpt(self):
+		primary=self._gptHeader(1)
+		lastLba=self._imageSize // self._sectorSize - 1
+		backupLba=primary['backupLba'] if primary else lastLba
+		backup=self._gptHeader(backupLba) if backupLba <= lastLba else None
+		if backup==None and backupLba!=lastLba:
+			backup=self._gptHeader(lastLba)
+		if primary==None:
+			self._warnings.append('Primary GPT header is damaged')
+		if backup==None:
+			self._warnings.append('Backup GPT header is missing or damaged')
+		self._diskGuid=''
+		for header in (primary, backup):
+			if header==None:
+				continue
+			entries=self._gptEntries(header)
+			if entries==None:
+				self._warnings.append('GPT entries at LBA ' + str(header['entriesLba']) +
+					' do not match their CRC')
+				continue
+			if header is backup:
+				self._warnings.append('Partitions were read from the backup GPT')
+			self._diskGuid=header['diskGuid']
+			self._parseGptEntries(entries, header['entrySize'])
+			return
+
+	def _gptEntries(self, header):
+		'''Entry array for a header or None if its CRC does
+		not match.'''
+		numEntries=min(header['numEntries'], MAX_GPT_ENTRIES)
+		entrySize=header['entrySize']
+		if entrySize < 128 or entrySize % 8:
+			return None
+		entries=self._read(header['entriesLba'] * self._sectorSize, numEntries * entrySize)
+		if zlib.crc32(entries)!=header['entriesCrc']:
+			return None
+		return entries
+
+	def _parseGptEntries(self, entries, entrySize):
+		for i in range(len(entries) // entrySize):
+			entry=entries[i*entrySize:(i+1)*entrySize]
+			if entry[0:16]==bytes(16):
+				continue
+			firstLba, lastLba, attributes=struct.unpack_from('<QQQ', entry, 32)
+			name=entry[56:128].decode('utf-16-le', 'replace').split('\x00')[0]
+			self._partitions.append(Partition(i + 1, 'GPT', firstLba, lastLba - firstLba + 1,
+				guidString(entry[0:16]), self._sectorSize, name, guidString(entry[16:32]),
+				(attributes & 0x04)!=0))
+
+	def _mbrEntries(self, sector):
+		'''Returns a list of (bootable, type, start, length)
+		for the four entries of an MBR or EBR.'''
+		entries=[]
+		for i in range(4):
+			active, partType, start, length=struct.unpack_from('<B3xB3xLL', sector, 446 + 16*i)
+			entries.append((active==0x80, partType, start, length))
+		return entries
+
+	def _readMbr(self):
+		for i, (bootable, partType, start, length) in enumerate(self._mbrEntries(self._head)):
+			if partType==0:
+				continue
+			self._partitions.append(Partition(i + 1, 'MBR', start, length, partType,
+				bootable=bootable))
+		for partition in list(self._partitions):
+			if partition.isExtended():
+				self._readExtended(partition.start())
+
+	def _readExtended(self, extendedStart):
+		'''Follows the chain of extended boot records.
+		Logical partitions are relative to their EBR and
+		the next EBR is relative to the extended partition.'''
+		number=max([p.number() for p in self._partitions if p.number() > 4] + [4]) + 1
+		ebr=extendedStart
+		seen=set()
+		while ebr not in seen and len(seen) < MAX_LOGICAL_PARTITIONS:
+			seen.add(ebr)
+			sector=self._read(ebr * SECTOR_SIZE, SECTOR_SIZE)
+			if len(sector) < SECTOR_SIZE or sector[510:512]!=b'\x55\xAA':
+				self._warnings.append('Bad extended boot record at sector ' + str(ebr))
+				return
+			entries=self._mbrEntries(sector)
+			bootable, partType, start, length=entries[0]
+			if partType!=0 and length!=0:
+				self._partitions.append(Partition(number, 'MBR', ebr + start, length, partType,
+					bootable=bootable))
+				number+=1
+			bootable, partType, start, length=entries[1]
+			if partType not in EXTENDED_TYPES or start==0:
+				return
+			ebr=extendedStart + start
+		if ebr in seen:
+			self._warnings.append('Extended boot records loop at sector ' + str(ebr))
+
+	def scheme(self):
+		'''MBR, GPT, Volume (a volume image) or None if
+		nothing was recognized.'''
+		return self._scheme
+
+	def sectorSize(self):
+		return self._sectorSize
+
+	def warnings(self):
+		return list(self._warnings)
+
+	def partitions(self):
+		'''Every partition, extended containers included.'''
+		return list(self._partitions)
+
+	def partition(self, number):
+		for partition in self._partitions:
+			if partition.number()==number:
+				return partition
+		return None
+
+	def volumes(self, filesystems=None):
+		'''Partitions holding one of the listed filesystems
+		(or any recognized filesystem) in table order.'''
+		return [p for p in self._partitions if p.filesystem() and
+			(filesystems==None or p.filesystem() in filesystems)]
+
+_cache={}
+
+def openVolumeSystem(imageFilename):
+	'''Returns the VolumeSystem for an image, reading its
+	tables only the first time or if the image changed.'''
+	st=os.stat(imageFilename)
+	key=(os.path.abspath(imageFilename), st.st_size, st.st_mtime_ns)
+	if key not in _cache:
+		_cache[key]=VolumeSystem(imageFilename)
+	return _cache[key]
+
+def addPartitionOption(parser):
+	'''Adds --partition to an OptionParser.'''
+	parser.add_option('--partition', dest='partition',
+					help='partition number to use (see volumes.py)')
+
+def selectVolumes(imageFilename, partition=None, filesystems=None):
+	'''Partitions a script should work on: the numbered
+	partition if one is given, otherwise every partition
+	holding one of filesystems.  Raises ValueError with a
+	message for the user if there are none.'''
+	volumeSystem=openVolumeSystem(imageFilename)
+	if partition!=None:
+		found=volumeSystem.partition(int(partition))
+		if found==None or found.isExtended():
+			raise ValueError('Partition ' + str(partition) + ' not found in ' + imageFilename)
+		return [found]
+	candidates=volumeSystem.volumes(filesystems)
+	if not candidates:
+		raise ValueError('No ' + '/'.join(filesystems or ('',)) + ' volume found in ' +
+			imageFilename + ', use --partition')
+	return candidates
+
+def volumeOffset(imageFilename, sectorOffset=None, partition=None, filesystems=NTFS_FILESYSTEMS):
+	'''Byte offset of the volume a script should use.  A
+	sector offset (-o) is used as given, then a partition
+	number, otherwise the first partition holding one of
+	filesystems is picked.  Raises ValueError with a
+	message for the user if there is no such volume.
+	Without an image 0 is returned.'''
+	if sectorOffset:
+		return SECTOR_SIZE * int(sectorOffset)
+	if not imageFilename:
+		return 0
+	candidates=selectVolumes(imageFilename, partition, filesystems)
+	if len(candidates) > 1:
+		sys.stderr.write('Using partition ' + str(candidates[0]) + '\n')
+	return candidates[0].offset()
+
+def main():
+	parser=optparse.OptionParser()
+	parser.add_option('-f', '--file', dest='filename',
+					help='image filename')
+	(options, args)=parser.parse_args()
+	if not options.filename and args:
+		options.filename=args[0]
+	if not options.filename:
+		print('Sorry, this script requires an image file')
+		return -1
+	volumeSystem=openVolumeSystem(options.filename)
+	print('Partition table:', volumeSystem.scheme())
+	for warning in volumeSystem.warnings():
+		print('Warning:', warning)
+	print('Number;Type;StartSector;Sectors;SectorSize;Filesystem;Bootable;Name;Guid')
+	for p in volumeSystem.partitions():
+		print(p.number(), '"'+str(p.typeName())+'"', p.startSector(), p.length(),
+			p.sectorSize(), p.filesystem(), p.isBootable(), '"'+p.name()+'"', p.guid(), sep=';')
+
+if __name__=='__main__':
+	main()
@@ -3,7 +3,11 @@
 various types of files from an
 image file.  Sectors are searched
 directly and the offset and sector number
-are returned.
+are returned.  If the filesystem is NTFS and
+clustermap.py (from the NTFS scripts) can be
+found the file(s) owning each hit are listed
+after the search.  clustermap.py is Python 3 so
+it is run with python3 rather than imported.
 
 As developed by Dr. Phil Polstra
 for PentesterAcademy.com.'''
@@ -19,6 +23,32 @@ import optparse
 import re
 # file existance
 import os
+# cluster to file map for NTFS volumes
+import subprocess
+
+def findClusterMap():
+	'''Path to clustermap.py, next to this script (as in
+	all-scripts) or with the NTFS scripts, or None.'''
+	here=os.path.dirname(os.path.abspath(__file__))
+	for path in (os.path.join(here, 'clustermap.py'),
+			os.path.join(here, '..', '08-NTFS Filesystems', 'clustermap.py')):
+		if os.path.exists(path):
+			return path
+	return None
+
+def printOwners(script, imageFilename, offset, hits):
+	'''Runs clustermap.py once for all of the hits and
+	prints the file(s) owning each one.'''
+	command=(['python3', script, '-f', os.path.abspath(imageFilename), '-o', str(offset), '-b'] +
+		[str(pos) for pos in hits])
+	try:
+		output=subprocess.Popen(command, stdout=subprocess.PIPE,
+			cwd=os.path.dirname(script)).communicate()[0]
+	except OSError:
+		print('python3 could not be run, file owners not listed')
+		return
+	print('Files owning the matches:')
+	print(output.decode('utf-8', 'replace').rstrip())
 
 '''Base class for file finder
 merely defines some methods.'''
@@ -196,6 +226,8 @@ def main():
 		help='image file (raw format) to search')
 	parser.add_option('-o', '--offset', dest='offset',
 		help='offset to start of filesystem in sectors')
+	parser.add_option('-n', '--no-map', dest='noMap', action='store_true',
+		help='do not look up the files owning NTFS clusters')
 	(options, args)=parser.parse_args()
 	imageFilename=options.imageFilename
 	if options.offset:
@@ -238,6 +270,14 @@ def main():
 	if not os.path.exists(imageFilename):
 		print('Image file not found!')
 		return(1)
+	# on NTFS find out which file owns each hit
+	mapScript=None
+	if not options.noMap:
+		with open(imageFilename, 'rb') as f:
+			f.seek(offset * 512)
+			if f.read(11)[3:11]==b'NTFS    ':
+				mapScript=findClusterMap()
+	hits=[]
 	# now parse through the file
 	pos=offset * 512
 	with open(imageFilename, 'rb') as f:
@@ -248,9 +288,12 @@ def main():
 				if finder.matches(buffer):
 					print('Matching %s found at offset 0x%X, sector %d' %
 					 (finder.fileType(),pos, pos//512))
+					hits.append(pos)
 					break
 			pos+=512*clusterSize
 			buffer=f.read(512*clusterSize)		
+	if mapScript and hits:
+		printOwners(mapScript, imageFilename, offset, hits)
 		
 			
 if __name__=='__main__':
@@ -0,0 +1,85 @@
+#!/usr/bin/python3
+'''Simple script to compare the first records of
+$MFT with their copies in $MFTMirr.  Each copy is
+read with a single read.  Records are compared
+after the fixup is applied so a difference means
+the contents really differ.  Tools using MftReader
+fall back to the mirror automatically when one of
+these records is damaged.
+Create by Dr. Phil Polstra (@ppolstra)
+for PentesterAcademy.com.'''
+
+from mft import *
+import optparse
+from vbr import Vbr
+from volumes import volumeOffset, addPartitionOption
+from mftreader import MftReader, MIRROR_RECORDS
+from paths import bestFilename
+
+def recordName(buffer):
+   '''Name of a record from whichever copy is good.'''
+   if fixupStatus(buffer)!=FIXUP_OK:
+      return None
+   fnameAttr=bestFilename(MftEntry(buffer))
+   return fnameAttr.filename() if fnameAttr else None
+
+def differences(primary, mirror):
+   '''Returns (count, first offset) of differing bytes
+   after the fixup is applied to both copies.'''
+   if fixupStatus(primary)==FIXUP_OK:
+      primary=applyFixup(primary)
+   if fixupStatus(mirror)==FIXUP_OK:
+      mirror=applyFixup(mirror)
+   diffs=[i for i in range(min(len(primary), len(mirror))) if primary[i]!=mirror[i]]
+   diffs+=list(range(min(len(primary), len(mirror)), max(len(primary), len(mirror))))
+   return (len(diffs), diffs[0] if diffs else None)
+
+def main():
+   parser=optparse.OptionParser()
+   parser.add_option("-f", "--file", dest="filename",
+               help="image filename")
+   parser.add_option("-o", "--offset", dest='offset',
+               help='offset in sectors to start of volume')
+   addPartitionOption(parser)
+   parser.add_option('-n', '--records', dest='records',
+               help='number of records to compare (default 4)')
+
+   (options, args)=parser.parse_args()
+   if not options.filename:
+      print('Sorry, this script requires an image file')
+      return -1
+   try:
+      offset=volumeOffset(options.filename, options.offset, options.partition)
+   except ValueError as e:
+      print(e)
+      return -1
+   count=int(options.records) if options.records else MIRROR_RECORDS
+
+   with open(options.filename, 'rb') as f:
+      f.seek(offset)
+      vbr=Vbr(f.read(512))
+   reader=MftReader(imageFilename=options.filename, vbr=vbr)
+   print('$MFT at LCN', vbr.mftLcn(), '$MFTMirr at LCN', vbr.mftMirrLcn())
+   if reader.substitutions():
+      print('$MFT record 0 is damaged, its data runs were read from $MFTMirr')
+   size=reader.recordSize()
+   primary=reader.readPrimary(count)
+   mirror=reader.readMirror(count)
+
+   print('MftEntry;Name;PrimaryStatus;MirrorStatus;Match;DifferentBytes;FirstDifference')
+   divergent=0
+   for number in range(count):
+      p=primary[number*size:(number+1)*size]
+      m=mirror[number*size:(number+1)*size]
+      name=recordName(p) or recordName(m) or ''
+      diffCount, first=differences(p, m)
+      if diffCount:
+         divergent+=1
+      print(number, '"'+name+'"', fixupStatus(p) if p else 'missing',
+            fixupStatus(m) if m else 'missing',
+            'differs' if diffCount else 'identical', diffCount,
+            '' if first==None else '0x%03X' % first, sep=';')
+   print(divergent, 'of', count, 'records differ')
+
+if __name__=='__main__':
+   main()
@@ -0,0 +1,308 @@
+#!/usr/bin/python3
+
+'''Cluster to file reverse map for an NTFS volume.
+The data runs of every non-resident attribute in
+every record, in use or deleted, are put in an
+interval index so the file(s) owning any cluster
+or byte offset can be found with a binary search.
+
+The map is saved in the temporary directory (or the
+file given with -c) as <image>-<path hash>.<sector
+offset>.clustermap, never next to the image which is
+usually on read-only or write-blocked storage.  It is
+rebuilt automatically if the image's size or
+modification time changes.
+Created by Dr. Phil Polstra
+for PentesterAcademy.com'''
+
+__all__=['ClusterMap', 'ClusterOwner', 'openClusterMap', 'mapFilename']
+
+import os
+import sys
+import json
+import hashlib
+import tempfile
+import struct
+import optparse
+from array import array
+from vbr import Vbr
+from volumes import volumeOffset, addPartitionOption
+from mftreader import MftReader
+from paths import PathResolver
+from extentmap import ExtentMap
+
+MAP_MAGIC=b'NTFSCMAP'
+MAP_VERSION=1
+
+def attributeLabel(attr):
+	'''Name used for the stream an extent belongs to.'''
+	if attr.attributeType()==0x80:
+		return attr.nameString()
+	labels={0x20:'$ATTRIBUTE_LIST', 0xA0:'$INDEX_ALLOCATION', 0xB0:'$BITMAP',
+		0x100:'$LOGGED_UTILITY_STREAM'}
+	label=labels.get(attr.attributeType(), '%02X' % attr.attributeType())
+	if attr.hasName():
+		label=attr.nameString() + ':' + label
+	return label
+
+class ClusterOwner:
+	'''One file stream that owns a cluster.'''
+	def __init__(self, record, sequence, inUse, path, stream, fileOffset):
+		self._record=record
+		self._sequence=sequence
+		self._inUse=inUse
+		self._path=path
+		self._stream=stream
+		self._fileOffset=fileOffset
+
+	def record(self):
+		return self._record
+
+	def sequenceNumber(self):
+		return self._sequence
+
+	def inUse(self):
+		return self._inUse
+
+	def path(self):
+		return self._path
+
+	def stream(self):
+		'''Stream name, '' for the unnamed $DATA stream.'''
+		return self._stream
+
+	def fileOffset(self):
+		'''Position of the looked up byte (or cluster)
+		within the stream.'''
+		return self._fileOffset
+
+	def __str__(self):
+		retStr=str(self._path)
+		if self._stream:
+			retStr+=':' + self._stream
+		retStr+=' (entry ' + str(self._record) + '/' + str(self._sequence)
+		if not self._inUse:
+			retStr+=', deleted'
+		return retStr + ')'
+
+class ClusterMap:
+	'''Reverse map from LCNs to file streams.  Build it
+	with build() or read a saved one with load().'''
+	def __init__(self):
+		self._meta={}
+		# file table: (record, sequence, in use, path)
+		self._files=[]
+		self._streams=[]
+		# per extent: index into _files, _streams and first VCN
+		self._fileIndex=array('L')
+		self._streamIndex=array('L')
+		self._vcns=array('Q')
+		self._extentMap=ExtentMap()
+
+	def build(self, reader, bytesPerCluster):
+		'''Builds the map with one pass of an MftReader.
+		Extension records are credited to their base
+		record.  Returns the number of extents.'''
+		resolver=PathResolver()
+		files={}
+		streams={}
+		extents=[]
+		# base record -> (sequence, in use) so no record is read twice
+		status={}
+		for number, mftEntry in reader.entries():
+			resolver.addEntry(number, mftEntry)
+			base=mftEntry.baseFileMft() or number
+			if base==number:
+				status[number]=(mftEntry.sequenceNumber(), mftEntry.inUse())
+			for attr in mftEntry.attributes():
+				if attr.isResident():
+					continue
+				label=attributeLabel(attr)
+				if label not in streams:
+					streams[label]=len(streams)
+				if base not in files:
+					files[base]=len(files)
+				vcn=attr.firstVcn()
+				for run in attr.dataRuns():
+					if not run.isSparse() and run.numberOfClusters() > 0:
+						extents.append((run.startingCluster(), run.numberOfClusters(),
+							len(self._vcns)))
+						self._fileIndex.append(files[base])
+						self._streamIndex.append(streams[label])
+						self._vcns.append(vcn)
+					vcn+=run.numberOfClusters()
+		self._files=[None] * len(files)
+		for number, i in files.items():
+			seq, inUse=status.get(number, (0, False))
+			self._files[i]=(number, seq, inUse, resolver.path(number))
+		self._streams=[None] * len(streams)
+		for label, i in streams.items():
+			self._streams[i]=label
+		self._extentMap=ExtentMap(extents)
+		self._meta['bytesPerCluster']=bytesPerCluster
+		return len(extents)
+
+	def meta(self, key):
+		return self._meta.get(key)
+
+	def bytesPerCluster(self):
+		return self._meta.get('bytesPerCluster', 4096)
+
+	def numberOfExtents(self):
+		return len(self._vcns)
+
+	def owners(self, lcn, byteInCluster=0):
+		'''Returns a list of ClusterOwner objects for a
+		cluster, files in use first.  More than one
+		owner means a deleted file's clusters were
+		reused (or the volume is damaged).'''
+		found=[]
+		bpc=self.bytesPerCluster()
+		for start, count, extent in self._extentMap.extentsAt(lcn):
+			record, seq, inUse, path=self._files[self._fileIndex[extent]]
+			vcn=self._vcns[extent] + lcn - start
+			found.append(ClusterOwner(record, seq, inUse, path,
+				self._streams[self._streamIndex[extent]], vcn * bpc + byteInCluster))
+		found.sort(key=lambda o: (not o.inUse(), o.record()))
+		return found
+
+	def ownersOfOffset(self, volumeOffset):
+		'''Owners of the cluster holding a byte offset from
+		the start of the volume.'''
+		bpc=self.bytesPerCluster()
+		return self.owners(volumeOffset // bpc, volumeOffset % bpc)
+
+	def save(self, filename, source, offset=0):
+		'''Writes the map.  The size and modification time of
+		source are stored so a stale map can be spotted.'''
+		st=os.stat(source)
+		self._meta.update({'version':MAP_VERSION, 'source':os.path.abspath(source),
+			'offset':offset, 'size':st.st_size, 'mtime':st.st_mtime_ns})
+		tables=json.dumps({'meta':self._meta, 'files':self._files,
+			'streams':self._streams}).encode('utf-8')
+		with open(filename, 'wb') as f:
+			f.write(MAP_MAGIC)
+			f.write(struct.pack('<QQ', len(tables), len(self._vcns)))
+			f.write(tables)
+			for values in (self._fileIndex, self._streamIndex, self._vcns):
+				values.tofile(f)
+			self._extentMap.save(f)
+
+	def load(self, filename):
+		'''Reads a map written by save().  Raises ValueError
+		if the file is not a cluster map.'''
+		with open(filename, 'rb') as f:
+			if f.read(len(MAP_MAGIC))!=MAP_MAGIC:
+				raise ValueError(filename + ' is not a cluster map')
+			tableSize, count=struct.unpack('<QQ', f.read(16))
+			tables=json.loads(f.read(tableSize).decode('utf-8'))
+			self._meta=tables['meta']
+			self._files=[tuple(entry) for entry in tables['files']]
+			self._streams=tables['streams']
+			for values in (self._fileIndex, self._streamIndex, self._vcns):
+				del values[:]
+				values.fromfile(f, count)
+			self._extentMap.load(f)
+
+	def isCurrent(self, source):
+		'''True if the map was built from source and the
+		file has not changed since.'''
+		st=os.stat(source)
+		return (self._meta.get('version')==MAP_VERSION and
+			self._meta.get('source')==os.path.abspath(source) and
+			self._meta.get('size')==st.st_size and
+			self._meta.get('mtime')==st.st_mtime_ns)
+
+def mapFilename(imageFilename, offset=0, directory=None):
+	'''Name of the saved map for a volume in directory
+	(the temporary directory by default).  offset is in
+	bytes and the sector offset goes in the name so each
+	partition of an image has its own map.  A hash of
+	the image's full path keeps images with the same
+	name apart.'''
+	fullPath=os.path.abspath(imageFilename)
+	pathHash=hashlib.sha1(fullPath.encode('utf-8')).hexdigest()[:8]
+	return os.path.join(directory or tempfile.gettempdir(), '%s-%s.%d.clustermap' %
+		(os.path.basename(fullPath), pathHash, offset // 512))
+
+def openClusterMap(imageFilename, offset=0, mftFilename=None, filename=None,
+				rebuild=False, verbose=False):
+	'''Returns a ClusterMap for a volume, building and
+	saving it first if there is none or the image has
+	changed.  Failing to save the map is not fatal, it
+	is just built again next time.'''
+	filename=filename or mapFilename(imageFilename, offset)
+	clusterMap=ClusterMap()
+	if not rebuild and os.path.exists(filename):
+		try:
+			clusterMap.load(filename)
+		except (ValueError, EOFError, KeyError, OSError):
+			clusterMap=ClusterMap()
+		if clusterMap.isCurrent(imageFilename):
+			return clusterMap
+		clusterMap=ClusterMap()
+	if verbose:
+		print('Building cluster map for', imageFilename)
+	with open(imageFilename, 'rb') as f:
+		f.seek(offset)
+		vbr=Vbr(f.read(512))
+	if mftFilename:
+		reader=MftReader(mftFilename=mftFilename)
+	else:
+		reader=MftReader(imageFilename=imageFilename, vbr=vbr)
+	count=clusterMap.build(reader, vbr.bytesPerCluster())
+	try:
+		clusterMap.save(filename, imageFilename, offset)
+	except OSError as e:
+		sys.stderr.write('Cluster map could not be saved: ' + str(e) + '\n')
+	if verbose:
+		print('Mapped', count, 'extents')
+	return clusterMap
+
+def main():
+	parser=optparse.OptionParser('usage %prog [options] LCN...')
+	parser.add_option('-f', '--file', dest='filename',
+					help='image filename')
+	parser.add_option('-o', '--offset', dest='offset',
+					help='offset in sectors to start of volume')
+	addPartitionOption(parser)
+	parser.add_option('-m', '--mft', dest='mftFile',
+					help='MFT file')
+	parser.add_option('-b', '--bytes', dest='bytes', action='store_true',
+					help='arguments are byte offsets into the image, not LCNs')
+	parser.add_option('-c', '--cache', dest='cache',
+					help='file the map is saved in (default in the temporary directory)')
+	parser.add_option('-r', '--rebuild', dest='rebuild', action='store_true',
+					help='rebuild the map even if it is current')
+	(options, args)=parser.parse_args()
+	if not options.filename:
+		print('Sorry, this script requires an image file')
+		return -1
+	try:
+		offset=volumeOffset(options.filename, options.offset, options.partition)
+	except ValueError as e:
+		print(e)
+		return -1
+	clusterMap=openClusterMap(options.filename, offset, options.mftFile, options.cache,
+		rebuild=options.rebuild, verbose=True)
+	bpc=clusterMap.bytesPerCluster()
+	print('LCN;Offset;MftEntry;UpdateSequence;InUse;Stream;FileOffset;Path')
+	for arg in args:
+		value=int(arg, 0)
+		if options.bytes:
+			if value < offset:
+				print('Offset', arg, 'is before the volume')
+				continue
+			lcn=(value - offset) // bpc
+			owners=clusterMap.ownersOfOffset(value - offset)
+		else:
+			lcn=value
+			owners=clusterMap.owners(lcn)
+		if not owners:
+			print(lcn, arg, '', '', '', '', '', '"<unowned>"', sep=';')
+		for owner in owners:
+			print(lcn, arg, owner.record(), owner.sequenceNumber(), owner.inUse(),
+				'"'+owner.stream()+'"', owner.fileOffset(), '"'+str(owner.path())+'"', sep=';')
+
+if __name__=='__main__':
+	main()
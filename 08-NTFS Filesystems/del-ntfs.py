@@ -1,4 +1,4 @@
-#!/usr/bin/python2
+#!/usr/bin/python3
 
 """
 Simple script to parse a raw image
@@ -9,6 +9,8 @@ by Dr. Phil Polstra (@ppolstra)
 """
 
 import sys, os.path, struct
+import optparse
+from volumes import volumeOffset, addPartitionOption
 
 def getU32(data, offset=0):
   return struct.unpack('<L', data[offset:offset+4])[0]
@@ -23,17 +25,17 @@ def getU64(data, offset=0):
   return struct.unpack('<Q', data[offset:offset+8])[0]
 
 def getU48(data, offset=0):
-  return struct.unpack('<Q', data[offset:offset+6]+"\x00\x00")[0]
+  return struct.unpack('<Q', data[offset:offset+6]+b"\x00\x00")[0]
 
 def usage():
-  print("usage " + sys.argv[0] + "<image file> [offset in sectors]")
+  print("usage " + sys.argv[0] + " <image file> [offset in sectors]")
   exit(1)
 
 def checkForDeleted(buff):
-  if buff[0:4] == 'FILE':
+  if buff[0:4] == b'FILE':
     for i in range (0, 4):
       offset = i * 1024
-      if buff[offset:offset+4] == 'FILE':
+      if buff[offset:offset+4] == b'FILE':
         # are the flags zero or two
         try:
           flags = getU16(buff, offset+22)
@@ -46,44 +48,57 @@ def checkForDeleted(buff):
             if getU32(buff, offset+152) == 48:
               nameLen = getU8(buff, offset+240)
               if nameLen > 0:
-                filename = buff[offset+242: offset+242 + nameLen * 2]
+                filename = buff[offset+242: offset+242 + nameLen * 2].decode('utf-16-le', 'replace')
                 if flags == 0:
                   print("Found potential deleted file %s at MFT %s" % (filename, mft))
                 else:
                   print("Found potential deleted directory %s at MFT %s" % (filename, mft))
 
 def main():
-  if len(sys.argv) < 2:
+  parser = optparse.OptionParser(usage='%prog <image file> [offset in sectors]')
+  addPartitionOption(parser)
+  (options, args) = parser.parse_args()
+  if len(args) < 1:
     usage()
 
   # read file
-  if not os.path.isfile(sys.argv[1]):
-    print("File " + sys.argv[1] + " connot be openned for reading")
+  if not os.path.isfile(args[0]):
+    print("File " + args[0] + " connot be openned for reading")
     exit(1)
  
-  if len(sys.argv) > 2:
-    offset = int(sys.argv[2]) * 512 # offset was given
-  else:
+  # a file containing the MFT has no volume to find
+  with open(args[0], 'rb') as f:
+    isMftFile = f.read(4) == b'FILE'
+  if isMftFile and len(args) < 2:
     offset = 0
+  else:
+    try:
+      offset = volumeOffset(args[0], args[1] if len(args) > 1 else None, options.partition)
+    except ValueError as e:
+      print(e)
+      exit(1)
   # read 512 byte chunks till MFT entry is found
   # then read 4096 byte chunks = 4 MFT entries at a time
   foundMFT = False
-  with open(str(sys.argv[1]), 'rb') as f:
+  with open(args[0], 'rb') as f:
     f.seek(offset)
     while not foundMFT: 
-      buff = str(f.read(512))
-      if buff[0:4] == 'FILE':
+      buff = f.read(512)
+      if not buff:
+        print("No MFT entries found")
+        exit(1)
+      if buff[0:4] == b'FILE':
         foundMFT = True
         break
       offset+=512
   # now that we are properly aligned get a cluster at a time
   # if searching through a raw image we may encounter MFT
   # fragments before the start of the MFT
-  with open(str(sys.argv[1]), 'rb') as f:
+  with open(args[0], 'rb') as f:
     f.seek(offset)
     while buff:
-      buff = str(f.read(4096))
-      if buff[0:4] == 'FILE':
+      buff = f.read(4096)
+      if buff[0:4] == b'FILE':
         checkForDeleted(buff)
       offset += 4096
 
@@ -0,0 +1,240 @@
+#!/usr/bin/python3
+'''Simple script to copy $MFT out of an image so it
+can be used with the -m option of the other scripts.
+Record 0 is read (from $MFTMirr if it is damaged),
+its data runs are followed and the stream is copied
+with large reads while MD5, SHA1 and SHA256 are
+calculated.  $LogFile, $UsnJrnl:$J and $Secure:$SDS
+can be copied in the same run.
+
+Progress is saved in a checkpoint file in the output
+directory.  If a copy is interrupted running the same
+command again carries on where it stopped.  The part
+already copied is hashed again from the output file,
+which is much quicker than reading it from the image.
+Create by Dr. Phil Polstra (@ppolstra)
+for PentesterAcademy.com.'''
+
+from mft import *
+import optparse
+import json
+import os
+import sys
+from vbr import Vbr
+from volumes import volumeOffset, addPartitionOption
+from mftreader import MftReader
+from stream import getStreams, StreamReader
+from hashing import MultiHash, DEFAULT_ALGORITHMS
+
+CHECKPOINT_NAME='export-mft.checkpoint'
+MANIFEST_NAME='export-mft.manifest.csv'
+# bytes copied between checkpoints
+CHECKPOINT_INTERVAL=64 * 1048576
+
+def findUsnJrnl(reader, vbr, imageFilename):
+   '''MFT record number of $UsnJrnl.  It is looked up in
+   the $Extend index and only if that fails is the
+   whole MFT searched.'''
+   extend=reader.entry(11)
+   if extend and extend.isValid():
+      indexEntries=[]
+      for indexRoot in extend.attributesOfType(0x90):
+         indexEntries+=indexRoot.indexEntries()
+      for indexAlloc in extend.attributesOfType(0xA0):
+         indxBuffer=b''
+         for clusterNo in indexAlloc.clusterList():
+            indxBuffer+=vbr.getCluster(clusterNo, imageFilename)
+         indexAlloc.getEntries(indxBuffer)
+         indexEntries+=indexAlloc.entries()
+      for indexEntry in indexEntries:
+         if not indexEntry.isEmpty() and indexEntry.filename()=='$UsnJrnl':
+            return indexEntry.mft()
+   for number, mftEntry in reader.entries():
+      for fnameAttr in mftEntry.attributesOfType(0x30):
+         if fnameAttr.filename()=='$UsnJrnl' and fnameAttr.parentMft()==11:
+            return number
+   return None
+
+def targetStreams(reader, vbr, options):
+   '''List of (output name, description, NtfsStream).'''
+   targets=[('realMFT', '$MFT', 0, '')]
+   if options.logFile or options.all:
+      targets.append(('LogFile', '$LogFile', 2, ''))
+   if options.secure or options.all:
+      targets.append(('Secure-SDS', '$Secure:$SDS', 9, '$SDS'))
+   if options.usnJrnl or options.all:
+      number=findUsnJrnl(reader, vbr, options.filename)
+      if number==None:
+         print('$UsnJrnl not found, it will not be exported')
+      else:
+         targets.append(('UsnJrnl-J', '$UsnJrnl:$J', number, '$J'))
+   streams=[]
+   for outName, description, number, streamName in targets:
+      mftEntry=reader.entry(number)
+      found=getStreams(mftEntry, reader.entry) if mftEntry and mftEntry.isValid() else {}
+      if streamName not in found or found[streamName].isResident():
+         print(description, 'could not be found, it will not be exported')
+         continue
+      streams.append((outName, description, found[streamName]))
+   return streams
+
+def sourceInfo(options, offset, vbr):
+   '''Identifies the image so a checkpoint is not used
+   with the wrong one.'''
+   return {'image':os.path.abspath(options.filename),
+           'size':os.path.getsize(options.filename),
+           'offset':offset, 'serial':vbr.volumeSerialNumber().hex()}
+
+def loadCheckpoint(filename, source):
+   '''Returns the saved progress or an empty one.'''
+   try:
+      with open(filename, 'r') as f:
+         checkpoint=json.load(f)
+   except (IOError, ValueError):
+      return {'source':source, 'streams':{}}
+   if checkpoint.get('source')!=source:
+      print('Checkpoint is for a different image, starting over')
+      return {'source':source, 'streams':{}}
+   return checkpoint
+
+def saveCheckpoint(filename, checkpoint):
+   '''Written to a temporary file and renamed so a crash
+   never leaves half a checkpoint.'''
+   with open(filename + '.tmp', 'w') as f:
+      json.dump(checkpoint, f)
+      f.flush()
+      os.fsync(f.fileno())
+   os.replace(filename + '.tmp', filename)
+
+def rehash(outName, size, hasher, chunkSize):
+   '''Hashes the first size bytes of a partial copy.
+   Returns the number of bytes hashed.'''
+   done=0
+   with open(outName, 'rb') as f:
+      while done < size:
+         data=f.read(min(chunkSize, size - done))
+         if not data:
+            break
+         hasher.update(data)
+         done+=len(data)
+   return done
+
+def progress(description, done, total):
+   sys.stderr.write('\r%s: %d of %d MB (%d%%)' % (description, done // 1048576,
+                    total // 1048576, 100 * done // total if total else 100))
+   sys.stderr.flush()
+
+def main():
+   parser=optparse.OptionParser()
+   parser.add_option("-f", "--file", dest="filename",
+               help="image filename")
+   parser.add_option("-o", "--offset", dest='offset',
+               help='offset in sectors to start of volume')
+   addPartitionOption(parser)
+   parser.add_option('-d', '--directory', dest='directory',
+               help='output directory (default current directory)')
+   parser.add_option('-l', '--logfile', dest='logFile', action='store_true',
+               help='also export $LogFile')
+   parser.add_option('-u', '--usnjrnl', dest='usnJrnl', action='store_true',
+               help='also export $UsnJrnl:$J')
+   parser.add_option('-s', '--secure', dest='secure', action='store_true',
+               help='also export $Secure:$SDS')
+   parser.add_option('-a', '--all', dest='all', action='store_true',
+               help='export $MFT, $LogFile, $UsnJrnl:$J and $Secure:$SDS')
+   parser.add_option('-c', '--chunk', dest='chunk',
+               help='read size in MB (default 16)')
+   parser.add_option('-r', '--restart', dest='restart', action='store_true',
+               help='ignore any checkpoint and copy everything again')
+
+   (options, args)=parser.parse_args()
+   if not options.filename:
+      print('Sorry, this script requires an image file')
+      return -1
+   try:
+      offset=volumeOffset(options.filename, options.offset, options.partition)
+   except ValueError as e:
+      print(e)
+      return -1
+   outDir=options.directory or '.'
+   if not os.path.isdir(outDir):
+      os.makedirs(outDir)
+   chunkSize=(int(options.chunk) if options.chunk else 16) * 1048576
+
+   with open(options.filename, 'rb') as f:
+      f.seek(offset)
+      vbr=Vbr(f.read(512))
+   reader=MftReader(imageFilename=options.filename, vbr=vbr)
+   if reader.substitutions():
+      print('$MFT record 0 is damaged, its data runs were read from $MFTMirr')
+   streams=targetStreams(reader, vbr, options)
+
+   checkpointName=os.path.join(outDir, CHECKPOINT_NAME)
+   source=sourceInfo(options, offset, vbr)
+   if options.restart:
+      checkpoint={'source':source, 'streams':{}}
+   else:
+      checkpoint=loadCheckpoint(checkpointName, source)
+
+   manifest=['File;Source;FileSize;' + ';'.join([a.upper() for a in DEFAULT_ALGORITHMS])]
+   fd=os.open(options.filename, os.O_RDONLY)
+   try:
+      # streams are copied in the order they sit on disk
+      for outName, description, stream in sorted(streams, key=lambda s: s[2].firstLcn()):
+         size=stream.logicalSize()
+         outPath=os.path.join(outDir, outName)
+         state=checkpoint['streams'].get(outName, {})
+         if state.get('size')!=size:
+            state={'size':size, 'done':0}
+         if 'digests' in state and os.path.exists(outPath):
+            print(description, 'was already exported')
+            manifest.append(';'.join([outName, description, str(size)] + state['digests']))
+            continue
+         hasher=MultiHash()
+         done=0
+         if state['done'] and os.path.exists(outPath):
+            done=rehash(outPath, min(state['done'], os.path.getsize(outPath)),
+                        hasher, chunkSize)
+            print('Resuming', description, 'at', done, 'bytes')
+         mode='r+b' if done else 'wb'
+         with open(outPath, mode) as outFile:
+            # anything past the checkpoint is thrown away and
+            # sparse parts of the stream are skipped, not written
+            outFile.truncate(done)
+            outFile.truncate(size)
+            outFile.seek(done)
+            streamReader=StreamReader(stream, vbr, fd, hasher, chunkSize)
+            streamReader.seek(done)
+            lastCheckpoint=done
+            for data in streamReader.readChunks():
+               if data.count(0)==len(data):
+                  outFile.seek(len(data), 1)
+               else:
+                  outFile.write(data)
+               done+=len(data)
+               if done - lastCheckpoint >= CHECKPOINT_INTERVAL:
+                  outFile.flush()
+                  os.fsync(outFile.fileno())
+                  state['done']=done
+                  checkpoint['streams'][outName]=state
+                  saveCheckpoint(checkpointName, checkpoint)
+                  lastCheckpoint=done
+               progress(description, done, size)
+         sys.stderr.write('\n')
+         state['done']=done
+         state['digests']=hasher.hexdigests()
+         checkpoint['streams'][outName]=state
+         saveCheckpoint(checkpointName, checkpoint)
+         manifest.append(';'.join([outName, description, str(size)] + state['digests']))
+   finally:
+      os.close(fd)
+
+   with open(os.path.join(outDir, MANIFEST_NAME), 'w') as f:
+      f.write('\n'.join(manifest) + '\n')
+   # everything is done so the checkpoint is no longer needed
+   if os.path.exists(checkpointName):
+      os.remove(checkpointName)
+   for line in manifest:
+      print(line)
+
+if __name__=='__main__':
+   main()
@@ -0,0 +1,68 @@
+#!/usr/bin/python3
+
+'''External merge sort.  Items are collected into
+runs of a fixed size, each run is sorted in memory
+and spilled to a temporary file, then the runs are
+merged with heapq.  Memory use depends only on the
+run size no matter how many items are sorted.
+Created by Dr. Phil Polstra
+for PentesterAcademy.com'''
+
+__all__=['externalSort']
+
+import heapq
+import pickle
+import tempfile
+
+def _spill(items, tmpDir, blockSize=4096):
+	'''Writes a sorted run to a temporary file in
+	pickled blocks and rewinds it.'''
+	f=tempfile.TemporaryFile(dir=tmpDir)
+	for i in range(0, len(items), blockSize):
+		pickle.dump(items[i:i+blockSize], f, pickle.HIGHEST_PROTOCOL)
+	f.seek(0)
+	return f
+
+def _readRun(f):
+	'''Generator that reads a run back one block at a time.'''
+	while True:
+		try:
+			block=pickle.load(f)
+		except EOFError:
+			return
+		for item in block:
+			yield item
+
+def externalSort(items, key=None, runSize=1000000, tmpDir=None, unique=False):
+	'''Generator that yields items in sorted order.  At most
+	runSize items are held in memory.  If unique is True
+	items with equal keys after the first are dropped.'''
+	runs=[]
+	buffer=[]
+	try:
+		for item in items:
+			buffer.append(item)
+			if len(buffer) >= runSize:
+				buffer.sort(key=key)
+				runs.append(_spill(buffer, tmpDir))
+				buffer=[]
+		buffer.sort(key=key)
+		if len(runs)==0:
+			merged=iter(buffer)
+		else:
+			merged=heapq.merge(*([_readRun(f) for f in runs] + [iter(buffer)]), key=key)
+		if not unique:
+			for item in merged:
+				yield item
+			return
+		last=None
+		first=True
+		for item in merged:
+			k=key(item) if key else item
+			if first or k!=last:
+				yield item
+				last=k
+				first=False
+	finally:
+		for f in runs:
+			f.close()
@@ -0,0 +1,110 @@
+#!/usr/bin/python3
+
+'''Fast conversion and formatting of Windows
+FILETIMEs (100ns intervals since 1/1/1601).  Times
+are kept as integers so the full 100ns precision
+survives.  Date strings are memoized per day and
+times of day are formatted with integer arithmetic
+which is much cheaper than time.gmtime() and
+time.strftime() for every timestamp.  Times past
+12/31/9999 cannot be real (they are usually forged)
+so they are shown as invalid:<hex value> rather
+than as a date.
+Created by Dr. Phil Polstra
+for PentesterAcademy.com'''
+
+__all__=['FileTimeFormatter', 'fileTimeToUnix', 'EPOCH_AS_FILETIME']
+
+import datetime
+
+TICKS_PER_SECOND=10000000
+TICKS_PER_DAY=86400 * TICKS_PER_SECOND
+# 1/1/1970 as a FILETIME
+EPOCH_AS_FILETIME=116444736000000000
+# 12/31/9999 is the last day Python can format, anything
+# later is printed as INVALID_FORMAT
+MAX_FILETIME=(datetime.date(9999, 12, 31).toordinal() -
+				datetime.date(1601, 1, 1).toordinal() + 1) * TICKS_PER_DAY - 1
+ORDINAL_1601=datetime.date(1601, 1, 1).toordinal()
+INVALID_FORMAT='invalid:%016X'
+
+def fileTimeToUnix(fileTime):
+	'''Returns (seconds, ticks) since 1/1/1970 where ticks
+	is the remaining 100ns count (0-9999999).'''
+	return divmod(fileTime - EPOCH_AS_FILETIME, TICKS_PER_SECOND)
+
+class FileTimeFormatter:
+	'''Formats FILETIMEs as strings.  Like convertFileTime()
+	times before 1970 are shown as 1/1/1970.  Times past
+	9999 are shown as invalid:<hex> in the date with an
+	empty time of day.'''
+	def __init__(self):
+		self._days={}
+
+	def _clamp(self, fileTime):
+		if fileTime < EPOCH_AS_FILETIME:
+			return EPOCH_AS_FILETIME
+		return fileTime
+
+	def date(self, fileTime):
+		'''YYYY-MM-DD'''
+		if fileTime > MAX_FILETIME:
+			return INVALID_FORMAT % fileTime
+		day=self._clamp(fileTime) // TICKS_PER_DAY
+		dateStr=self._days.get(day)
+		if dateStr==None:
+			dateStr=datetime.date.fromordinal(ORDINAL_1601 + day).isoformat()
+			self._days[day]=dateStr
+		return dateStr
+
+	def time(self, fileTime):
+		'''HH:MM:SS'''
+		if fileTime > MAX_FILETIME:
+			return ''
+		secs=(self._clamp(fileTime) % TICKS_PER_DAY) // TICKS_PER_SECOND
+		return '%02d:%02d:%02d' % (secs // 3600, secs // 60 % 60, secs % 60)
+
+	def timePrecise(self, fileTime):
+		'''HH:MM:SS.fffffff'''
+		if fileTime > MAX_FILETIME:
+			return ''
+		ticks=self._clamp(fileTime) % TICKS_PER_DAY
+		secs, frac=divmod(ticks, TICKS_PER_SECOND)
+		return '%02d:%02d:%02d.%07d' % (secs // 3600, secs // 60 % 60, secs % 60, frac)
+
+	def dateTime(self, fileTime, precise=False):
+		'''YYYY-MM-DD HH:MM:SS[.fffffff]'''
+		if fileTime > MAX_FILETIME:
+			return INVALID_FORMAT % fileTime
+		if precise:
+			return self.date(fileTime) + ' ' + self.timePrecise(fileTime)
+		return self.date(fileTime) + ' ' + self.time(fileTime)
+
+	def formatArray(self, fileTimes, precise=False):
+		'''Batch conversion of a sequence (list, tuple or
+		array('Q')) of FILETIMEs.  Returns a list of
+		(date, time) string pairs.'''
+		days=self._days
+		lo=EPOCH_AS_FILETIME
+		hi=MAX_FILETIME
+		retList=[]
+		append=retList.append
+		for fileTime in fileTimes:
+			if fileTime < lo:
+				fileTime=lo
+			elif fileTime > hi:
+				append((INVALID_FORMAT % fileTime, ''))
+				continue
+			day, ticks=divmod(fileTime, TICKS_PER_DAY)
+			dateStr=days.get(day)
+			if dateStr==None:
+				dateStr=datetime.date.fromordinal(ORDINAL_1601 + day).isoformat()
+				days[day]=dateStr
+			secs, frac=divmod(ticks, TICKS_PER_SECOND)
+			if precise:
+				append((dateStr, '%02d:%02d:%02d.%07d' %
+					(secs // 3600, secs // 60 % 60, secs % 60, frac)))
+			else:
+				append((dateStr, '%02d:%02d:%02d' %
+					(secs // 3600, secs // 60 % 60, secs % 60)))
+		return retList
@@ -0,0 +1,148 @@
+#!/usr/bin/python3
+'''Simple script to find duplicate files on an
+NTFS volume without mounting it.  Files are first
+grouped by the sizes recorded in the MFT, so files
+with a unique size are never read.  Within each
+size group only the first and last 64KB are hashed
+and only files that still match are read in full.
+Reads are done in LCN order by a pool of threads.
+Create by Dr. Phil Polstra (@ppolstra)
+for PentesterAcademy.com.'''
+
+from mft import *
+import optparse
+import sys
+from vbr import Vbr
+from volumes import volumeOffset, addPartitionOption
+from mftreader import MftReader
+from stream import getStreams
+from paths import PathResolver
+from hashing import HashEngine
+
+ENDS_SIZE=65536
+
+def printHeader():
+   '''Prints the header listing columns.'''
+   print('DuplicateSet;FileSize;SHA1;MftEntry;UpdateSequence;Path;Stream')
+
+def groupsOf(keyed):
+   '''Turns (key, item) pairs into a list of item lists
+   for keys shared by more than one item.'''
+   groups={}
+   for key, item in keyed:
+      groups.setdefault(key, []).append(item)
+   return [items for items in groups.values() if len(items) > 1]
+
+def main():
+   parser=optparse.OptionParser()
+   parser.add_option("-f", "--file", dest="filename",
+               help="image filename")
+   parser.add_option("-o", "--offset", dest='offset',
+               help='offset in sectors to start of volume')
+   addPartitionOption(parser)
+   parser.add_option('-m', '--mft', dest='mftFile',
+               help='MFT file')
+   parser.add_option('-t', '--threads', dest='threads',
+               help='number of hashing threads (default 4)')
+   parser.add_option('-s', '--min-size', dest='minSize',
+               help='ignore files smaller than this many bytes (default 1)')
+   parser.add_option('-a', '--ads', dest='ads', action='store_true',
+               help='also compare alternate data streams')
+   parser.add_option('-D', '--deleted', dest='deleted', action='store_true',
+               help='include entries that are not in use')
+
+   (options, args)=parser.parse_args()
+   if not options.filename:
+      print('Sorry, this script requires an image file')
+      return -1
+   try:
+      offset=volumeOffset(options.filename, options.offset, options.partition)
+   except ValueError as e:
+      print(e)
+      return -1
+   threads=int(options.threads) if options.threads else 4
+   minSize=max(1, int(options.minSize)) if options.minSize else 1
+
+   with open(options.filename, 'rb') as f:
+      f.seek(offset)
+      vbr=Vbr(f.read(512))
+   if options.mftFile:
+      reader=MftReader(mftFilename=options.mftFile)
+   else:
+      reader=MftReader(imageFilename=options.filename, vbr=vbr)
+
+   # stage 1: sizes from the MFT alone
+   # the streams from this pass are kept (they only hold
+   # their runs) so no record is read a second time
+   resolver=PathResolver()
+   streams={}
+   sequences={}
+   sized=[]
+   for number, mftEntry in reader.entries():
+      resolver.addEntry(number, mftEntry)
+      if mftEntry.baseFileMft()!=0 or mftEntry.isDirectory():
+         continue
+      if not mftEntry.inUse() and not options.deleted:
+         continue
+      for name, stream in getStreams(mftEntry, reader.entry).items():
+         if stream.isNamed() and not options.ads:
+            continue
+         if stream.isCompressed() or stream.isEncrypted():
+            continue
+         if stream.logicalSize() < minSize:
+            continue
+         key=(stream.firstLcn(), number, name)
+         streams[key]=stream
+         sequences[number]=mftEntry.sequenceNumber()
+         sized.append((stream.logicalSize(), key))
+   candidates=groupsOf(sized)
+   total=len(sized)
+   sized=None
+   # streams with a unique size are never needed again
+   streams=dict([(key, streams[key]) for group in candidates for key in group])
+
+   def jobs(work):
+      '''Streams in LCN order.'''
+      for key in sorted(work):
+         yield (key, streams[key])
+
+   engine=HashEngine(options.filename, vbr, threads, ('sha1',))
+   try:
+      # stage 2: first and last 64KB of files sharing a size
+      work=[item for group in candidates for item in group]
+      partial=[((stream.logicalSize(), hasher.hexdigest('sha1')), key)
+               for key, stream, hasher in engine.hashStreams(jobs(work), ENDS_SIZE)]
+      candidates=groupsOf(partial)
+      partialCount=len(work)
+
+      # stage 3: full hashes, files no bigger than the two ends
+      # were already hashed completely
+      sizes={}
+      for (size, digest), key in partial:
+         sizes[key]=(size, digest)
+      final=[]
+      work=[]
+      for group in candidates:
+         if sizes[group[0]][0] <= 2 * ENDS_SIZE:
+            final+=[(sizes[key], key) for key in group]
+         else:
+            work+=group
+      final+=[((stream.logicalSize(), hasher.hexdigest('sha1')), key)
+              for key, stream, hasher in engine.hashStreams(jobs(work))]
+   finally:
+      engine.close()
+   print('Streams:', total, 'partially hashed:', partialCount,
+         'fully hashed:', len(work), file=sys.stderr)
+
+   printHeader()
+   groups=groupsOf(final)
+   groups.sort(key=lambda g: -sizes[g[0]][0])
+   digests=dict([(key, digest) for digest, key in final])
+   for setNumber, group in enumerate(groups, 1):
+      for lcn, number, name in sorted(group, key=lambda k: k[1:]):
+         size, digest=digests[(lcn, number, name)]
+         print(setNumber, size, digest, number, sequences[number],
+               '"'+str(resolver.path(number))+'"', '"'+name+'"', sep=';')
+
+if __name__=='__main__':
+   main()
@@ -0,0 +1,91 @@
+#!/usr/bin/python3
+'''Simple script to list every alternate data
+stream on a volume along with its size.  Nothing
+is extracted.  The MFT is read in a single pass
+from an MFT file or directly from an image.
+Create by Dr. Phil Polstra (@ppolstra)
+for PentesterAcademy.com.'''
+
+from mft import *
+import optparse
+from vbr import Vbr
+from volumes import volumeOffset, addPartitionOption
+from mftreader import MftReader
+
+def printHeader():
+   '''Prints the header listing columns.'''
+   print('MftEntry;UpdateSequence;InUse;Filename;Stream;StreamSize;Resident')
+
+def longestName(mftEntry):
+   '''Returns the longest filename for an entry.'''
+   fname=''
+   for fnameAttr in mftEntry.attributesOfType(0x30):
+      if len(fnameAttr.filename()) > len(fname):
+         fname=fnameAttr.filename()
+   return fname
+
+def main():
+   parser=optparse.OptionParser()
+   parser.add_option("-f", "--file", dest="filename",
+               help="image filename")
+   parser.add_option("-o", "--offset", dest='offset',
+               help='offset in sectors to start of volume')
+   addPartitionOption(parser)
+   parser.add_option('-m', '--mft', dest='mftFile',
+               help='MFT file')
+   parser.add_option('-d', '--deleted', dest='deleted', action='store_true',
+               help='include entries that are not in use')
+
+   (options, args)=parser.parse_args()
+   try:
+      offset=volumeOffset(options.filename, options.offset, options.partition)
+   except ValueError as e:
+      print(e)
+      return -1
+
+   if options.mftFile:
+      reader=MftReader(mftFilename=options.mftFile)
+   elif options.filename:
+      with open(options.filename, 'rb') as f:
+         f.seek(offset)
+         buffer=f.read(512)
+      reader=MftReader(imageFilename=options.filename, vbr=Vbr(buffer))
+   else:
+      print('Sorry, this script requires an MFT file or an image')
+      return -1
+
+   # one pass over the MFT.  Streams stored in extension
+   # entries are credited to the base entry.
+   # Each stream is (base entry, name) -> [size, resident]
+   streams={}
+   names={}
+   for number, mftEntry in reader.entries():
+      if not mftEntry.inUse() and not options.deleted:
+         continue
+      if mftEntry.baseFileMft()!=0:
+         base=mftEntry.baseFileMft()
+      else:
+         base=number
+         names[base]=(mftEntry.sequenceNumber(), mftEntry.inUse(), longestName(mftEntry))
+      for dataAttr in mftEntry.attributesOfType(0x80):
+         if not dataAttr.hasName():
+            continue
+         key=(base, dataAttr.nameString())
+         if dataAttr.isResident():
+            streams[key]=[len(dataAttr.data()), True]
+         elif dataAttr.firstVcn()==0:
+            streams[key]=[dataAttr.logicalSize(), False]
+         elif key not in streams:
+            streams[key]=[0, False]
+
+   printHeader()
+   for (base, name) in sorted(streams.keys()):
+      size, resident=streams[(base, name)]
+      if base in names:
+         seq, inUse, fname=names[base]
+      else:
+         seq, inUse, fname=(0, False, '<unknown>')
+      print(base, seq, inUse, '"'+fname+'"', '"'+name+'"', size, resident, sep=';')
+
+if __name__=='__main__':
+   main()
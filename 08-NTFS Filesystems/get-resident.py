@@ -0,0 +1,112 @@
+#!/usr/bin/python3
+'''Simple script to pull every resident data
+stream out of an exported MFT file.  Small files
+such as LNK files, prefetch fragments, scripts and
+Zone.Identifier streams often live entirely inside
+the MFT so no image is needed.  The MFT is read in
+one sequential pass and streams are written to a
+directory or a tar file (use - for stdout).
+Create by Dr. Phil Polstra (@ppolstra)
+for PentesterAcademy.com.'''
+
+from mft import *
+import optparse
+import fnmatch
+import tarfile
+import calendar
+import io
+import sys
+from mftreader import MftReader
+
+def longestName(mftEntry):
+   '''Returns the longest filename attribute
+   for an entry or None.'''
+   longest=None
+   for fnameAttr in mftEntry.attributesOfType(0x30):
+      if not longest or fnameAttr.nameLength() > longest.nameLength():
+         longest=fnameAttr
+   return longest
+
+def safeName(name):
+   '''Names from deleted or damaged entries can
+   contain anything so make them safe to write.'''
+   return name.replace('/', '_').replace('\x00', '_')
+
+def main():
+   parser=optparse.OptionParser()
+   parser.add_option('-m', '--mft', dest='mftFile',
+               help='MFT file')
+   parser.add_option('-d', '--directory', dest='directory',
+               help='output directory')
+   parser.add_option('-t', '--tar', dest='tarFile',
+               help='write a tar file instead (- for stdout)')
+   parser.add_option('-n', '--name', dest='namePattern',
+               help='only files matching this glob (e.g. *.lnk)')
+   parser.add_option('-s', '--stream', dest='streamPattern',
+               help='only streams matching this glob (e.g. Zone.Identifier)')
+   parser.add_option('-D', '--deleted', dest='deleted', action='store_true',
+               help='include entries that are not in use')
+
+   (options, args)=parser.parse_args()
+   if not options.mftFile:
+      print('Sorry, this script requires an MFT file')
+      return -1
+
+   tar=None
+   outDir='./'
+   if options.tarFile:
+      if options.tarFile=='-':
+         tar=tarfile.open(fileobj=sys.stdout.buffer, mode='w|')
+      else:
+         tar=tarfile.open(options.tarFile, mode='w|')
+   elif options.directory:
+      outDir=options.directory
+      if outDir[len(outDir)-1]!='/':
+         outDir+='/'
+   # progress goes to stderr so a tar can go to stdout
+   log=sys.stderr if tar else sys.stdout
+
+   reader=MftReader(mftFilename=options.mftFile)
+   count=0
+   for number, mftEntry in reader.entries():
+      if not mftEntry.inUse() and not options.deleted:
+         continue
+      dataAttrs=[a for a in mftEntry.attributesOfType(0x80)
+                  if a.isResident() and a.data()]
+      if len(dataAttrs)==0:
+         continue
+      # resident streams in extension entries belong to the base entry
+      base=mftEntry.baseFileMft() or number
+      nameEntry=mftEntry if base==number else reader.entry(base)
+      fnameAttr=longestName(nameEntry) if nameEntry and nameEntry.isValid() else None
+      fname=fnameAttr.filename() if fnameAttr else 'unknown'
+      if options.namePattern and not fnmatch.fnmatch(fname.lower(),
+                     options.namePattern.lower()):
+         continue
+      for dataAttr in dataAttrs:
+         streamName=dataAttr.nameString()
+         if options.streamPattern and not fnmatch.fnmatch(streamName.lower(),
+                     options.streamPattern.lower()):
+            continue
+         outName=str(base)+'-'+safeName(fname)
+         if streamName:
+            outName+='-ads-'+safeName(streamName)
+         data=dataAttr.data()
+         if tar:
+            info=tarfile.TarInfo(outName)
+            info.size=len(data)
+            stdInfo=nameEntry.attributesOfType(0x10) if nameEntry else []
+            if len(stdInfo) > 0:
+               info.mtime=calendar.timegm(stdInfo[0].modificationTime())
+            tar.addfile(info, io.BytesIO(data))
+         else:
+            with open(outDir+outName, 'wb') as outFile:
+               outFile.write(data)
+         print('Extracted', outName, len(data), file=log)
+         count+=1
+   if tar:
+      tar.close()
+   print('Extracted', count, 'resident streams', file=log)
+
+if __name__=='__main__':
+   main()
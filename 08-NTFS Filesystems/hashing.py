@@ -0,0 +1,110 @@
+#!/usr/bin/python3
+
+'''Helpers for hashing file contents.  Several
+hash algorithms are fed from the same buffer so
+data only has to be read once.  HashEngine hashes
+many streams from an image with a pool of threads;
+hashlib and os.pread release the GIL so the
+threads really do run in parallel.
+Created by Dr. Phil Polstra
+for PentesterAcademy.com'''
+
+__all__=['MultiHash', 'HashEngine', 'DEFAULT_ALGORITHMS', 'FUZZY_ALGORITHM']
+
+import hashlib
+import os
+import collections
+from concurrent.futures import ThreadPoolExecutor
+from stream import StreamReader
+from ctph import FuzzyHash
+
+DEFAULT_ALGORITHMS=('md5', 'sha1', 'sha256')
+FUZZY_ALGORITHM='ssdeep'
+
+class MultiHash:
+	'''Computes several hashes from a single read.
+	Each call to update() is passed to every hash.
+	'ssdeep' may be given as an algorithm for a fuzzy
+	hash.'''
+	def __init__(self, algorithms=DEFAULT_ALGORITHMS):
+		self._algorithms=tuple(algorithms)
+		self._hashes=[FuzzyHash() if a=='ssdeep' else hashlib.new(a)
+			for a in self._algorithms]
+		self._size=0
+
+	def update(self, data):
+		for h in self._hashes:
+			h.update(data)
+		self._size+=len(data)
+
+	def algorithms(self):
+		return self._algorithms
+
+	def size(self):
+		'''Number of bytes hashed so far.'''
+		return self._size
+
+	def hexdigest(self, algorithm):
+		return self._hashes[self._algorithms.index(algorithm)].hexdigest()
+
+	def hexdigests(self):
+		'''Returns a list of hex digests in the same
+		order as the algorithms.'''
+		return [h.hexdigest() for h in self._hashes]
+
+class HashEngine:
+	'''Hashes NtfsStream objects read from an image.
+	One file descriptor is shared by all threads.'''
+	def __init__(self, imageFilename, vbr, threads=4,
+					algorithms=DEFAULT_ALGORITHMS, chunkSize=1048576):
+		self._vbr=vbr
+		self._threads=max(1, threads)
+		self._algorithms=algorithms
+		self._chunkSize=chunkSize
+		self._fd=os.open(imageFilename, os.O_RDONLY)
+
+	def close(self):
+		os.close(self._fd)
+
+	def hashStream(self, stream):
+		'''Reads a whole stream and returns its MultiHash.'''
+		hasher=MultiHash(self._algorithms)
+		reader=StreamReader(stream, self._vbr, self._fd, hasher, self._chunkSize)
+		for chunk in reader.readChunks():
+			pass
+		return hasher
+
+	def hashEnds(self, stream, size=65536):
+		'''Hashes only the first and last size bytes of a
+		stream.  Streams up to twice size long are hashed
+		completely.'''
+		hasher=MultiHash(self._algorithms)
+		reader=StreamReader(stream, self._vbr, self._fd, None, self._chunkSize)
+		hasher.update(reader.read(size))
+		reader.seek(max(size, stream.logicalSize() - size))
+		hasher.update(reader.read(size))
+		return hasher
+
+	def hashStreams(self, jobs, ends=None):
+		'''Generator that hashes (key, stream) pairs and
+		yields (key, stream, MultiHash) in the order given.
+		Jobs should already be sorted by LCN so the threads
+		read neighbouring parts of the image.  Only a few
+		jobs per thread are in flight at a time.  If ends
+		is given only that many bytes at the start and end
+		of each stream are hashed.'''
+		if ends:
+			hashFunction=lambda stream: self.hashEnds(stream, ends)
+		else:
+			hashFunction=self.hashStream
+		window=self._threads * 4
+		pending=collections.deque()
+		with ThreadPoolExecutor(max_workers=self._threads) as pool:
+			for key, stream in jobs:
+				pending.append((key, stream, pool.submit(hashFunction, stream)))
+				if len(pending) >= window:
+					key, stream, future=pending.popleft()
+					yield (key, stream, future.result())
+			while pending:
+				key, stream, future=pending.popleft()
+				yield (key, stream, future.result())
@@ -0,0 +1,193 @@
+#!/usr/bin/python3
+
+'''Compact on-disk hash sets for known file
+filtering (NSRL style).  A hash set is a sorted
+file of fixed-width binary digests that is mmapped
+and binary searched so it uses almost no memory no
+matter how large it is.  An optional Bloom filter
+stored at the end of the file is loaded into
+memory so most misses never touch the digests.
+Created by Dr. Phil Polstra
+for PentesterAcademy.com'''
+
+__all__=['HashSet', 'buildHashSet', 'BloomFilter']
+
+import struct
+import mmap
+import re
+import optparse
+from extsort import externalSort
+
+MAGIC=b'NTHS'
+VERSION=1
+HEADER_SIZE=32
+# digest size -> hashlib algorithm name
+ALGORITHMS={16:'md5', 20:'sha1', 32:'sha256'}
+
+class BloomFilter:
+	'''Bloom filter keyed by digests.  Digests are already
+	uniformly random so the bit positions are taken from
+	the digest itself using double hashing.'''
+	def __init__(self, bits, hashes=7, data=None):
+		# whole bytes so the size is the same when reloaded from data
+		self._bits=(max(8, bits) + 7) // 8 * 8
+		self._hashes=hashes
+		if data==None:
+			self._data=bytearray(self._bits // 8)
+		else:
+			self._data=bytearray(data)
+			self._bits=len(self._data) * 8
+
+	def _positions(self, digest):
+		h1=int.from_bytes(digest[0:8], 'little')
+		h2=int.from_bytes(digest[8:16], 'little') | 1
+		for i in range(self._hashes):
+			yield (h1 + i * h2) % self._bits
+
+	def add(self, digest):
+		for pos in self._positions(digest):
+			self._data[pos >> 3]|=1 << (pos & 7)
+
+	def mightContain(self, digest):
+		for pos in self._positions(digest):
+			if not self._data[pos >> 3] & (1 << (pos & 7)):
+				return False
+		return True
+
+	def hashes(self):
+		return self._hashes
+
+	def data(self):
+		return bytes(self._data)
+
+class HashSet:
+	'''A sorted file of binary digests.  Membership tests
+	accept binary digests or hex strings.'''
+	def __init__(self, filename, useBloom=True):
+		self._file=open(filename, 'rb')
+		self._map=mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+		(magic, version, self._digestSize, self._count,
+			bloomBytes, bloomHashes)=struct.unpack('<4sHHQQB', self._map[:25])
+		if magic!=MAGIC:
+			raise ValueError(filename + ' is not a hash set')
+		self._bloom=None
+		if useBloom and bloomBytes:
+			start=HEADER_SIZE + self._count * self._digestSize
+			self._bloom=BloomFilter(0, bloomHashes, self._map[start:start+bloomBytes])
+
+	def close(self):
+		self._map.close()
+		self._file.close()
+
+	def count(self):
+		return self._count
+
+	def digestSize(self):
+		return self._digestSize
+
+	def algorithm(self):
+		'''Name of the hash algorithm this set holds.'''
+		return ALGORITHMS[self._digestSize]
+
+	def digest(self, index):
+		pos=HEADER_SIZE + index * self._digestSize
+		return self._map[pos:pos+self._digestSize]
+
+	def contains(self, digest):
+		if isinstance(digest, str):
+			digest=bytes.fromhex(digest)
+		if len(digest)!=self._digestSize:
+			return False
+		if self._bloom and not self._bloom.mightContain(digest):
+			return False
+		lo=0
+		hi=self._count
+		while lo < hi:
+			mid=(lo + hi) // 2
+			d=self.digest(mid)
+			if d < digest:
+				lo=mid + 1
+			elif d > digest:
+				hi=mid
+			else:
+				return True
+		return False
+
+	def __contains__(self, digest):
+		return self.contains(digest)
+
+	def __len__(self):
+		return self._count
+
+def parseDigests(lines, digestSize):
+	'''Generator that pulls the first hex string of the
+	right length from each line.  This handles plain hash
+	lists, md5sum/sha1sum output and NSRL CSV files.'''
+	pattern=re.compile(r'\b([0-9a-fA-F]{%d})\b' % (digestSize * 2))
+	for line in lines:
+		match=pattern.search(line)
+		if match:
+			yield bytes.fromhex(match.group(1))
+
+def buildHashSet(outFilename, digests, digestSize, bloomBitsPerEntry=10,
+					runSize=1000000, tmpDir=None):
+	'''Builds a hash set file from an iterable of binary
+	digests.  Digests are sorted with an external merge
+	sort and duplicates removed.  Returns the number of
+	digests written.'''
+	count=0
+	with open(outFilename, 'w+b') as f:
+		f.write(b'\x00' * HEADER_SIZE)
+		for digest in externalSort(digests, runSize=runSize, tmpDir=tmpDir, unique=True):
+			f.write(digest)
+			count+=1
+		bloomBytes=0
+		bloomHashes=0
+		if bloomBitsPerEntry:
+			# a second pass over the sorted digests fills the filter
+			bloom=BloomFilter(count * bloomBitsPerEntry)
+			f.seek(HEADER_SIZE)
+			for i in range(count):
+				bloom.add(f.read(digestSize))
+			data=bloom.data()
+			f.seek(0, 2)
+			f.write(data)
+			bloomBytes=len(data)
+			bloomHashes=bloom.hashes()
+		f.seek(0)
+		f.write(struct.pack('<4sHHQQB', MAGIC, VERSION, digestSize, count,
+			bloomBytes, bloomHashes))
+	return count
+
+def main():
+	parser=optparse.OptionParser(
+		'usage %prog -b hashset -a sha1 hashlist... | -s hashset hash...')
+	parser.add_option('-b', '--build', dest='build',
+					help='build this hash set from the hash lists given')
+	parser.add_option('-a', '--algorithm', dest='algorithm', default='sha1',
+					help='md5, sha1 or sha256 (default sha1)')
+	parser.add_option('-n', '--no-bloom', dest='noBloom', action='store_true',
+					help='do not add a Bloom filter')
+	parser.add_option('-s', '--search', dest='search',
+					help='look up the hashes given in this hash set')
+	(options, args)=parser.parse_args()
+	if options.build:
+		digestSize={v:k for k, v in ALGORITHMS.items()}[options.algorithm]
+		def lines():
+			for name in args:
+				with open(name, 'r', errors='ignore') as f:
+					for line in f:
+						yield line
+		count=buildHashSet(options.build, parseDigests(lines(), digestSize), digestSize,
+			0 if options.noBloom else 10)
+		print('Wrote', count, 'unique', options.algorithm, 'hashes to', options.build)
+	elif options.search:
+		hashSet=HashSet(options.search)
+		for h in args:
+			print(h, 'known' if h in hashSet else 'unknown')
+		hashSet.close()
+	else:
+		parser.print_help()
+
+if __name__=='__main__':
+	main()
@@ -0,0 +1,211 @@
+#!/usr/bin/python3
+
+'''Full path resolution for MFT entries.  The
+parent reference and name of every entry are
+collected in one pass over the MFT after which
+any entry can be turned into a full path.
+Junction and symbolic link targets are collected in
+the same pass so paths through them can be followed.
+Created by Dr. Phil Polstra
+for PentesterAcademy.com'''
+
+__all__=['PathResolver', 'bestFilename', 'volumePath']
+
+import posixpath
+
+ROOT_ENTRY=5
+ORPHAN_DIRECTORY='$OrphanFiles'
+# junctions and links followed before giving up
+MAX_REPARSE_HOPS=32
+
+def bestFilename(mftEntry):
+	'''Returns the $30 attribute to use for naming an
+	entry.  Long (Win32/POSIX) names are preferred over
+	DOS 8.3 names.'''
+	best=None
+	for fnameAttr in mftEntry.attributesOfType(0x30):
+		if (best==None or (best.namespace()==2 and fnameAttr.namespace()!=2)
+				or (fnameAttr.namespace()!=2 and fnameAttr.nameLength() > best.nameLength())):
+			best=fnameAttr
+	return best
+
+def volumePath(target, driveLetter=None):
+	'''Converts a junction or link target such as
+	\\??\\C:\\Users\\x to a path inside the volume
+	(/Users/x).  Relative targets are only converted to
+	forward slashes.  Drive letters are not stored in
+	the volume so targets with one are only converted if
+	driveLetter is the letter this volume was mounted as.
+	Returns None for targets on other volumes such as
+	another drive, \\??\\UNC\\server\\share or a volume
+	GUID.'''
+	if target.startswith('\\??\\') or target.startswith('\\\\?\\'):
+		target=target[4:]
+	if target.upper().startswith('UNC\\') or target.startswith('\\\\'):
+		return None
+	if target.startswith('Volume{'):
+		return None
+	if len(target) >= 2 and target[1]==':':
+		if not driveLetter or target[0].upper()!=driveLetter[0].upper():
+			return None
+		target=target[2:]
+		if not target.startswith('\\'):
+			target='\\' + target
+	return target.replace('\\', '/')
+
+class PathResolver:
+	'''Maps MFT entry numbers to full paths.  Entries
+	are added with addEntry() (normally during a bulk
+	pass) and paths built on demand with path().  If
+	entryReader (such as MftReader.entry) is given
+	entries that were not added are read when needed,
+	which is quicker when only a few paths are wanted.
+	driveLetter is the letter the volume was mounted as,
+	without it link targets with a drive letter are
+	treated as off the volume.'''
+	def __init__(self, entryReader=None, driveLetter=None):
+		# entry -> (sequence, parent, parent sequence, name)
+		self._entries={}
+		self._dirCache={}
+		self._entryReader=entryReader
+		self._tried=set()
+		# entry -> (substitute name, relative)
+		self._reparse={}
+		self._linkPaths=None
+		self._driveLetter=driveLetter
+
+	def _load(self, number):
+		'''Reads a missing entry with the entry reader.'''
+		if number in self._entries or not self._entryReader or number in self._tried:
+			return
+		self._tried.add(number)
+		mftEntry=self._entryReader(number)
+		if mftEntry and mftEntry.isValid():
+			self.addEntry(number, mftEntry)
+
+	def addEntry(self, number, mftEntry):
+		'''Record the name and parent of an entry.
+		Extension entries are ignored.'''
+		if mftEntry.baseFileMft()!=0:
+			return
+		reparse=mftEntry.reparsePoint()
+		if reparse and (reparse.isJunction() or reparse.isSymlink()):
+			self._reparse[number]=(reparse.substituteName() or reparse.printName(),
+				reparse.isRelative())
+			self._linkPaths=None
+		fnameAttr=bestFilename(mftEntry)
+		if fnameAttr==None:
+			return
+		self._entries[number]=(mftEntry.sequenceNumber(), fnameAttr.parentMft(),
+			fnameAttr.parentSequenceNumber(), fnameAttr.filename())
+
+	@classmethod
+	def fromReader(cls, reader, driveLetter=None):
+		'''Builds a resolver from one pass of an MftReader.'''
+		resolver=cls(driveLetter=driveLetter)
+		for number, mftEntry in reader.entries():
+			resolver.addEntry(number, mftEntry)
+		return resolver
+
+	def hasEntry(self, number):
+		return number in self._entries
+
+	def name(self, number):
+		if number in self._entries:
+			return self._entries[number][3]
+		return None
+
+	def parent(self, number):
+		if number in self._entries:
+			return self._entries[number][1]
+		return None
+
+	def _directoryPath(self, number, depth=0):
+		'''Path of a directory with a trailing slash.
+		Directories whose entry was reused or is missing
+		are placed under $OrphanFiles.'''
+		if number==ROOT_ENTRY:
+			return '/'
+		if number in self._dirCache:
+			return self._dirCache[number]
+		self._load(number)
+		if number not in self._entries or depth > 255:
+			return '/' + ORPHAN_DIRECTORY + '/'
+		seq, parent, parentSeq, name=self._entries[number]
+		retStr=self._parentPath(parent, parentSeq, depth) + name + '/'
+		self._dirCache[number]=retStr
+		return retStr
+
+	def _parentPath(self, parent, parentSeq, depth=0):
+		if parent==ROOT_ENTRY:
+			return '/'
+		self._load(parent)
+		if (parent not in self._entries or
+				self._entries[parent][0]!=parentSeq):
+			return '/' + ORPHAN_DIRECTORY + '/'
+		return self._directoryPath(parent, depth + 1)
+
+	def path(self, number):
+		'''Full path for an entry or None if unknown.'''
+		if number==ROOT_ENTRY:
+			return '/'
+		self._load(number)
+		if number not in self._entries:
+			return None
+		seq, parent, parentSeq, name=self._entries[number]
+		return self._parentPath(parent, parentSeq) + name
+
+	def reparseTarget(self, number):
+		'''Raw target of a junction or symbolic link or
+		None.'''
+		if number in self._reparse:
+			return self._reparse[number][0]
+		return None
+
+	def _reparsePaths(self):
+		'''Map from the path of each junction and link to
+		its entry number, built the first time it is needed.'''
+		if self._linkPaths==None:
+			self._linkPaths={}
+			for number in self._reparse:
+				linkPath=self.path(number)
+				if linkPath:
+					self._linkPaths[linkPath.lower()]=number
+		return self._linkPaths
+
+	def resolvePath(self, path):
+		'''Follows any junctions and symbolic links in a
+		volume path using only the entries already added.
+		Returns the resolved path or None if it leaves the
+		volume or loops.'''
+		links=self._reparsePaths()
+		path=posixpath.normpath('/' + path.replace('\\', '/').lstrip('/'))
+		for hop in range(MAX_REPARSE_HOPS):
+			parts=path.split('/')
+			for i in range(2, len(parts) + 1):
+				prefix='/'.join(parts[:i])
+				if prefix.lower() in links:
+					break
+			else:
+				return path
+			target, relative=self._reparse[links[prefix.lower()]]
+			if relative:
+				target=posixpath.join(posixpath.dirname(prefix), target.replace('\\', '/'))
+			else:
+				target=volumePath(target, self._driveLetter)
+				if target==None:
+					return None
+			rest='/'.join(parts[i:])
+			path=posixpath.normpath(posixpath.join(target, rest) if rest else target)
+			if not path.startswith('/'):
+				path='/' + path
+		return None
+
+	def resolvedTarget(self, number):
+		'''Final path a junction or link points to or None.'''
+		if number not in self._reparse:
+			return None
+		linkPath=self.path(number)
+		if linkPath==None:
+			return None
+		return self.resolvePath(linkPath)
@@ -0,0 +1,217 @@
+#!/usr/bin/python3
+'''Simple script to plan the recovery of deleted
+files.  The clusters of every deleted file are
+checked against the volume $Bitmap and against the
+extents of every file that is still in use, so a
+file whose clusters were reused is spotted without
+reading any file content.  Each file is scored as
+free (every cluster is unallocated), partial or
+overwritten.  With -d the recoverable files are
+extracted in one pass in LCN order.  Clusters of
+partial files that are in use by something else are
+written as zeroes.
+Create by Dr. Phil Polstra (@ppolstra)
+for PentesterAcademy.com.'''
+
+from mft import *
+import optparse
+import os
+from collections import OrderedDict
+from vbr import Vbr
+from volumes import volumeOffset, addPartitionOption
+from mftreader import MftReader
+from stream import getStreams, sweepStreams
+from paths import PathResolver
+from extentmap import ExtentMap, ClusterBitmap, entryExtents
+
+SCORE_FREE='free'
+SCORE_PARTIAL='partial'
+SCORE_OVERWRITTEN='overwritten'
+# output files kept open at once during the sweep
+MAX_OPEN_FILES=64
+
+class OutputFiles:
+   '''Output files opened as pieces arrive, with only the
+   most recently used few kept open so thousands of
+   files do not run out of file descriptors.'''
+   def __init__(self, names, maxOpen=MAX_OPEN_FILES):
+      self._names=names
+      self._maxOpen=maxOpen
+      self._open=OrderedDict()
+
+   def get(self, key):
+      if key in self._open:
+         self._open.move_to_end(key)
+      else:
+         if len(self._open) >= self._maxOpen:
+            self._open.popitem(last=False)[1].close()
+         self._open[key]=open(self._names[key], 'r+b')
+      return self._open[key]
+
+   def write(self, key, offset, data):
+      outFile=self.get(key)
+      outFile.seek(offset)
+      outFile.write(data)
+
+   def close(self):
+      for outFile in self._open.values():
+         outFile.close()
+      self._open.clear()
+
+def printHeader():
+   '''Prints the header listing columns.'''
+   print('MftEntry;UpdateSequence;Stream;FileSize;Clusters;FreeClusters;'
+         'Score;LiveOwners;Path')
+
+def neededExtents(stream, bpc):
+   '''Allocated (lcn, count) extents of a stream that
+   hold data below the logical size.'''
+   needed=(stream.logicalSize() + bpc - 1) // bpc
+   extents=[]
+   for vcn, lcn, count in stream.extents():
+      if lcn==None or vcn >= needed:
+         continue
+      extents.append((lcn, min(count, needed - vcn)))
+   return extents
+
+def checkStream(stream, bpc, bitmap, extentMap):
+   '''Returns (clusters, free clusters, owners) for
+   a deleted stream.  A cluster is taken if $Bitmap
+   marks it allocated or a live file claims it.'''
+   clusters=0
+   taken=0
+   owners=set()
+   for lcn, count in neededExtents(stream, bpc):
+      clusters+=count
+      taken+=bitmap.allocatedCount(lcn, count)
+      # claimed clusters $Bitmap shows as free are taken too
+      for start, n in extentMap.claimedRanges(lcn, count):
+         taken+=n - bitmap.allocatedCount(start, n)
+      owners.update(extentMap.owners(lcn, count))
+   return (clusters, clusters - taken, sorted(owners))
+
+def takenClusters(stream, bpc, bitmap, extentMap):
+   '''List of (vcn, count) ranges of a stream whose
+   clusters are allocated or claimed by a live file.'''
+   taken=[]
+   vcn=0
+   for extentVcn, lcn, count in stream.extents():
+      if lcn==None:
+         continue
+      claimed=set()
+      for start, n in extentMap.claimedRanges(lcn, count):
+         claimed.update(range(start, start + n))
+      for i in range(count):
+         if bitmap.isAllocated(lcn + i) or lcn + i in claimed:
+            if taken and taken[-1][0] + taken[-1][1]==extentVcn + i:
+               taken[-1][1]+=1
+            else:
+               taken.append([extentVcn + i, 1])
+   return taken
+
+def score(clusters, free):
+   if free==clusters:
+      return SCORE_FREE
+   if free==0:
+      return SCORE_OVERWRITTEN
+   return SCORE_PARTIAL
+
+def main():
+   parser=optparse.OptionParser()
+   parser.add_option("-f", "--file", dest="filename",
+               help="image filename")
+   parser.add_option("-o", "--offset", dest='offset',
+               help='offset in sectors to start of volume')
+   addPartitionOption(parser)
+   parser.add_option('-m', '--mft', dest='mftFile',
+               help='MFT file')
+   parser.add_option('-d', '--directory', dest='directory',
+               help='extract recoverable files to this directory')
+   parser.add_option('-p', '--partial', dest='partial', action='store_true',
+               help='also extract partially overwritten files')
+   parser.add_option('-a', '--ads', dest='ads', action='store_true',
+               help='also check alternate data streams')
+
+   (options, args)=parser.parse_args()
+   if not options.filename:
+      print('Sorry, this script requires an image file')
+      return -1
+   try:
+      offset=volumeOffset(options.filename, options.offset, options.partition)
+   except ValueError as e:
+      print(e)
+      return -1
+
+   with open(options.filename, 'rb') as f:
+      f.seek(offset)
+      vbr=Vbr(f.read(512))
+   if options.mftFile:
+      reader=MftReader(mftFilename=options.mftFile)
+   else:
+      reader=MftReader(imageFilename=options.filename, vbr=vbr)
+   bitmap=ClusterBitmap(reader, vbr, options.filename)
+   if not bitmap.isValid():
+      print('$Bitmap could not be read...Exiting')
+      return -1
+   bpc=vbr.bytesPerCluster()
+
+   # one pass collects live extents and deleted streams
+   resolver=PathResolver()
+   live=[]
+   deleted=[]
+   for number, mftEntry in reader.entries():
+      resolver.addEntry(number, mftEntry)
+      if mftEntry.inUse():
+         live+=entryExtents(number, mftEntry)
+      elif mftEntry.baseFileMft()==0 and not mftEntry.isDirectory():
+         for name, stream in getStreams(mftEntry, reader.entry).items():
+            if stream.isResident() or (stream.isNamed() and not options.ads):
+               continue
+            deleted.append((number, mftEntry.sequenceNumber(), stream))
+   extentMap=ExtentMap(live)
+   live=None
+
+   printHeader()
+   recoverable=[]
+   for number, seq, stream in deleted:
+      clusters, free, owners=checkStream(stream, bpc, bitmap, extentMap)
+      result=score(clusters, free)
+      print(number, seq, '"'+stream.name()+'"', stream.logicalSize(), clusters, free,
+            result, ','.join([str(o) for o in owners]),
+            '"'+str(resolver.path(number))+'"', sep=';')
+      if result==SCORE_FREE or (result==SCORE_PARTIAL and options.partial):
+         recoverable.append((number, stream, result))
+
+   if not options.directory:
+      return
+   outDir=options.directory
+   if not os.path.isdir(outDir):
+      os.makedirs(outDir)
+   # files are created at full size now and reopened as needed
+   outNames={}
+   for number, stream, result in recoverable:
+      name=os.path.basename(str(resolver.path(number))) or str(number)
+      if stream.isNamed():
+         name+='-ads-'+stream.name()
+      outNames[stream]=os.path.join(outDir, str(number)+'-'+name)
+      with open(outNames[stream], 'wb') as outFile:
+         outFile.truncate(stream.logicalSize())
+   outFiles=OutputFiles(outNames)
+
+   # every recoverable file is read in a single sweep
+   try:
+      sweepStreams(options.filename, vbr, list(outNames.keys()), outFiles.write)
+      for number, stream, result in recoverable:
+         if result!=SCORE_PARTIAL:
+            continue
+         for vcn, count in takenClusters(stream, bpc, bitmap, extentMap):
+            start=vcn * bpc
+            end=min((vcn + count) * bpc, stream.logicalSize())
+            if start < end:
+               outFiles.write(stream, start, b'\x00' * (end - start))
+   finally:
+      outFiles.close()
+   print(len(outNames), 'files extracted to', outDir)
+
+if __name__=='__main__':
+   main()
@@ -0,0 +1,82 @@
+#!/usr/bin/python3
+'''Simple script to list the reparse points on an
+NTFS volume: junctions, symbolic links, WOF
+compressed files, cloud placeholders and the rest.
+Only records with the reparse point flag set in $10
+have their $C0 attribute decoded.  Paths and link
+targets come from the same pass over the MFT, so
+targets that go through other junctions are resolved
+without reading the volume again.
+Create by Dr. Phil Polstra (@ppolstra)
+for PentesterAcademy.com.'''
+
+from mft import *
+import optparse
+from vbr import Vbr
+from volumes import volumeOffset, addPartitionOption
+from mftreader import MftReader
+from paths import PathResolver
+
+def printHeader():
+   '''Prints the header listing columns.'''
+   print('MftEntry;UpdateSequence;Path;Tag;Type;Target;PrintName;Details;ResolvedTarget')
+
+def main():
+   parser=optparse.OptionParser()
+   parser.add_option("-f", "--file", dest="filename",
+               help="image filename")
+   parser.add_option("-o", "--offset", dest='offset',
+               help='offset in sectors to start of volume')
+   addPartitionOption(parser)
+   parser.add_option('-m', '--mft', dest='mftFile',
+               help='MFT file')
+   parser.add_option('-t', '--type', dest='type',
+               help='only list this type (junction, symlink, WOF, cloud...)')
+   parser.add_option('-d', '--deleted', dest='deleted', action='store_true',
+               help='also list deleted entries')
+   parser.add_option('-l', '--letter', dest='letter',
+               help='drive letter the volume was mounted as (link targets on other drives are off volume)')
+
+   (options, args)=parser.parse_args()
+   if options.mftFile:
+      reader=MftReader(mftFilename=options.mftFile)
+   elif options.filename:
+      try:
+         offset=volumeOffset(options.filename, options.offset, options.partition)
+      except ValueError as e:
+         print(e)
+         return -1
+      with open(options.filename, 'rb') as f:
+         f.seek(offset)
+         vbr=Vbr(f.read(512))
+      reader=MftReader(imageFilename=options.filename, vbr=vbr)
+   else:
+      print('Sorry, this script requires an MFT file or an image file')
+      return -1
+
+   # paths and reparse points are collected in one pass
+   resolver=PathResolver(driveLetter=options.letter)
+   found=[]
+   for number, mftEntry in reader.entries():
+      resolver.addEntry(number, mftEntry)
+      if not mftEntry.inUse() and not options.deleted:
+         continue
+      reparse=mftEntry.reparsePoint()
+      if reparse==None:
+         continue
+      if options.type and reparse.tagName().lower()!=options.type.lower():
+         continue
+      found.append((number, mftEntry.sequenceNumber(), reparse))
+
+   printHeader()
+   for number, seq, reparse in found:
+      resolved=''
+      if reparse.isJunction() or reparse.isSymlink():
+         resolved=resolver.resolvedTarget(number) or '<off volume>'
+      print(number, seq, '"'+str(resolver.path(number))+'"', '%08X' % reparse.tag(),
+            reparse.tagName(), '"'+reparse.substituteName()+'"',
+            '"'+reparse.printName()+'"', '"'+reparse.details()+'"',
+            '"'+resolved+'"', sep=';')
+
+if __name__=='__main__':
+   main()
@@ -0,0 +1,271 @@
+#!/usr/bin/python3
+
+'''Classes to read NTFS security descriptors.  Since
+NTFS 3.0 files only hold a security ID in $10 and the
+descriptors themselves are stored once in the $SDS
+stream of $Secure (MFT record 9).  $SDS is scanned
+once to build a small table of where each ID's
+descriptor is and descriptors are only read and
+parsed the first time an ID is looked up, so owner
+and ACL columns for millions of files cost about as
+much as the few thousand unique descriptors.
+Created by Dr. Phil Polstra
+for PentesterAcademy.com'''
+
+__all__=['SecurityDescriptor', 'Ace', 'SecureStore', 'sidString', 'sidName']
+
+import os
+import struct
+import functools
+import optparse
+from array import array
+from bisect import bisect_left
+from vbr import Vbr
+from volumes import volumeOffset, addPartitionOption
+from mftreader import MftReader
+from stream import getStreams, StreamReader
+
+# $SDS is written in 256KB blocks, each followed by a mirror copy
+SDS_BLOCK=262144
+SDS_HEADER=20
+
+WELL_KNOWN_SIDS={'S-1-1-0':'Everyone', 'S-1-3-0':'CREATOR OWNER',
+	'S-1-3-1':'CREATOR GROUP', 'S-1-5-7':'ANONYMOUS', 'S-1-5-11':'Authenticated Users',
+	'S-1-5-18':'SYSTEM', 'S-1-5-19':'LOCAL SERVICE', 'S-1-5-20':'NETWORK SERVICE',
+	'S-1-5-32-544':'Administrators', 'S-1-5-32-545':'Users', 'S-1-5-32-546':'Guests',
+	'S-1-5-32-547':'Power Users', 'S-1-5-32-551':'Backup Operators',
+	'S-1-5-80-956008885-3418522649-1831038044-1853292631-2271478464':'TrustedInstaller'}
+
+ACCESS_NAMES={0x1F01FF:'full', 0x1301BF:'modify', 0x1200A9:'read+exec',
+	0x120089:'read', 0x100116:'write', 0x10000000:'generic all',
+	0xA0000000:'generic read+exec', 0x80000000:'generic read'}
+
+ACE_TYPES={0:'allow', 1:'deny', 2:'audit', 3:'alarm', 5:'allow object',
+	6:'deny object', 7:'audit object'}
+
+def sidString(buffer, offset=0):
+	'''Returns (SID string such as S-1-5-18, length in
+	bytes) for a binary SID.'''
+	revision, count=struct.unpack_from('<BB', buffer, offset)
+	authority=int.from_bytes(buffer[offset+2:offset+8], 'big')
+	subs=struct.unpack_from('<' + 'L' * count, buffer, offset+8)
+	return ('S-%d-%d' % (revision, authority) + ''.join(['-%d' % s for s in subs]),
+		8 + 4 * count)
+
+def sidName(sid):
+	'''Well known name for a SID or the SID itself.'''
+	return WELL_KNOWN_SIDS.get(sid, sid)
+
+class Ace:
+	'''One access control entry.'''
+	def __init__(self, buffer, offset=0):
+		self._type, self._flags, self._size, self._mask=struct.unpack_from('<BBHL', buffer, offset)
+		# object ACEs have GUIDs before the SID
+		sidOffset=offset+8
+		if self._type in (5, 6, 7):
+			objectFlags=struct.unpack_from('<L', buffer, offset+8)[0]
+			sidOffset+=4 + 16 * bin(objectFlags & 0x03).count('1')
+		self._sid=sidString(buffer, sidOffset)[0]
+
+	def aceType(self):
+		return self._type
+
+	def flags(self):
+		return self._flags
+
+	def size(self):
+		return self._size
+
+	def mask(self):
+		return self._mask
+
+	def sid(self):
+		return self._sid
+
+	def isInherited(self):
+		return (self._flags & 0x10) != 0
+
+	def __str__(self):
+		retStr=(ACE_TYPES.get(self._type, str(self._type)) + ' ' + sidName(self._sid) +
+			' ' + ACCESS_NAMES.get(self._mask, '%X' % self._mask))
+		if self.isInherited():
+			retStr+=' (I)'
+		return retStr
+
+class SecurityDescriptor:
+	'''A self-relative security descriptor.'''
+	def __init__(self, buffer, offset=0):
+		(self._revision, self._sbz, self._control, ownerOffset, groupOffset,
+			saclOffset, daclOffset)=struct.unpack_from('<BBHLLLL', buffer, offset)
+		self._owner=sidString(buffer, offset+ownerOffset)[0] if ownerOffset else None
+		self._group=sidString(buffer, offset+groupOffset)[0] if groupOffset else None
+		self._dacl=self._acl(buffer, offset+daclOffset) if daclOffset else None
+		self._sacl=self._acl(buffer, offset+saclOffset) if saclOffset else None
+
+	def _acl(self, buffer, offset):
+		revision, sbz, size, count=struct.unpack_from('<BBHH', buffer, offset)
+		aces=[]
+		pos=offset+8
+		for i in range(count):
+			ace=Ace(buffer, pos)
+			aces.append(ace)
+			if ace.size() < 8:
+				break
+			pos+=ace.size()
+		return aces
+
+	def control(self):
+		return self._control
+
+	def owner(self):
+		return self._owner
+
+	def group(self):
+		return self._group
+
+	def dacl(self):
+		'''List of Ace objects, or None if there is no DACL
+		(which grants everyone full access).'''
+		return self._dacl
+
+	def sacl(self):
+		return self._sacl
+
+	def aclSummary(self):
+		'''Short one line description of the DACL.'''
+		if self._dacl==None:
+			return 'no DACL'
+		return ', '.join([str(ace) for ace in self._dacl])
+
+class SecureStore:
+	'''The descriptors in $Secure:$SDS indexed by
+	security ID.  Descriptors are read on demand and
+	the parsed ones kept in an LRU cache.'''
+	def __init__(self, reader, vbr, imageFilename, cacheSize=4096):
+		self._ids=array('L')
+		self._offsets=array('Q')
+		self._lengths=array('L')
+		self._fd=None
+		self._stream=None
+		mftEntry=reader.entry(9)
+		if mftEntry and mftEntry.isValid():
+			streams=getStreams(mftEntry, reader.entry)
+			self._stream=streams.get('$SDS')
+		if self._stream:
+			self._vbr=vbr
+			self._fd=os.open(imageFilename, os.O_RDONLY)
+			self._scan()
+		self.descriptor=functools.lru_cache(maxsize=cacheSize)(self._descriptor)
+
+	def _scan(self):
+		'''Reads $SDS once and records the ID, offset and
+		length of every entry.  Mirror blocks are skipped.'''
+		found={}
+		streamReader=StreamReader(self._stream, self._vbr, self._fd)
+		blockStart=0
+		while True:
+			block=streamReader.read(SDS_BLOCK)
+			if not block:
+				break
+			if (blockStart // SDS_BLOCK) % 2==0:
+				pos=0
+				while pos + SDS_HEADER <= len(block):
+					hashValue, secId, offset, length=struct.unpack_from('<LLQL', block, pos)
+					if (offset==blockStart + pos and length > SDS_HEADER and
+							pos + length <= len(block)):
+						if secId not in found:
+							found[secId]=(offset, length)
+						pos+=(length + 15) & ~15
+					else:
+						pos+=16
+			blockStart+=len(block)
+		for secId in sorted(found.keys()):
+			self._ids.append(secId)
+			self._offsets.append(found[secId][0])
+			self._lengths.append(found[secId][1])
+
+	def close(self):
+		if self._fd!=None:
+			os.close(self._fd)
+			self._fd=None
+
+	def isValid(self):
+		return len(self._ids) > 0
+
+	def securityIds(self):
+		return list(self._ids)
+
+	def _descriptor(self, securityId):
+		'''Reads and parses one descriptor.  Use descriptor()
+		which is the cached version of this.'''
+		i=bisect_left(self._ids, securityId)
+		if i==len(self._ids) or self._ids[i]!=securityId:
+			return None
+		streamReader=StreamReader(self._stream, self._vbr, self._fd)
+		streamReader.seek(self._offsets[i] + SDS_HEADER)
+		data=streamReader.read(self._lengths[i] - SDS_HEADER)
+		try:
+			return SecurityDescriptor(data)
+		except struct.error:
+			return None
+
+	def entryDescriptor(self, mftEntry):
+		'''Descriptor for an MFT entry from the security ID
+		in its $10 attribute.'''
+		stdInfos=mftEntry.attributesOfType(0x10)
+		if not stdInfos or not self._ids:
+			return None
+		return self.descriptor(stdInfos[0].securityID())
+
+	def ownerAndAcl(self, mftEntry):
+		'''(owner, ACL summary) strings for listings, empty
+		if there is no descriptor.'''
+		descriptor=self.entryDescriptor(mftEntry)
+		if descriptor==None:
+			return ('', '')
+		return (sidName(descriptor.owner() or ''), descriptor.aclSummary())
+
+def main():
+	parser=optparse.OptionParser()
+	parser.add_option('-f', '--file', dest='filename',
+					help='image filename')
+	parser.add_option('-o', '--offset', dest='offset',
+					help='offset in sectors to start of volume')
+	addPartitionOption(parser)
+	parser.add_option('-m', '--mft', dest='mftFile',
+					help='MFT file')
+	parser.add_option('-c', '--count', dest='count', action='store_true',
+					help='count the files using each descriptor')
+	(options, args)=parser.parse_args()
+	if not options.filename:
+		print('Sorry, this script requires an image file')
+		return -1
+	try:
+		offset=volumeOffset(options.filename, options.offset, options.partition)
+	except ValueError as e:
+		print(e)
+		return -1
+	with open(options.filename, 'rb') as f:
+		f.seek(offset)
+		vbr=Vbr(f.read(512))
+	if options.mftFile:
+		reader=MftReader(mftFilename=options.mftFile)
+	else:
+		reader=MftReader(imageFilename=options.filename, vbr=vbr)
+	store=SecureStore(reader, vbr, options.filename)
+	counts={}
+	if options.count:
+		for number, mftEntry in reader.entries():
+			for stdInfo in mftEntry.attributesOfType(0x10):
+				counts[stdInfo.securityID()]=counts.get(stdInfo.securityID(), 0) + 1
+	print('SecurityId;Files;Owner;Group;Acl')
+	for securityId in store.securityIds():
+		descriptor=store.descriptor(securityId)
+		if descriptor==None:
+			continue
+		print(securityId, counts.get(securityId, ''), sidName(descriptor.owner() or ''),
+			sidName(descriptor.group() or ''), '"'+descriptor.aclSummary()+'"', sep=';')
+	store.close()
+
+if __name__=='__main__':
+	main()
@@ -0,0 +1,299 @@
+#!/usr/bin/python3
+
+'''Classes and functions for working with NTFS
+data streams.  A file has an unnamed $DATA stream
+and may have any number of named (alternate) data
+streams.  A stream can be stored in several $80
+attributes spread across MFT entries when an
+attribute list is present.  Files compressed by the
+Windows Overlay Filter are read through their
+WofCompressedData stream so callers see the real data.
+Created by Dr. Phil Polstra
+for PentesterAcademy.com'''
+
+__all__=['NtfsStream', 'getStreams', 'sweepStreams', 'StreamReader']
+
+import os
+from wof import WofDecoder, WOF_CHUNK_SIZES
+
+WOF_STREAM='WofCompressedData'
+
+class NtfsStream:
+	'''Represents one $DATA stream.  Attributes are added
+	with addAttribute() and the extents are kept sorted
+	by VCN.'''
+	def __init__(self, name='', recordNumber=None):
+		self._name=name
+		self._recordNumber=recordNumber
+		self._data=None
+		self._runs=[]	# (vcn, DataRun)
+		self._logicalSize=0
+		self._initializedSize=0
+		self._physicalSize=0
+		self._flags=0
+		self._wofAlgorithm=None
+		self._wofData=None
+
+	def addAttribute(self, dataAttr):
+		'''Add a $80 attribute to this stream.'''
+		if dataAttr.isResident():
+			self._data=dataAttr.data()
+			self._logicalSize=len(self._data)
+			self._initializedSize=len(self._data)
+			self._physicalSize=len(self._data)
+			return
+		# only the first attribute has valid sizes
+		if dataAttr.firstVcn()==0:
+			self._logicalSize=dataAttr.logicalSize()
+			self._initializedSize=dataAttr.initializedSize()
+			self._physicalSize=dataAttr.physicalSize()
+			self._flags=dataAttr.flags()
+		vcn=dataAttr.firstVcn()
+		for run in dataAttr.dataRuns():
+			self._runs.append((vcn, run))
+			vcn+=run.numberOfClusters()
+		self._runs.sort(key=lambda r: r[0])
+
+	def name(self):
+		'''Stream name or an empty string for the unnamed stream.'''
+		return self._name
+
+	def isNamed(self):
+		return self._name!=''
+
+	def recordNumber(self):
+		return self._recordNumber
+
+	def isResident(self):
+		return self._data!=None
+
+	def data(self):
+		'''Returns data if resident otherwise None'''
+		return self._data
+
+	def logicalSize(self):
+		return self._logicalSize
+
+	def initializedSize(self):
+		return self._initializedSize
+
+	def physicalSize(self):
+		return self._physicalSize
+
+	def isCompressed(self):
+		return (self._flags & 0x0001) != 0
+
+	def isEncrypted(self):
+		return (self._flags & 0x4000) != 0
+
+	def isSparse(self):
+		return (self._flags & 0x8000) != 0
+
+	def isWofCompressed(self):
+		'''True if the stream's data is really held WOF
+		compressed in the WofCompressedData stream.'''
+		return self._wofData!=None
+
+	def setWof(self, algorithm, compressedStream):
+		self._wofAlgorithm=algorithm
+		self._wofData=compressedStream
+
+	def wofAlgorithm(self):
+		return self._wofAlgorithm
+
+	def wofData(self):
+		'''The WofCompressedData NtfsStream or None.'''
+		return self._wofData
+
+	def dataRuns(self):
+		return [run for vcn, run in self._runs]
+
+	def firstLcn(self):
+		'''LCN of the first allocated cluster or -1 for
+		resident and fully sparse streams.  Useful as
+		a sort key for reading files in on-disk order.'''
+		for vcn, run in self._runs:
+			if not run.isSparse():
+				return run.startingCluster()
+		return -1
+
+	def extents(self):
+		'''Returns a list of (vcn, lcn, count) tuples in
+		VCN order.  The LCN is None for sparse runs.'''
+		return [(vcn, run.startingCluster(), run.numberOfClusters())
+					for vcn, run in self._runs]
+
+	def __str__(self):
+		retStr=('Stream: ' + (self._name or '<unnamed>') +
+				'\n\tSize: ' + str(self.logicalSize()) +
+				'\n\tResident: ' + str(self.isResident()) )
+		if not self.isResident():
+			retStr+='\n\tData runs: ' + str(len(self._runs))
+		return retStr
+
+def getStreams(mftEntry, entryReader=None):
+	'''Collects every $80 attribute for a file into
+	NtfsStream objects.  Returns a dictionary keyed
+	by stream name ('' for the unnamed stream).
+	If the entry has an attribute list entryReader
+	is called with an MFT record number and should
+	return the MftEntry for that record.'''
+	dataAttributes=list(mftEntry.attributesOfType(0x80))
+	if entryReader:
+		records=[]
+		for attributeList in mftEntry.attributesOfType(0x20):
+			for item in attributeList.list():
+				if (item.attributeType()==0x80 and
+						item.mft()!=mftEntry.recordNumber() and
+						item.mft() not in records):
+					records.append(item.mft())
+		for record in records:
+			extEntry=entryReader(record)
+			if extEntry and extEntry.isValid():
+				dataAttributes+=extEntry.attributesOfType(0x80)
+	streams={}
+	for dataAttr in dataAttributes:
+		name=dataAttr.nameString()
+		if name not in streams:
+			streams[name]=NtfsStream(name, mftEntry.recordNumber())
+		streams[name].addAttribute(dataAttr)
+	# only entries flagged as reparse points are checked
+	reparse=mftEntry.reparsePoint()
+	if (reparse and reparse.wofAlgorithm() in WOF_CHUNK_SIZES and
+			'' in streams and WOF_STREAM in streams):
+		streams[''].setWof(reparse.wofAlgorithm(), streams[WOF_STREAM])
+	return streams
+
+def sweepStreams(imageFilename, vbr, streams, callback, chunkSize=1048576):
+	'''Reads the non-resident extents of any number of
+	streams in one pass over the image.  Extents from
+	all streams are sorted by LCN so the image is read
+	front to back.  For each piece read callback is
+	called as callback(stream, offset, data) where offset
+	is the position of data within the stream.  Sparse
+	runs and resident streams are not passed to callback.'''
+	bpc=vbr.bytesPerCluster()
+	pieces=[]
+	for stream in streams:
+		if stream.isResident():
+			continue
+		for vcn, lcn, count in stream.extents():
+			if lcn==None:
+				continue
+			pieces.append((lcn, count, vcn, stream))
+	pieces.sort(key=lambda p: p[0])
+	with open(imageFilename, 'rb') as f:
+		for lcn, count, vcn, stream in pieces:
+			offset=vcn * bpc
+			end=min((vcn + count) * bpc, stream.logicalSize())
+			if offset >= end:
+				continue
+			f.seek(vbr.clusterOffset(lcn))
+			while offset < end:
+				data=f.read(min(chunkSize, end - offset))
+				if not data:
+					break
+				# anything past the initialized size reads as zeroes
+				if offset + len(data) > stream.initializedSize():
+					keep=max(0, stream.initializedSize() - offset)
+					data=data[:keep] + b'\x00' * (len(data) - keep)
+				callback(stream, offset, data)
+				offset+=len(data)
+
+def _coalesce(extents):
+	'''Merges (vcn, lcn, count) extents that follow each
+	other both in the stream and on disk (or are both
+	sparse) so they can be read with one call.'''
+	merged=[]
+	for vcn, lcn, count in extents:
+		if merged:
+			lastVcn, lastLcn, lastCount=merged[-1]
+			if (lastVcn + lastCount==vcn and
+					((lcn==None and lastLcn==None) or
+					(lcn!=None and lastLcn!=None and lastLcn + lastCount==lcn))):
+				merged[-1]=(lastVcn, lastLcn, lastCount + count)
+				continue
+		merged.append((vcn, lcn, count))
+	return merged
+
+class StreamReader:
+	'''File-like object that reads a stream from start
+	to finish.  Adjacent clusters are read with a single
+	call and os.pread() is used so several readers can
+	share one image file descriptor between threads.
+	If hasher is given every block read is passed to
+	its update() method.  WOF compressed streams are
+	decompressed as they are read.'''
+	def __init__(self, stream, vbr, fd, hasher=None, chunkSize=1048576):
+		self._stream=stream
+		self._vbr=vbr
+		self._fd=fd
+		self._hasher=hasher
+		self._chunkSize=chunkSize
+		self._pos=0
+		self._extents=_coalesce(stream.extents())
+		self._extent=0
+		self._wof=None
+		if stream.isWofCompressed():
+			self._wof=WofDecoder(StreamReader(stream.wofData(), vbr, fd, None, chunkSize),
+				stream.logicalSize(), stream.wofAlgorithm())
+
+	def tell(self):
+		return self._pos
+
+	def seek(self, pos):
+		'''Moves to an absolute position in the stream.'''
+		self._pos=max(0, pos)
+		# the extent search restarts from the beginning
+		self._extent=0
+
+	def _readBlock(self, size):
+		'''Reads up to size bytes at the current position
+		without crossing the end of an extent.'''
+		stream=self._stream
+		end=min(self._pos + size, stream.logicalSize())
+		if self._pos >= end:
+			return b''
+		if self._wof:
+			return self._wof.read(self._pos, end - self._pos)
+		if stream.isResident():
+			return stream.data()[self._pos:end]
+		bpc=self._vbr.bytesPerCluster()
+		# find the extent holding the current position
+		while (self._extent < len(self._extents) and
+				(self._extents[self._extent][0] + self._extents[self._extent][2]) * bpc <= self._pos):
+			self._extent+=1
+		if self._extent >= len(self._extents):
+			# past the last run, treat as unallocated
+			return b'\x00' * (end - self._pos)
+		vcn, lcn, count=self._extents[self._extent]
+		end=min(end, (vcn + count) * bpc)
+		if lcn==None or self._pos >= stream.initializedSize():
+			return b'\x00' * (end - self._pos)
+		end=min(end, stream.initializedSize())
+		offset=self._vbr.clusterOffset(lcn) + self._pos - vcn * bpc
+		return os.pread(self._fd, end - self._pos, offset)
+
+	def read(self, size=-1):
+		if size==None or size < 0:
+			size=self._stream.logicalSize() - self._pos
+		parts=[]
+		while size > 0:
+			data=self._readBlock(min(size, self._chunkSize))
+			if not data:
+				break
+			if self._hasher:
+				self._hasher.update(data)
+			self._pos+=len(data)
+			size-=len(data)
+			parts.append(data)
+		return b''.join(parts)
+
+	def readChunks(self):
+		'''Generator that yields the rest of the stream
+		one block at a time.'''
+		while True:
+			data=self.read(self._chunkSize)
+			if not data:
+				return
+			yield data
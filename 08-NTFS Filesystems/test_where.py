@@ -0,0 +1,26 @@
+#!/usr/bin/python3
+
+'''Tests for the where.py filter parser.  Run with
+python3 -m unittest test_where from this directory.
+Created by Dr. Phil Polstra
+for PentesterAcademy.com'''
+
+import unittest
+from where import Where
+
+class WherePatternTest(unittest.TestCase):
+	def testBadNamePattern(self):
+		with self.assertRaises(ValueError) as cm:
+			Where('name~"("')
+		self.assertIn('Bad pattern (', str(cm.exception))
+
+	def testBadParentPattern(self):
+		with self.assertRaises(ValueError) as cm:
+			Where('parent~"[a"')
+		self.assertIn('Bad pattern [a', str(cm.exception))
+
+	def testGoodPatterns(self):
+		Where('name~"hel+o" and parent="/Users/*"')
+
+if __name__=='__main__':
+	unittest.main()
@@ -9,6 +9,7 @@ __all__=['Vbr']
 
 import struct   # for interpreting the VBR
 import optparse # for command line options
+from volumes import volumeOffset, addPartitionOption
 
 class Vbr:
 	def __init__(self, buffer):
@@ -136,13 +137,15 @@ def main():
 					help="image filename")
 	parser.add_option("-o", "--offset", dest='offset',
 					help='offset in sectors to start of volume')
+	addPartitionOption(parser)
 					
 	(options, args)=parser.parse_args()
 	filename=options.filename
-	if options.offset:
-		offset=512 * int(options.offset)
-	else:
-		offset=0
+	try:
+		offset=volumeOffset(filename, options.offset, options.partition)
+	except ValueError as e:
+		print(e)
+		return -1
 		
 	with open(filename, 'rb') as f:
 		f.seek(offset)
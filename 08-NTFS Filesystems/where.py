@@ -0,0 +1,407 @@
+#!/usr/bin/python3
+
+'''A small filter language for selecting MFT
+entries.  An expression such as
+
+	ext=exe,dll and size>1M and not deleted
+
+is compiled once into a predicate.  Each record is
+wrapped in a Record which only decodes what a test
+asks for, and the tests joined by "and"/"or" are
+reordered so the cheapest run first.  Flags and the
+record number come straight from the raw header so
+most records are rejected without being parsed.
+
+Terms:
+	name=GLOB name~REGEX ext=LIST parent=GLOB
+	size OP N[K|M|G]  entry OP N
+	created/modified/changed/accessed OP YYYY-MM-DD[ HH:MM:SS]
+	deleted directory ads torn reparse
+OP is one of = != < <= > >=.  Values with spaces
+must be quoted.  Terms are combined with and, or,
+not and parentheses.
+Created by Dr. Phil Polstra
+for PentesterAcademy.com'''
+
+__all__=['Where', 'Record']
+
+import re
+import struct
+import fnmatch
+import datetime
+from mft import MftEntry, fixupStatus, FIXUP_TORN
+from paths import bestFilename
+
+# costs used to order terms, cheapest first
+COST_HEADER=0
+COST_ATTRIBUTES=1
+COST_ATTRIBUTE_LIST=2
+COST_PATH=3
+
+SIZE_SUFFIXES={'K':1024, 'M':1024**2, 'G':1024**3, 'T':1024**4}
+ORDINAL_1601=datetime.date(1601, 1, 1).toordinal()
+TIME_FIELDS={'created':'creationFileTime', 'modified':'modificationFileTime',
+	'changed':'recordChangeFileTime', 'accessed':'accessFileTime'}
+FLAG_TERMS=('deleted', 'directory', 'ads', 'torn', 'reparse')
+COMPARISONS={
+	'=':lambda a, b: a==b,
+	'!=':lambda a, b: a!=b,
+	'<':lambda a, b: a < b,
+	'<=':lambda a, b: a <= b,
+	'>':lambda a, b: a > b,
+	'>=':lambda a, b: a >= b,
+}
+TOKEN_PATTERN=re.compile(r'\s*(?:(\()|(\))|(!=|<=|>=|=|<|>|~)|"([^"]*)"|\'([^\']*)\'|([^\s()=!<>~"\']+))')
+
+class Record:
+	'''One MFT record as seen by a filter.  It can be
+	created from a raw buffer, an MftEntry or both and
+	decodes attributes only when they are needed.'''
+	def __init__(self, number, buffer=None, mftEntry=None, resolver=None):
+		self._number=number
+		self._buffer=buffer
+		self._entry=mftEntry
+		self._resolver=resolver
+		self._fname=False
+
+	def number(self):
+		return self._number
+
+	def isValid(self):
+		if self._buffer!=None:
+			return self._buffer[0:4]==b'FILE'
+		return self._entry!=None and self._entry.isValid()
+
+	def headerFlags(self):
+		'''Flags word of the record header (b0=in use,
+		b1=directory) read without parsing the record.'''
+		if self._buffer!=None:
+			return struct.unpack_from('<H', self._buffer, 22)[0]
+		return self._entry.flags()
+
+	def fixupStatus(self):
+		if self._buffer!=None:
+			return fixupStatus(self._buffer)
+		return self._entry.fixupStatus()
+
+	def entry(self):
+		'''The decoded MftEntry, created on first use.'''
+		if self._entry==None:
+			self._entry=MftEntry(self._buffer)
+		return self._entry
+
+	def filename(self):
+		'''Best $30 attribute or None.'''
+		if self._fname==False:
+			self._fname=bestFilename(self.entry())
+		return self._fname
+
+	def name(self):
+		fnameAttr=self.filename()
+		if fnameAttr==None:
+			return ''
+		return fnameAttr.filename()
+
+	def size(self):
+		'''Logical size of the unnamed $DATA stream.  If
+		$DATA is not in this record the size from $30 is
+		used instead.'''
+		for attr in self.entry().attributesOfType(0x80):
+			if not attr.hasName():
+				if attr.isResident():
+					return attr.attributeLength()
+				if attr.firstVcn()==0:
+					return attr.logicalSize()
+		fnameAttr=self.filename()
+		if fnameAttr==None:
+			return 0
+		return fnameAttr.logicalSize()
+
+	def fileTime(self, accessor):
+		'''Raw $10 timestamp or None.'''
+		stdInfos=self.entry().attributesOfType(0x10)
+		if len(stdInfos)==0:
+			return None
+		return getattr(stdInfos[0], accessor)()
+
+	def hasAds(self, attributeList=False):
+		'''True if there is a named $DATA attribute.  With
+		attributeList the attribute list is checked too.'''
+		for attr in self.entry().attributesOfType(0x80):
+			if attr.hasName():
+				return True
+		if attributeList:
+			for attrList in self.entry().attributesOfType(0x20):
+				for item in attrList.list():
+					if item.attributeType()==0x80 and item.hasName():
+						return True
+		return False
+
+	def parentPath(self):
+		'''Full path of the parent directory.'''
+		path=self._resolver.path(self._number)
+		return path[:path.rfind('/') + 1] if path else ''
+
+class _Term:
+	'''Leaf of a compiled expression.'''
+	def __init__(self, test, cost, needsPaths=False):
+		self.test=test
+		self.cost=cost
+		self.needsPaths=needsPaths
+
+	def __call__(self, record):
+		return self.test(record)
+
+class _And:
+	def __init__(self, children):
+		self.children=sorted(children, key=lambda c: c.cost)
+		self.cost=self.children[-1].cost
+		self.needsPaths=any([c.needsPaths for c in children])
+
+	def __call__(self, record):
+		for child in self.children:
+			if not child(record):
+				return False
+		return True
+
+class _Or:
+	def __init__(self, children):
+		self.children=sorted(children, key=lambda c: c.cost)
+		self.cost=self.children[-1].cost
+		self.needsPaths=any([c.needsPaths for c in children])
+
+	def __call__(self, record):
+		for child in self.children:
+			if child(record):
+				return True
+		return False
+
+class _Not:
+	def __init__(self, child):
+		self.child=child
+		self.cost=child.cost
+		self.needsPaths=child.needsPaths
+
+	def __call__(self, record):
+		return not self.child(record)
+
+def parseSize(text):
+	'''Converts 10, 4K, 1.5M etc. to bytes.'''
+	text=text.upper().rstrip('B')
+	multiplier=1
+	if text and text[-1] in SIZE_SUFFIXES:
+		multiplier=SIZE_SUFFIXES[text[-1]]
+		text=text[:-1]
+	try:
+		return int(float(text) * multiplier)
+	except ValueError:
+		raise ValueError('Bad size ' + text)
+
+def compilePattern(pattern):
+	'''Compiles a case insensitive regular expression
+	from a filter.  Raises ValueError if it is bad.'''
+	try:
+		return re.compile(pattern, re.IGNORECASE)
+	except re.error as e:
+		raise ValueError('Bad pattern ' + pattern + ' (' + str(e) + ')')
+
+def parseFileTime(text):
+	'''Converts YYYY-MM-DD[ HH:MM:SS] (UTC) to a FILETIME.'''
+	for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d'):
+		try:
+			dt=datetime.datetime.strptime(text, fmt)
+			break
+		except ValueError:
+			pass
+	else:
+		raise ValueError('Bad time ' + text + ' (use YYYY-MM-DD[ HH:MM:SS])')
+	days=dt.toordinal() - ORDINAL_1601
+	return ((days * 86400 + dt.hour * 3600 + dt.minute * 60 + dt.second) *
+		10000000)
+
+class Where:
+	'''A compiled filter expression.  Use matches() with
+	a Record.  If needsPaths() is True the Record must
+	be given a PathResolver.'''
+	def __init__(self, expression):
+		self._expression=expression
+		self._tokens=self._tokenize(expression)
+		self._pos=0
+		self._root=self._parseOr()
+		if self._pos < len(self._tokens):
+			raise ValueError('Unexpected ' + self._tokens[self._pos][1] +
+				' in filter ' + expression)
+
+	def _tokenize(self, text):
+		'''List of (kind, value) where kind is one of
+		( ) op str word.'''
+		tokens=[]
+		pos=0
+		text=text.strip()
+		while pos < len(text):
+			match=TOKEN_PATTERN.match(text, pos)
+			if not match or match.end()==pos:
+				raise ValueError('Cannot parse filter at: ' + text[pos:])
+			pos=match.end()
+			if match.group(1):
+				tokens.append(('(', '('))
+			elif match.group(2):
+				tokens.append((')', ')'))
+			elif match.group(3):
+				tokens.append(('op', match.group(3)))
+			elif match.group(4)!=None:
+				tokens.append(('str', match.group(4)))
+			elif match.group(5)!=None:
+				tokens.append(('str', match.group(5)))
+			else:
+				tokens.append(('word', match.group(6)))
+			while pos < len(text) and text[pos].isspace():
+				pos+=1
+		return tokens
+
+	def _peek(self):
+		if self._pos < len(self._tokens):
+			return self._tokens[self._pos]
+		return (None, None)
+
+	def _next(self):
+		token=self._peek()
+		if token[0]==None:
+			raise ValueError('Unexpected end of filter ' + self._expression)
+		self._pos+=1
+		return token
+
+	def _isKeyword(self, word):
+		kind, value=self._peek()
+		return kind=='word' and value.lower()==word
+
+	def _parseOr(self):
+		children=[self._parseAnd()]
+		while self._isKeyword('or'):
+			self._next()
+			children.append(self._parseAnd())
+		return children[0] if len(children)==1 else _Or(children)
+
+	def _parseAnd(self):
+		children=[self._parseNot()]
+		while self._isKeyword('and'):
+			self._next()
+			children.append(self._parseNot())
+		return children[0] if len(children)==1 else _And(children)
+
+	def _parseNot(self):
+		if self._isKeyword('not'):
+			self._next()
+			return _Not(self._parseNot())
+		if self._peek()[0]=='(':
+			self._next()
+			node=self._parseOr()
+			if self._next()[0]!=')':
+				raise ValueError('Missing ) in filter ' + self._expression)
+			return node
+		return self._parseTerm()
+
+	def _parseTerm(self):
+		kind, field=self._next()
+		if kind!='word':
+			raise ValueError('Expected a field name, got ' + field)
+		field=field.lower()
+		if field in FLAG_TERMS and self._peek()[0]!='op':
+			return self._flagTerm(field)
+		kind, op=self._next()
+		if kind!='op':
+			raise ValueError('Expected an operator after ' + field)
+		kind, value=self._next()
+		if kind not in ('word', 'str'):
+			raise ValueError('Expected a value after ' + field + op)
+		if field=='name':
+			return self._nameTerm(op, value)
+		if field=='ext':
+			return self._extTerm(op, value)
+		if field=='parent':
+			return self._parentTerm(op, value)
+		if field=='size':
+			return self._compareTerm(op, parseSize(value),
+				lambda r: r.size(), COST_ATTRIBUTES)
+		if field=='entry':
+			return self._compareTerm(op, int(value),
+				lambda r: r.number(), COST_HEADER)
+		if field in TIME_FIELDS:
+			accessor=TIME_FIELDS[field]
+			return self._compareTerm(op, parseFileTime(value),
+				lambda r: r.fileTime(accessor), COST_ATTRIBUTES)
+		raise ValueError('Unknown filter field ' + field)
+
+	def _flagTerm(self, field):
+		if field=='deleted':
+			return _Term(lambda r: (r.headerFlags() & 0x01)==0, COST_HEADER)
+		if field=='directory':
+			return _Term(lambda r: (r.headerFlags() & 0x02)!=0, COST_HEADER)
+		if field=='torn':
+			return _Term(lambda r: r.fixupStatus()==FIXUP_TORN, COST_HEADER)
+		if field=='reparse':
+			return _Term(lambda r: r.entry().isReparsePoint(), COST_ATTRIBUTES)
+		return _Term(lambda r: r.hasAds(True), COST_ATTRIBUTE_LIST)
+
+	def _compareTerm(self, op, value, getter, cost):
+		if op not in COMPARISONS:
+			raise ValueError('Operator ' + op + ' cannot be used with numbers or times')
+		compare=COMPARISONS[op]
+		def test(record):
+			actual=getter(record)
+			return actual!=None and compare(actual, value)
+		return _Term(test, cost)
+
+	def _nameTerm(self, op, value):
+		if op=='~':
+			pattern=compilePattern(value)
+			test=lambda r: pattern.search(r.name())!=None
+		elif op in ('=', '!='):
+			pattern=compilePattern(fnmatch.translate(value))
+			test=lambda r: pattern.match(r.name())!=None
+		else:
+			raise ValueError('name only supports =, != and ~')
+		if op=='!=':
+			return _Not(_Term(test, COST_ATTRIBUTES))
+		return _Term(test, COST_ATTRIBUTES)
+
+	def _extTerm(self, op, value):
+		if op not in ('=', '!='):
+			raise ValueError('ext only supports = and !=')
+		extensions=set([e.lower().lstrip('.') for e in value.split(',')])
+		def test(record):
+			name=record.name()
+			dot=name.rfind('.')
+			return dot > 0 and name[dot+1:].lower() in extensions
+		if op=='!=':
+			return _Not(_Term(test, COST_ATTRIBUTES))
+		return _Term(test, COST_ATTRIBUTES)
+
+	def _parentTerm(self, op, value):
+		# directory globs match with or without the trailing slash
+		if op=='~':
+			pattern=compilePattern(value)
+			test=lambda r: pattern.search(r.parentPath())!=None
+		elif op in ('=', '!='):
+			pattern=compilePattern(fnmatch.translate(value.rstrip('/') + '/'))
+			test=lambda r: pattern.match(r.parentPath())!=None
+		else:
+			raise ValueError('parent only supports =, != and ~')
+		if op=='!=':
+			return _Not(_Term(test, COST_PATH, True))
+		return _Term(test, COST_PATH, True)
+
+	def needsPaths(self):
+		'''True if the expression uses parent so a
+		PathResolver has to be built first.'''
+		return self._root.needsPaths
+
+	def matches(self, record):
+		'''Evaluates the expression for a Record.  Records
+		that are not valid MFT entries never match.'''
+		if not record.isValid():
+			return False
+		return self._root(record)
+
+	def __str__(self):
+		return self._expression
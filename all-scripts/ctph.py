@@ -0,0 +1,342 @@
+#!/usr/bin/python3
+
+'''Context triggered piecewise hashing (fuzzy
+hashing) compatible with ssdeep.  FuzzyHash has the
+same update()/hexdigest() interface as hashlib so
+it can be fed the same buffers as the exact hashes
+while a stream is read.  compare() scores two
+hashes from 0 to 100 and FuzzyIndex finds similar
+pairs in a large set of hashes without comparing
+every pair: only hashes that share a 7 character
+piece at the same block size can score above 0.
+Created by Dr. Phil Polstra
+for PentesterAcademy.com'''
+
+__all__=['FuzzyHash', 'fuzzyHash', 'compare', 'FuzzyIndex']
+
+import optparse
+
+ROLLING_WINDOW=7
+MIN_BLOCKSIZE=3
+SPAMSUM_LENGTH=64
+NUM_BLOCKHASHES=31
+# FNV init and prime reduced to the 6 bits that are used
+HASH_INIT=0x27
+HASH_PRIME=0x13
+B64='ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/'
+# STEP_TABLE[c] maps each 6 bit piece hash to the next
+# one for byte c, in the form bytes.translate() wants
+STEP_TABLE=[bytes([((h * HASH_PRIME) ^ c) & 0x3f for h in range(64)]) + bytes(192)
+			for c in range(256)]
+IDENTITY=bytes(range(64)) + bytes(192)
+
+class FuzzyHash:
+	'''Streaming ssdeep hash.  Block sizes 3, 6, 12...
+	are all tracked at once and the one that gives
+	a digest of the right length is picked at the end
+	so the total size does not need to be known.'''
+	name='ssdeep'
+
+	def __init__(self, data=None):
+		self._tail=bytes(ROLLING_WINDOW)
+		self._h1=0
+		self._h2=0
+		self._h3=0
+		self._bhStart=0
+		self._bhEnd=1
+		self._h=[HASH_INIT] * NUM_BLOCKHASHES
+		self._halfH=[HASH_INIT] * NUM_BLOCKHASHES
+		self._digest=[[] for i in range(NUM_BLOCKHASHES)]
+		self._totalSize=0
+		self._lastH=None
+		if data:
+			self.update(data)
+
+	def _fork(self):
+		'''Starts tracking the next larger block size.'''
+		if self._bhEnd < NUM_BLOCKHASHES:
+			self._h[self._bhEnd]=self._h[self._bhEnd - 1]
+			self._halfH[self._bhEnd]=self._halfH[self._bhEnd - 1]
+			self._bhEnd+=1
+		elif self._lastH==None:
+			self._lastH=self._h[self._bhEnd - 1]
+
+	def _reduce(self):
+		'''Stops tracking the smallest block size once it
+		can no longer be used for the digest.'''
+		if self._bhEnd - self._bhStart < 2:
+			return
+		if (MIN_BLOCKSIZE << self._bhStart) * SPAMSUM_LENGTH >= self._totalSize:
+			return
+		if len(self._digest[self._bhStart + 1]) < SPAMSUM_LENGTH // 2:
+			return
+		self._bhStart+=1
+
+	def _sync(self, perm):
+		'''Applies the piece hash steps collected in perm
+		to the hash of every block size.'''
+		h=self._h
+		halfH=self._halfH
+		for i in range(self._bhStart, self._bhEnd):
+			h[i]=perm[h[i]]
+			halfH[i]=perm[halfH[i]]
+		if self._lastH!=None:
+			self._lastH=perm[self._lastH]
+
+	def update(self, data):
+		self._totalSize+=len(data)
+		# the 7 bytes before this buffer are needed by the
+		# rolling hash so it can index the buffer directly
+		buf=self._tail + bytes(data)
+		self._tail=buf[-ROLLING_WINDOW:]
+		h1=self._h1
+		h2=self._h2
+		h3=self._h3
+		h=self._h
+		halfH=self._halfH
+		digest=self._digest
+		stepTable=STEP_TABLE
+		# every piece hash goes through the same steps so
+		# they are collected as one mapping of all 64 values
+		# and only applied when a piece ends
+		perm=IDENTITY
+		blockSize=MIN_BLOCKSIZE << self._bhStart
+		for p in range(ROLLING_WINDOW, len(buf)):
+			c=buf[p]
+			# rolling hash of the last 7 bytes, h1 and h2 are
+			# small sums so they never need masking
+			h2=h2 - h1 + ROLLING_WINDOW * c
+			h1=h1 + c - buf[p - ROLLING_WINDOW]
+			h3=((h3 << 5) ^ c) & 0xffffffff
+			perm=perm.translate(stepTable[c])
+			rolling=(h1 + h2 + h3) & 0xffffffff
+			if rolling % blockSize!=blockSize - 1:
+				continue
+			self._sync(perm)
+			perm=IDENTITY
+			# a trigger for a block size is also one for all
+			# smaller block sizes
+			i=self._bhStart
+			bs=blockSize
+			while i < self._bhEnd and rolling % bs==bs - 1:
+				if len(digest[i])==0:
+					self._fork()
+				if len(digest[i]) < SPAMSUM_LENGTH - 1:
+					digest[i].append(B64[h[i]])
+					h[i]=HASH_INIT
+					if len(digest[i]) < SPAMSUM_LENGTH // 2:
+						halfH[i]=HASH_INIT
+				else:
+					# the digest is full so the last piece keeps
+					# growing and a smaller block size may be dropped
+					self._reduce()
+				i+=1
+				bs<<=1
+			blockSize=MIN_BLOCKSIZE << self._bhStart
+		self._sync(perm)
+		self._h1=h1
+		self._h2=h2
+		self._h3=h3
+
+	def size(self):
+		return self._totalSize
+
+	def hexdigest(self):
+		'''Returns blocksize:digest:halfdigest.'''
+		rolling=(self._h1 + self._h2 + self._h3) & 0xffffffff
+		bi=self._bhStart
+		while (MIN_BLOCKSIZE << bi) * SPAMSUM_LENGTH < self._totalSize:
+			bi+=1
+			if bi >= NUM_BLOCKHASHES:
+				raise OverflowError('input is too large for a fuzzy hash')
+		while bi >= self._bhEnd:
+			bi-=1
+		while bi > self._bhStart and len(self._digest[bi]) < SPAMSUM_LENGTH // 2:
+			bi-=1
+		retStr=str(MIN_BLOCKSIZE << bi) + ':' + ''.join(self._digest[bi])
+		if rolling!=0:
+			retStr+=B64[self._h[bi]]
+		retStr+=':'
+		if bi < self._bhEnd - 1:
+			retStr+=''.join(self._digest[bi + 1][:SPAMSUM_LENGTH // 2 - 1])
+			if rolling!=0:
+				retStr+=B64[self._halfH[bi + 1]]
+		elif rolling!=0:
+			if bi==0:
+				retStr+=B64[self._h[bi]]
+			else:
+				retStr+=B64[self._lastH]
+		return retStr
+
+	digest=hexdigest
+
+	def copy(self):
+		other=FuzzyHash()
+		other.__dict__.update(self.__dict__)
+		other._h=list(self._h)
+		other._halfH=list(self._halfH)
+		other._digest=[list(d) for d in self._digest]
+		return other
+
+def fuzzyHash(data):
+	'''Fuzzy hash of a bytes object.'''
+	return FuzzyHash(data).hexdigest()
+
+def eliminateSequences(text):
+	'''Runs of more than three identical characters
+	are cut to three as they carry no information.'''
+	retList=[]
+	for c in text:
+		if len(retList) >= 3 and c==retList[-1]==retList[-2]==retList[-3]:
+			continue
+		retList.append(c)
+	return ''.join(retList)
+
+def splitHash(fuzzy):
+	'''Returns (blocksize, part1, part2) with repeated
+	characters removed.'''
+	try:
+		blockSize, part1, part2=fuzzy.split(':', 2)
+		blockSize=int(blockSize)
+	except ValueError:
+		raise ValueError('Bad fuzzy hash ' + fuzzy)
+	# a file name may follow in ssdeep output
+	part2=part2.split(',', 1)[0]
+	return (blockSize, eliminateSequences(part1), eliminateSequences(part2))
+
+def grams(text):
+	'''Set of 7 character substrings.'''
+	return set([text[i:i+ROLLING_WINDOW] for i in range(len(text) - ROLLING_WINDOW + 1)])
+
+def editDistance(s1, s2):
+	'''Edit distance where a substitution costs 2
+	(a delete plus an insert) as in ssdeep.'''
+	previous=list(range(len(s2) + 1))
+	for i in range(len(s1)):
+		current=[i + 1]
+		c1=s1[i]
+		for j in range(len(s2)):
+			current.append(min(previous[j + 1] + 1, current[j] + 1,
+				previous[j] + (0 if c1==s2[j] else 2)))
+		previous=current
+	return previous[-1]
+
+def scoreStrings(s1, s2, blockSize):
+	if len(s1) > SPAMSUM_LENGTH or len(s2) > SPAMSUM_LENGTH:
+		return 0
+	if grams(s1).isdisjoint(grams(s2)):
+		return 0
+	score=editDistance(s1, s2)
+	score=(score * SPAMSUM_LENGTH) // (len(s1) + len(s2))
+	score=(100 * score) // SPAMSUM_LENGTH
+	if score >= 100:
+		return 0
+	score=100 - score
+	# small block sizes cannot give high scores for short digests
+	if blockSize < (99 + ROLLING_WINDOW) // ROLLING_WINDOW * MIN_BLOCKSIZE:
+		score=min(score, blockSize // MIN_BLOCKSIZE * min(len(s1), len(s2)))
+	return score
+
+def compare(hash1, hash2):
+	'''Similarity of two fuzzy hashes from 0 to 100.'''
+	bs1, s1a, s1b=splitHash(hash1)
+	bs2, s2a, s2b=splitHash(hash2)
+	if bs1!=bs2 and bs1!=bs2 * 2 and bs2!=bs1 * 2:
+		return 0
+	if bs1==bs2 and s1a==s2a:
+		return 100
+	if bs1==bs2:
+		return max(scoreStrings(s1a, s2a, bs1), scoreStrings(s1b, s2b, bs1 * 2))
+	if bs1==bs2 * 2:
+		return scoreStrings(s1a, s2b, bs1)
+	return scoreStrings(s1b, s2a, bs2)
+
+class FuzzyIndex:
+	'''Index of fuzzy hashes for finding similar pairs.
+	Each digest part is indexed by (block size, 7-gram)
+	and only hashes sharing a key are compared.'''
+	def __init__(self):
+		self._hashes=[]
+		self._keys={}
+
+	def add(self, fuzzy, item=None):
+		'''Adds a hash and returns its index.  item is
+		returned with matches, the hash is used if none.'''
+		index=len(self._hashes)
+		blockSize, part1, part2=splitHash(fuzzy)
+		self._hashes.append((fuzzy, item if item!=None else fuzzy))
+		for key in set([(blockSize, g) for g in grams(part1)] +
+				[(blockSize * 2, g) for g in grams(part2)]):
+			self._keys.setdefault(key, []).append(index)
+		return index
+
+	def __len__(self):
+		return len(self._hashes)
+
+	def candidates(self, fuzzy):
+		'''Indexes of hashes that could score above 0.'''
+		blockSize, part1, part2=splitHash(fuzzy)
+		found=set()
+		for key in ([(blockSize, g) for g in grams(part1)] +
+				[(blockSize * 2, g) for g in grams(part2)]):
+			found.update(self._keys.get(key, ()))
+		return found
+
+	def search(self, fuzzy, threshold=1):
+		'''List of (score, item) for indexed hashes similar
+		to fuzzy, best first.'''
+		retList=[]
+		for index in self.candidates(fuzzy):
+			other, item=self._hashes[index]
+			score=compare(fuzzy, other)
+			if score >= threshold:
+				retList.append((score, item))
+		retList.sort(key=lambda r: -r[0])
+		return retList
+
+	def pairs(self, threshold=1):
+		'''Generator yielding (score, item1, item2) for
+		every similar pair of indexed hashes.'''
+		for i, (fuzzy, item) in enumerate(self._hashes):
+			for j in sorted(self.candidates(fuzzy)):
+				if j <= i:
+					continue
+				other, otherItem=self._hashes[j]
+				score=compare(fuzzy, other)
+				if score >= threshold:
+					yield (score, item, otherItem)
+
+def main():
+	parser=optparse.OptionParser(
+		'usage %prog file... | -c hashfile [hashfile...]')
+	parser.add_option('-c', '--compare', dest='compare', action='store_true',
+					help='compare the hashes in the files given (ssdeep or ' +
+					'hash-files.py output) and print similar pairs')
+	parser.add_option('-t', '--threshold', dest='threshold', default='1',
+					help='lowest score to report (default 1)')
+	(options, args)=parser.parse_args()
+	if len(args)==0:
+		parser.print_help()
+		return -1
+	if options.compare:
+		index=FuzzyIndex()
+		for name in args:
+			with open(name, 'r', errors='replace') as f:
+				for line in f:
+					# pick out anything shaped like a fuzzy hash
+					for field in line.strip().replace('"', '').split(';'):
+						parts=field.split(':')
+						if len(parts)==3 and parts[0].isdigit():
+							index.add(field.split(',')[0], line.strip())
+		for score, item1, item2 in index.pairs(int(options.threshold)):
+			print(score, item1, item2, sep='\t')
+	else:
+		for name in args:
+			fuzzy=FuzzyHash()
+			with open(name, 'rb') as f:
+				for block in iter(lambda: f.read(1048576), b''):
+					fuzzy.update(block)
+			print(fuzzy.hexdigest() + ',"' + name + '"')
+
+if __name__=='__main__':
+	main()
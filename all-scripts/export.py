@@ -0,0 +1,219 @@
+#!/usr/bin/python3
+'''Simple script to export files from an image
+straight into a tar or zip file.  MD5, SHA1 and
+SHA256 are calculated while the data is copied
+and a manifest line is written for every file so
+no separate hashing pass or temporary copies are
+needed.  Files can be selected by MFT entry
+number, full path or filename.
+Create by Dr. Phil Polstra (@ppolstra)
+for PentesterAcademy.com.'''
+
+from mft import *
+import optparse
+import fnmatch
+import tarfile
+import zipfile
+import calendar
+import io
+import os
+import sys
+import time
+from vbr import Vbr
+from volumes import volumeOffset, addPartitionOption
+from mftreader import MftReader
+from stream import getStreams, StreamReader
+from paths import PathResolver
+from hashing import MultiHash, HashEngine, DEFAULT_ALGORITHMS
+from hashset import HashSet
+
+def parseEntries(entryList):
+   '''Turns a list like 16,20-25 into a set of entries.'''
+   entries=set()
+   for item in entryList.split(','):
+      if '-' in item:
+         lo, hi=item.split('-')
+         entries.update(range(int(lo), int(hi)+1))
+      elif item:
+         entries.add(int(item))
+   return entries
+
+def manifestHeader():
+   return ('MftEntry;UpdateSequence;Path;Stream;FileSize;' +
+            ';'.join([a.upper() for a in DEFAULT_ALGORITHMS]))
+
+def manifestLine(mftEntry, path, stream, hasher):
+   return ';'.join([str(mftEntry.recordNumber()), str(mftEntry.sequenceNumber()),
+            '"'+path+'"', '"'+stream.name()+'"', str(hasher.size())] +
+            hasher.hexdigests())
+
+class _BytesReader(io.BytesIO):
+   '''In-memory reader with the StreamReader interface.'''
+   def readChunks(self):
+      yield self.read()
+
+class Archive:
+   '''Small wrapper so tar and zip files can be
+   written the same way.'''
+   def __init__(self, filename):
+      self._zip=None
+      self._tar=None
+      if filename.lower().endswith('.zip'):
+         self._zip=zipfile.ZipFile(filename, 'w', allowZip64=True)
+      elif filename=='-':
+         self._tar=tarfile.open(fileobj=sys.stdout.buffer, mode='w|')
+      else:
+         self._tar=tarfile.open(filename, mode='w|')
+
+   def addStream(self, name, reader, size, mtime):
+      '''Copies size bytes from reader into the archive.'''
+      if self._tar:
+         info=tarfile.TarInfo(name)
+         info.size=size
+         info.mtime=mtime
+         self._tar.addfile(info, reader)
+      else:
+         info=zipfile.ZipInfo(name, time.gmtime(max(mtime, 315532800))[:6])
+         with self._zip.open(info, 'w', force_zip64=True) as outFile:
+            for chunk in reader.readChunks():
+               outFile.write(chunk)
+
+   def addBytes(self, name, data):
+      self.addStream(name, _BytesReader(data), len(data), int(time.time()))
+
+   def close(self):
+      if self._tar:
+         self._tar.close()
+      else:
+         self._zip.close()
+
+def main():
+   parser=optparse.OptionParser()
+   parser.add_option("-f", "--file", dest="filename",
+               help="image filename")
+   parser.add_option("-o", "--offset", dest='offset',
+               help='offset in sectors to start of volume')
+   addPartitionOption(parser)
+   parser.add_option('-m', '--mft', dest='mftFile',
+               help='MFT file')
+   parser.add_option("-e", "--entries", dest='entries',
+               help='MFT entry numbers (e.g. 16,20-25)')
+   parser.add_option('-p', '--path', dest='paths', action='append',
+               help='full path glob, may be repeated (e.g. /Users/*/Documents/*)')
+   parser.add_option('-n', '--name', dest='namePattern',
+               help='filename glob (e.g. *.docx)')
+   parser.add_option('-a', '--ads', dest='ads', action='store_true',
+               help='include alternate data streams')
+   parser.add_option('-D', '--deleted', dest='deleted', action='store_true',
+               help='include entries that are not in use')
+   parser.add_option('-x', '--archive', dest='archive',
+               help='output tar or zip (.zip) file, - for tar on stdout')
+   parser.add_option('-M', '--manifest', dest='manifest',
+               help='manifest file (default archive name + .manifest.csv)')
+   parser.add_option('-k', '--known', dest='known',
+               help='hash set of known files to leave out of the export')
+
+   (options, args)=parser.parse_args()
+   if not options.filename or not options.archive:
+      print('Sorry, this script requires an image file and an archive name')
+      return -1
+   if not (options.entries or options.paths or options.namePattern):
+      print('Sorry, nothing was selected for export')
+      return -1
+   try:
+      offset=volumeOffset(options.filename, options.offset, options.partition)
+   except ValueError as e:
+      print(e)
+      return -1
+   log=sys.stderr if options.archive=='-' else sys.stdout
+
+   with open(options.filename, 'rb') as f:
+      f.seek(offset)
+      vbr=Vbr(f.read(512))
+   if options.mftFile:
+      reader=MftReader(mftFilename=options.mftFile)
+   else:
+      reader=MftReader(imageFilename=options.filename, vbr=vbr)
+
+   # one pass to learn every path and pick candidates, their
+   # entries and streams are kept so no record is read again
+   entries=parseEntries(options.entries) if options.entries else None
+   resolver=PathResolver()
+   candidates=[]
+   for number, mftEntry in reader.entries():
+      resolver.addEntry(number, mftEntry)
+      if mftEntry.baseFileMft()!=0 or mftEntry.isDirectory():
+         continue
+      if not mftEntry.inUse() and not options.deleted:
+         continue
+      if entries!=None and number not in entries:
+         continue
+      if options.namePattern:
+         name=resolver.name(number)
+         if not name or not fnmatch.fnmatch(name.lower(), options.namePattern.lower()):
+            continue
+      candidates.append((number, mftEntry, getStreams(mftEntry, reader.entry)))
+
+   # now filter on paths
+   selected=[]
+   for number, mftEntry, streams in candidates:
+      path=resolver.path(number)
+      if path==None:
+         continue
+      if options.paths and not any([fnmatch.fnmatch(path.lower(), p.lower())
+                                    for p in options.paths]):
+         continue
+      lcn=streams[''].firstLcn() if '' in streams else -1
+      selected.append((lcn, number, path, mftEntry, streams))
+   selected.sort(key=lambda s: s[0])
+
+   manifestName=options.manifest
+   if not manifestName:
+      manifestName=('export' if options.archive=='-' else options.archive) + '.manifest.csv'
+   # known files have to be hashed before they are written
+   # so the archive never contains them
+   knownSet=HashSet(options.known) if options.known else None
+   engine=HashEngine(options.filename, vbr) if knownSet else None
+   skipped=0
+   archive=Archive(options.archive)
+   manifest=[manifestHeader()]
+   fd=os.open(options.filename, os.O_RDONLY)
+   try:
+      for lcn, number, path, mftEntry, streams in selected:
+         stdInfo=mftEntry.attributesOfType(0x10)
+         mtime=calendar.timegm(stdInfo[0].modificationTime()) if stdInfo else 0
+         for name in sorted(streams.keys()):
+            stream=streams[name]
+            if stream.isNamed() and not options.ads:
+               continue
+            if stream.isCompressed() or stream.isEncrypted():
+               print('Skipping compressed or encrypted stream', path, name, file=log)
+               continue
+            if knownSet:
+               digest=engine.hashStream(stream).hexdigest(knownSet.algorithm())
+               if digest in knownSet:
+                  skipped+=1
+                  continue
+            hasher=MultiHash()
+            arcName=path.lstrip('/')
+            if stream.isNamed():
+               arcName+='-ads-'+stream.name()
+            archive.addStream(arcName, StreamReader(stream, vbr, fd, hasher),
+                              stream.logicalSize(), mtime)
+            manifest.append(manifestLine(mftEntry, path, stream, hasher))
+            print('Exported', path, stream.name(), file=log)
+   finally:
+      os.close(fd)
+      if engine:
+         engine.close()
+   manifestData=('\n'.join(manifest) + '\n').encode('utf-8')
+   archive.addBytes('manifest.csv', manifestData)
+   archive.close()
+   with open(manifestName, 'wb') as f:
+      f.write(manifestData)
+   print('Exported', len(manifest)-1, 'streams, manifest in', manifestName, file=log)
+   if knownSet:
+      print('Skipped', skipped, 'known streams', file=log)
+
+if __name__=='__main__':
+   main()
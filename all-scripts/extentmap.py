@@ -0,0 +1,163 @@
+#!/usr/bin/python3
+
+'''Classes for finding which clusters of a volume are
+in use.  ExtentMap is an interval index of the extents
+owned by MFT records and ClusterBitmap wraps the
+volume $Bitmap.  Neither reads any file content.
+Created by Dr. Phil Polstra
+for PentesterAcademy.com'''
+
+__all__=['ExtentMap', 'ClusterBitmap', 'entryExtents']
+
+import os
+import struct
+from array import array
+from bisect import bisect_right
+from stream import getStreams, StreamReader
+
+def entryExtents(number, mftEntry):
+	'''Generator that yields (lcn, count, number) for the
+	allocated extents of every non-resident attribute in
+	an entry.  Extension records hold their own runs so
+	attribute lists need not be followed.'''
+	for attr in mftEntry.attributes():
+		if attr.isResident():
+			continue
+		for run in attr.dataRuns():
+			if not run.isSparse() and run.numberOfClusters() > 0:
+				yield (run.startingCluster(), run.numberOfClusters(), number)
+
+class ExtentMap:
+	'''Interval index of (lcn, count, owner) extents.
+	Extents are kept sorted by starting LCN with the
+	largest end seen so far so overlapping (cross
+	linked) extents are still found.'''
+	def __init__(self, extents=()):
+		self._starts=array('Q')
+		self._ends=array('Q')
+		self._maxEnds=array('Q')
+		self._owners=array('Q')
+		self.addExtents(extents)
+
+	def addExtents(self, extents):
+		'''Adds (lcn, count, owner) tuples to the index.'''
+		items=sorted(zip(self._starts, self._ends, self._owners))
+		items+=[(lcn, lcn + count, owner) for lcn, count, owner in extents]
+		items.sort()
+		self._starts=array('Q', [i[0] for i in items])
+		self._ends=array('Q', [i[1] for i in items])
+		self._owners=array('Q', [i[2] for i in items])
+		self._maxEnds=array('Q')
+		maxEnd=0
+		for end in self._ends:
+			maxEnd=max(maxEnd, end)
+			self._maxEnds.append(maxEnd)
+
+	def __len__(self):
+		return len(self._starts)
+
+	def overlaps(self, lcn, count):
+		'''Returns a list of (lcn, count, owner) for the
+		parts of indexed extents inside lcn..lcn+count-1
+		sorted by LCN.'''
+		end=lcn + count
+		i=bisect_right(self._starts, end - 1) - 1
+		found=[]
+		while i >= 0 and self._maxEnds[i] > lcn:
+			if self._ends[i] > lcn:
+				start=max(lcn, self._starts[i])
+				found.append((start, min(end, self._ends[i]) - start, self._owners[i]))
+			i-=1
+		found.reverse()
+		return found
+
+	def extentsAt(self, lcn):
+		'''Returns a list of whole (lcn, count, owner)
+		extents that contain a cluster.'''
+		i=bisect_right(self._starts, lcn) - 1
+		found=[]
+		while i >= 0 and self._maxEnds[i] > lcn:
+			if self._ends[i] > lcn:
+				found.append((self._starts[i], self._ends[i] - self._starts[i], self._owners[i]))
+			i-=1
+		return found
+
+	def owners(self, lcn, count=1):
+		'''Sorted list of owners of any cluster in the range.'''
+		return sorted(set([o for l, c, o in self.overlaps(lcn, count)]))
+
+	def claimedRanges(self, lcn, count):
+		'''List of merged (lcn, count) ranges inside
+		lcn..lcn+count-1 owned by at least one extent.'''
+		ranges=[]
+		for start, n, owner in sorted(self.overlaps(lcn, count)):
+			if ranges and start <= ranges[-1][0] + ranges[-1][1]:
+				last=ranges[-1]
+				last[1]=max(last[1], start + n - last[0])
+			else:
+				ranges.append([start, n])
+		return [tuple(r) for r in ranges]
+
+	def save(self, f):
+		'''Writes the index to an open binary file.'''
+		f.write(struct.pack('<Q', len(self._starts)))
+		for values in (self._starts, self._ends, self._maxEnds, self._owners):
+			values.tofile(f)
+
+	def load(self, f):
+		'''Replaces the index with one written by save().'''
+		count=struct.unpack('<Q', f.read(8))[0]
+		arrays=[]
+		for i in range(4):
+			values=array('Q')
+			values.fromfile(f, count)
+			arrays.append(values)
+		self._starts, self._ends, self._maxEnds, self._owners=arrays
+
+	def extents(self):
+		'''Generator of (lcn, count, owner) in LCN order.'''
+		for i in range(len(self._starts)):
+			yield (self._starts[i], self._ends[i] - self._starts[i], self._owners[i])
+
+class ClusterBitmap:
+	'''The volume $Bitmap (MFT record 6) held in memory.
+	One bit per cluster, set if the cluster is allocated.'''
+	def __init__(self, reader, vbr, imageFilename):
+		self._bits=b''
+		mftEntry=reader.entry(6)
+		if not mftEntry or not mftEntry.isValid():
+			return
+		streams=getStreams(mftEntry, reader.entry)
+		if '' not in streams:
+			return
+		fd=os.open(imageFilename, os.O_RDONLY)
+		try:
+			self._bits=StreamReader(streams[''], vbr, fd).read()
+		finally:
+			os.close(fd)
+
+	def isValid(self):
+		return len(self._bits) > 0
+
+	def numberOfClusters(self):
+		return len(self._bits) * 8
+
+	def isAllocated(self, lcn):
+		'''Clusters past the end of the bitmap count as allocated.'''
+		if lcn >= len(self._bits) * 8:
+			return True
+		return (self._bits[lcn // 8] >> (lcn % 8)) & 1 == 1
+
+	def allocatedCount(self, lcn, count):
+		'''Number of allocated clusters in lcn..lcn+count-1.'''
+		end=lcn + count
+		past=max(0, end - len(self._bits) * 8)
+		end-=past
+		if end <= lcn:
+			return count
+		first=lcn // 8
+		last=(end - 1) // 8
+		value=int.from_bytes(self._bits[first:last+1], 'little')
+		value>>=lcn - first * 8
+		value&=(1 << (end - lcn)) - 1
+		return bin(value).count('1') + past
@@ -1,12 +1,23 @@
 #!/usr/bin/python3
 '''Simple script to extract a file or
-directory using its MFT entry number.
+directory using its MFT entry number.  WOF
+compressed files are decompressed as they are
+extracted.
 Create by Dr. Phil Polstra (@ppolstra)
 for PentesterAcademy.com.'''
 
 from mft import *
 import optparse
+import os
+import wof
 from vbr import Vbr
+from volumes import volumeOffset, addPartitionOption
+from mftreader import MftReader
+from stream import getStreams, sweepStreams, StreamReader
+from paths import PathResolver
+from where import Where, Record
+from hashing import MultiHash
+from hashset import HashSet
 
 def mftOffset(entry, vbr):
    '''Given a Vbr object and MFT entry number
@@ -18,12 +29,171 @@ def mftOffset(entry, vbr):
    vbr.sectorsPerCluster() + # sectors/cluster
    1024 * entry ) # MFT entry is 1k long
 
+class StreamHash:
+   '''Hashes a stream while sweepStreams() writes it.
+   Pieces arrive in LCN order, so any that are ahead
+   of the hashed position are read back from the
+   output file once the gap before them is written.
+   Sparse runs and anything past the last run read
+   back as zeroes.'''
+   def __init__(self, stream, outFile, bytesPerCluster, algorithm):
+      self._algorithm=algorithm
+      self._hasher=MultiHash((algorithm,))
+      self._outFile=outFile
+      self._size=stream.logicalSize()
+      self._next=0
+      # offset -> end of pieces written but not hashed yet
+      self._ready={}
+      for vcn, lcn, count in stream.extents():
+         start=vcn * bytesPerCluster
+         end=min((vcn + count) * bytesPerCluster, stream.logicalSize())
+         if lcn==None and start < end:
+            self._ready[start]=end
+
+   def add(self, offset, data):
+      if offset==self._next:
+         self._hasher.update(data)
+         self._next+=len(data)
+      else:
+         self._ready[offset]=offset + len(data)
+      self._catchUp()
+
+   def _catchUp(self):
+      while self._next in self._ready:
+         end=self._ready.pop(self._next)
+         self._outFile.seek(self._next)
+         while self._next < end:
+            data=self._outFile.read(min(1048576, end - self._next))
+            if not data:
+               self._next=end
+               break
+            self._hasher.update(data)
+            self._next+=len(data)
+
+   def hexdigest(self):
+      '''Digest once the sweep has written every piece.'''
+      self._ready[self._next]=self._size
+      self._catchUp()
+      return self._hasher.hexdigest(self._algorithm)
+
+def removeKnown(outName, stream, fname):
+   '''Deletes an extracted stream found in the known
+   file hash set.'''
+   os.remove(outName)
+   if stream.isNamed():
+      print("Removed known alternate data stream", stream.name(), "for file", fname)
+   else:
+      print("Removed known file "+str(fname))
+
+def extractEntry(mftEntry, reader, vbr, filename, outDir, indxSlack=False, prefix='',
+                 knownSet=None):
+   '''Extracts every stream of a file, or the INDX
+   buffers of a directory, into outDir.  Output
+   names start with prefix.  If knownSet is given
+   streams are hashed as they are written and those
+   found in it are deleted again.'''
+   # get the filename attribute(s)
+   filenames=mftEntry.attributesOfType(0x30)
+   if len(filenames)==0:
+      return
+      
+   # if there is more than one filename get longest
+   if len(filenames) > 0:
+      fnLength=0
+      for fnEntry in filenames:
+         if fnEntry.nameLength() > fnLength:
+            fname=fnEntry.filename()
+            fnLength=fnEntry.nameLength()
+   # take care of special cases
+   if fname[0]=='.':
+      fname='root'
+   elif fname[0]=='$':
+      fname='dollar'+fname[1:]
+   fname=prefix+fname
+   # file or directory?
+   if filenames[0].isDirectory():
+      # get the $I30 file
+      indexAllocs=mftEntry.attributesOfType(0xa0)
+      if len(indexAllocs) > 0:
+         # we don't handle the case of A0 in Attribute list
+         # I have never seen this happen
+         clusterList=[]
+         for indexAlloc in indexAllocs:
+            clusterList+=indexAlloc.clusterList()
+      bitmaps=mftEntry.attributesOfType(0xb0)
+      if len(bitmaps)==1:   
+         print('Creating INDX file index-'+str(fname))   
+         with open(outDir+'index-'+str(fname), 'wb') as outFile:
+            for i in range(len(clusterList)):
+               if indxSlack or bitmaps[0].inUse(i):
+                  outFile.write(vbr.getCluster(clusterList[i], filename))
+   else:
+      # get every data stream for the file, following the
+      # attribute list if the streams are spread across entries
+      streams=getStreams(mftEntry, reader.entry)
+      
+      # resident streams are written now, the rest are
+      # collected so they can be read in a single pass
+      outFiles={}
+      outNames={}
+      hashes={}
+      for stream in sorted(streams.values(), key=lambda s: s.name()):
+         # compressed and encrypted streams are written raw so cannot match
+         hashed=knownSet and not stream.isCompressed() and not stream.isEncrypted()
+         hasher=MultiHash((knownSet.algorithm(),)) if hashed else None
+         if stream.isNamed():
+            print("Extracting alternate data stream", stream.name(), "for file", fname)
+            outName=outDir+str(fname)+'-ads-'+stream.name()
+         else:
+            print("Extracting file "+str(fname))
+            outName=outDir+str(fname)
+         # read access so out of order pieces can be hashed
+         outFile=open(outName, 'w+b')
+         if stream.isWofCompressed():
+            fd=os.open(filename, os.O_RDONLY)
+            try:
+               for data in StreamReader(stream, vbr, fd, hasher).readChunks():
+                  outFile.write(data)
+            finally:
+               os.close(fd)
+            outFile.close()
+         elif stream.isResident():
+            outFile.write(stream.data())
+            outFile.close()
+            if hasher:
+               hasher.update(stream.data())
+         else:
+            outFile.truncate(stream.logicalSize())
+            outFiles[stream]=outFile
+            outNames[stream]=outName
+            if hashed:
+               hashes[stream]=StreamHash(stream, outFile, vbr.bytesPerCluster(),
+                                         knownSet.algorithm())
+            continue
+         if hasher and hasher.hexdigest(knownSet.algorithm()) in knownSet:
+            removeKnown(outName, stream, fname)
+      
+      def writePiece(stream, offset, data):
+         outFiles[stream].seek(offset)
+         outFiles[stream].write(data)
+         if stream in hashes:
+            hashes[stream].add(offset, data)
+      
+      # now read all non-resident streams sorted by LCN
+      sweepStreams(filename, vbr, list(outFiles.keys()), writePiece)
+      for stream, outFile in outFiles.items():
+         known=stream in hashes and hashes[stream].hexdigest() in knownSet
+         outFile.close()
+         if known:
+            removeKnown(outNames[stream], stream, fname)
+
 def main():
    parser=optparse.OptionParser()
    parser.add_option("-f", "--file", dest="filename",
                help="image filename")
    parser.add_option("-o", "--offset", dest='offset',
                help='offset in sectors to start of volume')
+   addPartitionOption(parser)
    parser.add_option("-e", "--entry", dest='entry',
                help='MFT entry number')
    parser.add_option('-d', '--directory', dest='directory',
@@ -32,13 +202,22 @@ def main():
                help='MFT file')
    parser.add_option('-s', '--slack', dest='indxSlack', action='store_true',
                help='Included INDX buffer slack')
+   parser.add_option('-w', '--where', dest='where',
+               help='extract every entry matching this filter (see where.py)')
+   parser.add_option('-p', '--processes', dest='processes',
+               help='number of WOF decompression processes (default one per CPU)')
+   parser.add_option('-k', '--known', dest='known',
+               help='hash set of known files to leave out of the extraction')
                
    (options, args)=parser.parse_args()
    filename=options.filename
-   if options.offset:
-      offset=512 * int(options.offset)
-   else:
-      offset=0
+   if options.processes:
+      wof.setWorkers(int(options.processes))
+   try:
+      offset=volumeOffset(filename, options.offset, options.partition)
+   except ValueError as e:
+      print(e)
+      return -1
    if options.entry:
       entry=int(options.entry)
    else:
@@ -57,150 +236,41 @@ def main():
    
    vbr=Vbr(buffer)
    
-   # calculate the offset to the MFT entry
-   mOffset = (offset + # offset to start of partition
-            mftOffset(entry, vbr))
-   
    # did they supply a MFT files?
-   # only needed if MFT is fragmented          
+   # if not the MFT is located using entry 0 so
+   # a fragmented MFT is handled correctly
    if options.mftFile:
-      with open(options.mftFile, 'rb') as f:
-         f.seek(entry * 1024)
-         buffer=f.read(1024)
+      reader=MftReader(mftFilename=options.mftFile)
    else:
-      with open(filename, 'rb') as f:
-         f.seek(mOffset)
-         buffer=f.read(1024)
+      reader=MftReader(imageFilename=filename, vbr=vbr)
    
-   mftEntry=MftEntry(buffer)
+   knownSet=HashSet(options.known) if options.known else None
+   if options.where:
+      try:
+         where=Where(options.where)
+      except ValueError as e:
+         print(e)
+         return -1
+      resolver=PathResolver.fromReader(reader) if where.needsPaths() else None
+      for number, buffer in reader.buffers():
+         record=Record(number, buffer, resolver=resolver)
+         if where.matches(record) and record.entry().baseFileMft()==0:
+            # entry numbers keep names from different directories apart
+            extractEntry(record.entry(), reader, vbr, filename, outDir,
+                         options.indxSlack, str(number)+'-', knownSet)
+      return
+
+   mftEntry=reader.entry(entry)
+   if not mftEntry or not mftEntry.isValid():
+      print('MFT entry', entry, 'could not be read...Exiting')
+      return -1
    # check for fragmented MFT
    if mftEntry.recordNumber()!=entry:
       print('Fragmented MFT detected...Exiting')
       return -1
-      
-   # get the filename attribute(s)
-   filenames=mftEntry.attributesOfType(0x30)
-   if len(filenames)==0:
-      return
-      
-   # if there is more than one filename get longest
-   if len(filenames) > 0:
-      fnLength=0
-      for fnEntry in filenames:
-         if fnEntry.nameLength() > fnLength:
-            fname=fnEntry.filename()
-            fnLength=fnEntry.nameLength()
-   # take care of special cases
-   if fname[0]=='.':
-      fname='root'
-   elif fname[0]=='$':
-      fname='dollar'+fname[1:]         
-   # file or directory?
-   if filenames[0].isDirectory():
-      # get the $I30 file
-      indexAllocs=mftEntry.attributesOfType(0xa0)
-      if len(indexAllocs) > 0:
-         # we don't handle the case of A0 in Attribute list
-         # I have never seen this happen
-         clusterList=[]
-         for indexAlloc in indexAllocs:
-            clusterList+=indexAlloc.clusterList()
-      bitmaps=mftEntry.attributesOfType(0xb0)
-      if len(bitmaps)==1:   
-         print('Creating INDX file index-'+str(fname))   
-         with open(outDir+'index-'+str(fname), 'wb') as outFile:
-            for i in range(len(clusterList)):
-               if options.indxSlack or bitmaps[0].inUse(i):
-                  outFile.write(vbr.getCluster(clusterList[i], filename))
-   else:
-      # get the file data
-      # check for attribute list case
-      attributeLists=mftEntry.attributesOfType(0x20)
-      if len(attributeLists) > 0:
-         # get the MFT entries that contain $80 attributes
-         firstVcn=-1
-         mftList=[]
-         for attributeList in attributeLists:
-            recordList=attributeList.list()
-            for record in recordList:
-               if record.attributeType()==0x80:
-                  if record.vcn()>firstVcn:
-                     mftList.append(record.mft())
-                     firstVcn=record.vcn()
-                  else:
-                     mftList.insert(0, record.mft())
-         dataAttributes=[]
-         for mftNo in mftList:
-            # get the MFT
-            # calculate the offset to the MFT entry
-            eOffset = (offset + # offset to start of partition
-                     mftOffset(mftNo, vbr))
-            
-            if options.mftFile:
-               with open(options.mftFile, 'rb') as f:
-                  f.seek(mftNo * 1024)
-                  buffer2=f.read(1024)
-            else:          
-               with open(filename, 'rb') as f:
-                  f.seek(eOffset)
-                  buffer2=f.read(1024)
-            tEntry=MftEntry(buffer2)
-            # check for fragmented MFT
-            if tEntry.recordNumber()!=mftNo:
-               print('Fragmented MFT detected...exiting')
-               return -1   
-            dataAttributes+=tEntry.attributesOfType(0x80)
-      else:
-         # get the cluster list or inline data
-         dataAttributes=mftEntry.attributesOfType(0x80)
-      clusterList=[]
-      adsClusterList=[]
-      adsName=None
-      adsData=None
-      data=None
-      lastVcn=-1
-      adsLastVcn=-1
-      
-      for dataAttr in dataAttributes:
-         if dataAttr.hasName():
-            # we have an alternate data stream
-            adsName=dataAttr.name()
-            if dataAttr.data():
-               adsData=dataAttr.data()
-            else:
-               if dataAttr.firstVcn() > adsLastVcn:
-                  adsClusterList+=(dataAttr.clusterList())
-                  adsLastVcn=dataAttr.lastVcn()
-               else:
-                  adsClusterList=dataAttr.clusterList()+adsClusterList   
-         else:
-            # normal data stream
-            if dataAttr.data():
-               data=dataAttr.data()
-            else:
-               if dataAttr.firstVcn() > lastVcn:
-                  clusterList+=(dataAttr.clusterList())
-                  lastVcn=dataAttr.lastVcn()
-               else:
-                  clusterList=dataAttr.clusterList()+clusterList   
-      
-      # now write to the file(s)
-      print("Extracting file "+str(fname))
-      with open(outDir+str(fname), 'wb') as outFile:
-         if data:
-            outFile.write(data)
-         else:
-            for cluster in clusterList:
-               outFile.write(vbr.getCluster(cluster, filename))
-      if adsName:
-         print("Extracting alternate data stream", adsName, "for file", fname)
-         with open(outDir+str(fname)+'-ads-'+adsName, 'wb') as outFile:
-            if adsData:
-               outFile.write(adsData)
-            else:
-               for cluster in adsClusterList:
-                  outFile.write(vbr.getCluster(cluster, filename))
-   
+   extractEntry(mftEntry, reader, vbr, filename, outDir, options.indxSlack,
+                knownSet=knownSet)
+
 if __name__=='__main__':
    main()
 
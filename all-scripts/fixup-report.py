@@ -0,0 +1,110 @@
+#!/usr/bin/python3
+'''Simple script to check the fixup of every MFT
+record.  Each record's sectors must end with the
+update sequence number; if they do not the record
+was only partly written (torn) and its contents
+cannot be trusted.  A status is printed for every
+damaged record followed by a summary and the
+ranges of records that are damaged.  System records
+damaged in $MFT but readable from $MFTMirr are
+reported with the status of the $MFT copy.
+Create by Dr. Phil Polstra (@ppolstra)
+for PentesterAcademy.com.'''
+
+from mft import *
+import optparse
+from vbr import Vbr
+from volumes import volumeOffset, addPartitionOption
+from mftreader import MftReader, MIRROR_RECORDS
+from paths import bestFilename
+
+def printHeader():
+   '''Prints the header listing columns.'''
+   print('MftEntry;Status;UpdateSequence;Filename;Source')
+
+def damagedRanges(numbers):
+   '''Collapses a sorted list of record numbers into
+   (first, last) ranges.'''
+   ranges=[]
+   for number in numbers:
+      if ranges and ranges[-1][1]==number - 1:
+         ranges[-1][1]=number
+      else:
+         ranges.append([number, number])
+   return ranges
+
+def main():
+   parser=optparse.OptionParser()
+   parser.add_option("-f", "--file", dest="filename",
+               help="image filename")
+   parser.add_option("-o", "--offset", dest='offset',
+               help='offset in sectors to start of volume')
+   addPartitionOption(parser)
+   parser.add_option('-m', '--mft', dest='mftFile',
+               help='MFT file')
+   parser.add_option('-a', '--all', dest='all', action='store_true',
+               help='print a status for every record, not just damaged ones')
+
+   (options, args)=parser.parse_args()
+   if options.mftFile:
+      reader=MftReader(mftFilename=options.mftFile)
+   elif options.filename:
+      try:
+         offset=volumeOffset(options.filename, options.offset, options.partition)
+      except ValueError as e:
+         print(e)
+         return -1
+      with open(options.filename, 'rb') as f:
+         f.seek(offset)
+         vbr=Vbr(f.read(512))
+      reader=MftReader(imageFilename=options.filename, vbr=vbr)
+   else:
+      print('Sorry, this script requires an MFT file or an image file')
+      return -1
+
+   # status of the $MFT copy of records read from the mirror
+   size=reader.recordSize()
+   buffer=reader.readPrimary(MIRROR_RECORDS)
+   primary={}
+   for number in range(len(buffer) // size):
+      primary[number]=fixupStatus(buffer[number*size:(number+1)*size])
+
+   counts={}
+   damaged=[]
+   printHeader()
+   for number, status, buffer in reader.records():
+      source='$MFT'
+      if number in primary and primary[number]!=status:
+         status=primary[number]
+         source='$MFTMirr'
+      counts[status]=counts.get(status, 0) + 1
+      if status==FIXUP_OK or status==FIXUP_EMPTY:
+         if options.all:
+            print(number, status, '', '""', source, sep=';')
+         continue
+      damaged.append(number)
+      # a torn record may still have a readable name
+      name=''
+      seq=''
+      if buffer[0:4]==b'FILE':
+         mftEntry=MftEntry(buffer)
+         seq=mftEntry.sequenceNumber()
+         try:
+            fnameAttr=bestFilename(mftEntry)
+            name=fnameAttr.filename() if fnameAttr else ''
+         except Exception:
+            pass
+      print(number, status, seq, '"'+name+'"', source, sep=';')
+
+   print()
+   print('Summary')
+   for status in (FIXUP_OK, FIXUP_EMPTY, FIXUP_TORN, FIXUP_BAAD, FIXUP_BAD_MAGIC):
+      print(status, counts.get(status, 0), sep=';')
+   for first, last in damagedRanges(damaged):
+      if first==last:
+         print('Damaged record', first, sep=';')
+      else:
+         print('Damaged records', str(first) + '-' + str(last), sep=';')
+
+if __name__=='__main__':
+   main()
@@ -2,38 +2,235 @@
 '''Simple script to extract timeline info.
 This script will extract just infomation
 found in MFT or also include index buffers
-if an image file is given.
+if an image file is given.  With -t one row
+is printed per timestamp, sorted by time, using
+an external merge sort so huge volumes can be
+sorted in a fixed amount of memory.  With -b a
+TSK bodyfile is printed for use with mactime.
+With -w only entries matching a filter are used.
+With -O the owner and ACL of each entry are added.
+With -S attributes carved from record slack are
+added as f ($FILE_NAME) and s ($STANDARD_INFORMATION)
+lines.
 Create by Dr. Phil Polstra (@ppolstra)
 for PentesterAcademy.com.'''
 
 from mft import *
 import optparse
 from vbr import Vbr
+from volumes import volumeOffset, addPartitionOption
 import time
+from extsort import externalSort
+from filetime import FileTimeFormatter, fileTimeToUnix
+from mftreader import MftReader
+from paths import PathResolver
+from where import Where, Record
+from security import SecureStore
 
-def printHeader():
+# one formatter so dates are memoized across rows
+formatter=FileTimeFormatter()
+
+def printHeader(owners=False):
    '''Prints the header listing columns.'''
    print('Source;AccessDate;AccessTime;ModifyDate;ModifyTime;'
          'CreateDate;CreateTime;RecordChangeDate;RecordChangeTime;'
          'MftEntry;UpdateSequence;'
-         'Attributes;FileSize;AllocatedSize;Filename')
+         'Attributes;FileSize;AllocatedSize;Filename' +
+         (';Owner;Acl' if owners else ''))
+
+def printTimelineHeader(owners=False):
+   '''Prints the header for time sorted output.'''
+   print('Date;Time;MACB;Source;MftEntry;UpdateSequence;'
+         'Attributes;FileSize;AllocatedSize;Filename' +
+         (';Owner;Acl' if owners else ''))
 
-def printLine(source, accessTs, modifyTs, createTs, recordChangeTs,
+def printLine(source, accessFt, modifyFt, createFt, recordChangeFt,
                mftNo, updateSeq,
-               attributes, fileSize=0, allocatedSize=0, filename='<unknown>'):
-   '''This function creates the CSV line.'''
+               attributes, fileSize=0, allocatedSize=0, filename='<unknown>',
+               *owner, precise=False):
+   '''This function creates the CSV line.  owner is the
+   optional owner and ACL summary.'''
+   ((accessDate, accessTime), (modifyDate, modifyTime),
+    (createDate, createTime), (changeDate, changeTime))=formatter.formatArray(
+         (accessFt, modifyFt, createFt, recordChangeFt), precise)
    print(source,             # where is this from
-         time.strftime('%Y-%m-%d', accessTs), 
-         time.strftime('%H:%M:%S', accessTs),
-         time.strftime('%Y-%m-%d', modifyTs), 
-         time.strftime('%H:%M:%S', modifyTs),
-         time.strftime('%Y-%m-%d', createTs), 
-         time.strftime('%H:%M:%S', createTs),
-         time.strftime('%Y-%m-%d', recordChangeTs), 
-         time.strftime('%H:%M:%S', recordChangeTs),
+         accessDate, accessTime,
+         modifyDate, modifyTime,
+         createDate, createTime,
+         changeDate, changeTime,
          mftNo, updateSeq,
          attributes, fileSize, allocatedSize, '"'+str(filename)+'"', 
-         sep=';')
+         *['"'+o+'"' for o in owner], sep=';')
+
+def printTimelineLine(row, precise=False):
+   '''Prints one row of the time sorted output.'''
+   fileTime, macb, source, mftNo, updateSeq, attributes, fileSize, allocatedSize, filename=row[:9]
+   print(formatter.date(fileTime),
+         formatter.timePrecise(fileTime) if precise else formatter.time(fileTime),
+         macb, source, mftNo, updateSeq,
+         attributes, fileSize, allocatedSize, '"'+str(filename)+'"',
+         *['"'+o+'"' for o in row[9:]], sep=';')
+
+def bodyTime(fileTime, precise=False):
+   '''Unix time for a bodyfile.  Times before 1970 are 0.'''
+   secs, ticks=fileTimeToUnix(fileTime)
+   if secs < 0:
+      return '0'
+   if precise:
+      return '%d.%07d' % (secs, ticks)
+   return str(secs)
+
+def printBodyLine(source, accessFt, modifyFt, createFt, recordChangeFt,
+               mftNo, updateSeq,
+               attributes, fileSize=0, allocatedSize=0, filename='<unknown>',
+               *owner, precise=False):
+   '''Prints a TSK 3.x bodyfile line
+   MD5|name|inode|mode|UID|GID|size|atime|mtime|ctime|crtime'''
+   if source=='F':
+      name=str(filename)+' ($FILE_NAME)'
+   elif source=='f':
+      name=str(filename)+' ($FILE_NAME slack)'
+   elif source=='s':
+      name=str(filename)+' (slack)'
+   elif source=='I':
+      name=str(filename)+' ($I30)'
+   else:
+      name=str(filename)
+   # directory flag is 0x10 in $10 and 0x10000000 in $30
+   if attributes & 0x10000010:
+      mode='d/drwxrwxrwx'
+   else:
+      mode='r/rrwxrwxrwx'
+   print('0', name, str(mftNo)+'-'+str(updateSeq), mode, '0', '0', fileSize,
+         bodyTime(accessFt, precise), bodyTime(modifyFt, precise),
+         bodyTime(recordChangeFt, precise), bodyTime(createFt, precise),
+         sep='|')
+
+def timelineRows(rows):
+   '''Splits each MFT row into one row per timestamp.'''
+   for row in rows:
+      (source, accessFt, modifyFt, createFt, recordChangeFt,
+         mftNo, updateSeq, attributes, fileSize, allocatedSize, filename)=row[:11]
+      for fileTime, macb in ((modifyFt, 'M'), (accessFt, 'A'),
+                             (recordChangeFt, 'C'), (createFt, 'B')):
+         yield (fileTime, macb, source, mftNo, updateSeq,
+                attributes, fileSize, allocatedSize, filename) + row[11:]
+
+def slackRows(mftEntry, buffer):
+   '''Generator that yields f and s lines for attributes
+   carved from the slack of a record.'''
+   fnameAttr=None
+   for pos, attr in slackAttributes(buffer):
+      if attr.attributeType()==0x30:
+         fnameAttr=attr
+         yield ('f', attr.accessFileTime(),
+            attr.modificationFileTime(),
+            attr.creationFileTime(),
+            attr.recordChangeFileTime(),
+            mftEntry.recordNumber(), mftEntry.sequenceNumber(),
+            attr.flags(), attr.logicalSize(), attr.physicalSize(),
+            attr.filename())
+      elif attr.attributeType()==0x10:
+         # name and size come from a carved $30 if there is one
+         yield ('s', attr.accessFileTime(),
+            attr.modificationFileTime(),
+            attr.creationFileTime(),
+            attr.recordChangeFileTime(),
+            mftEntry.recordNumber(), mftEntry.sequenceNumber(),
+            attr.flags(),
+            fnameAttr.logicalSize() if fnameAttr else 0,
+            fnameAttr.physicalSize() if fnameAttr else 0,
+            fnameAttr.filename() if fnameAttr else '<slack>')
+
+def entryRows(mftEntry, buffer, filename, vbr, slack=False):
+   '''Generator that yields the F, S and I lines (and f
+   and s lines if slack is set) for one MFT entry.'''
+   # do filenames first
+   fnames = mftEntry.attributesOfType(0x30)
+   if len(fnames)>0:
+      for fnameAttr in fnames:
+         yield ('F', fnameAttr.accessFileTime(), 
+            fnameAttr.modificationFileTime(),
+            fnameAttr.creationFileTime(),
+            fnameAttr.recordChangeFileTime(),
+            mftEntry.recordNumber(), mftEntry.sequenceNumber(),
+            fnameAttr.flags(),
+            fnameAttr.logicalSize(),
+            fnameAttr.physicalSize(), 
+            fnameAttr.filename())
+      # now get the standard info
+      # this is done second so we can get size and filename
+      for stdInfo in mftEntry.attributesOfType(0x10):
+         yield ('S', stdInfo.accessFileTime(), 
+            stdInfo.modificationFileTime(),
+            stdInfo.creationFileTime(),
+            stdInfo.recordChangeFileTime(),
+            mftEntry.recordNumber(), mftEntry.sequenceNumber(),
+            stdInfo.flags(),
+            fnameAttr.logicalSize(),
+            fnameAttr.physicalSize(), 
+            fnameAttr.filename())
+      # now get the index buffers, but only if you gave
+      # me an image file
+      if filename and mftEntry.isDirectory():
+         indexAllocs=mftEntry.attributesOfType(0xA0)
+         for indexAlloc in indexAllocs:
+            # we don't handle the case of A0 in Attribute list
+            # I have never seen this happen
+            clusterList=[]
+            clusterList+=indexAlloc.clusterList()
+            # build $I30 file in memory
+            indxBuffer=b''
+            for clusterNo in clusterList:
+               indxBuffer+=vbr.getCluster(clusterNo, filename)
+            indexAlloc.getEntries(indxBuffer)
+            for i in range(indexAlloc.numberOfEntries()):
+               indexEntry=indexAlloc.entry(i)
+               yield ('I', indexEntry.accessFileTime(), 
+                  indexEntry.modificationFileTime(),
+                  indexEntry.creationFileTime(),
+                  indexEntry.recordChangeFileTime(),
+                  indexEntry.mft(), indexEntry.sequenceNumber(),
+                  indexEntry.flags(),
+                  indexEntry.logicalSize(),
+                  indexEntry.physicalSize(), 
+                  indexEntry.filename())
+   if slack:
+      yield from slackRows(mftEntry, buffer)
+
+def getRows(mftFile, filename, vbr, where=None, resolver=None, slack=False,
+            security=None):
+   '''Generator that yields one tuple per F, S or I line
+   with raw FILETIMEs in printLine() order.  If a Where
+   filter is given only matching entries are used.  If
+   slack is set f and s lines are carved from the slack
+   of each record in the same pass.  If a SecureStore is
+   given the owner and ACL summary are added to each
+   tuple (blank for I lines which describe other
+   entries).'''
+   with open(mftFile, 'rb') as mftF:
+      number=-1
+      buffer=mftF.read(1024)
+      while buffer:
+         number+=1
+         if where:
+            record=Record(number, buffer, resolver=resolver)
+            if not where.matches(record):
+               buffer=mftF.read(1024)
+               continue
+            mftEntry=record.entry()
+         else:
+            mftEntry=MftEntry(buffer)
+         if not mftEntry.isValid():
+            buffer=mftF.read(1024)
+            continue
+         if security:
+            owner=security.ownerAndAcl(mftEntry)
+            for row in entryRows(mftEntry, buffer, filename, vbr, slack):
+               yield row + (('', '') if row[0]=='I' else owner)
+         else:
+            yield from entryRows(mftEntry, buffer, filename, vbr, slack)
+         buffer=mftF.read(1024)
    
 def main():
    parser=optparse.OptionParser()
@@ -41,15 +238,33 @@ def main():
                help="image filename")
    parser.add_option("-o", "--offset", dest='offset',
                help='offset in sectors to start of volume')
+   addPartitionOption(parser)
    parser.add_option('-m', '--mft', dest='mftFile',
                help='MFT file')
+   parser.add_option('-t', '--timeline', dest='timeline', action='store_true',
+               help='one row per timestamp sorted by time')
+   parser.add_option('-r', '--run-size', dest='runSize',
+               help='rows held in memory while sorting (default 1000000)')
+   parser.add_option('-T', '--tmpdir', dest='tmpDir',
+               help='directory for temporary sort files')
+   parser.add_option('-p', '--precise', dest='precise', action='store_true',
+               help='print times with 100ns precision')
+   parser.add_option('-b', '--bodyfile', dest='bodyfile', action='store_true',
+               help='print a bodyfile for mactime')
+   parser.add_option('-w', '--where', dest='where',
+               help='only entries matching this filter (see where.py)')
+   parser.add_option('-S', '--slack', dest='slack', action='store_true',
+               help='add timestamps carved from record slack')
+   parser.add_option('-O', '--owners', dest='owners', action='store_true',
+               help='add owner and ACL columns (needs an image file)')
                
    (options, args)=parser.parse_args()
    filename=options.filename
-   if options.offset:
-      offset=512 * int(options.offset)
-   else:
-      offset=0
+   try:
+      offset=volumeOffset(filename, options.offset, options.partition)
+   except ValueError as e:
+      print(e)
+      return -1
       
    # if we have an image file grab VBR
    if options.filename:   
@@ -65,63 +280,37 @@ def main():
       print('Sorry, this script requires an MFT file')
       return -1
          
-   # now open the MFT file and get all the info for each entry
-   with open(options.mftFile, 'rb') as mftF:
-      buffer=mftF.read(1024)
-      printHeader()
-      while buffer:
-         mftEntry=MftEntry(buffer)
-         # do filenames first
-         fnames = mftEntry.attributesOfType(0x30)
-         if len(fnames)>0:
-            for fnameAttr in fnames:
-               printLine('F', fnameAttr.accessTime(), 
-                  fnameAttr.modificationTime(),
-                  fnameAttr.creationTime(),
-                  fnameAttr.recordChangeTime(),
-                  mftEntry.recordNumber(), mftEntry.sequenceNumber(),
-                  fnameAttr.flags(),
-                  fnameAttr.logicalSize(),
-                  fnameAttr.physicalSize(), 
-                  fnameAttr.filename())
-            # now get the standard info
-            # this is done second so we can get size and filename
-            for stdInfo in mftEntry.attributesOfType(0x10):
-               printLine('S', stdInfo.accessTime(), 
-                  stdInfo.modificationTime(),
-                  stdInfo.creationTime(),
-                  stdInfo.recordChangeTime(),
-                  mftEntry.recordNumber(), mftEntry.sequenceNumber(),
-                  stdInfo.flags(),
-                  fnameAttr.logicalSize(),
-                  fnameAttr.physicalSize(), 
-                  fnameAttr.filename())
-            # now get the index buffers, but only if you gave
-            # me an image file
-            if options.filename and mftEntry.isDirectory():
-               indexAllocs=mftEntry.attributesOfType(0xA0)
-               for indexAlloc in indexAllocs:
-                  # we don't handle the case of A0 in Attribute list
-                  # I have never seen this happen
-                  clusterList=[]
-                  clusterList+=indexAlloc.clusterList()
-                  # build $I30 file in memory
-                  indxBuffer=b''
-                  for clusterNo in clusterList:
-                     indxBuffer+=vbr.getCluster(clusterNo, filename)
-                  indexAlloc.getEntries(indxBuffer)
-                  for i in range(indexAlloc.numberOfEntries()):
-                     indexEntry=indexAlloc.entry(i)
-                     printLine('I', indexEntry.accessTime(), 
-                        indexEntry.modificationTime(),
-                        indexEntry.creationTime(),
-                        indexEntry.recordChangeTime(),
-                        indexEntry.mft(), indexEntry.sequenceNumber(),
-                        indexEntry.flags(),
-                        indexEntry.logicalSize(),
-                        indexEntry.physicalSize(), 
-                        indexEntry.filename())
-         buffer=mftF.read(1024)
+   where=None
+   resolver=None
+   if options.where:
+      try:
+         where=Where(options.where)
+      except ValueError as e:
+         print(e)
+         return -1
+      if where.needsPaths():
+         resolver=PathResolver.fromReader(MftReader(mftFilename=options.mftFile))
+   security=None
+   if options.owners:
+      if not filename:
+         print('Sorry, owners can only be found with an image file')
+         return -1
+      security=SecureStore(MftReader(mftFilename=options.mftFile), vbr, filename)
+   rows=getRows(options.mftFile, filename, vbr if filename else None, where, resolver,
+               options.slack, security)
+   if options.bodyfile:
+      for row in rows:
+         printBodyLine(*row, precise=options.precise)
+   elif options.timeline:
+      runSize=int(options.runSize) if options.runSize else 1000000
+      printTimelineHeader(options.owners)
+      for row in externalSort(timelineRows(rows), key=lambda r: r[0],
+                              runSize=runSize, tmpDir=options.tmpDir):
+         printTimelineLine(row, options.precise)
+   else:
+      printHeader(options.owners)
+      for row in rows:
+         printLine(*row, precise=options.precise)
                                  
    
 if __name__=='__main__':
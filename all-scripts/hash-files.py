@@ -0,0 +1,121 @@
+#!/usr/bin/python3
+'''Simple script to hash every allocated file on
+an NTFS volume without mounting it.  Each file is
+read once and MD5, SHA1 and SHA256 (and an ssdeep
+fuzzy hash with -z) are calculated from the same
+data.  Files are hashed in LCN order by a pool of
+threads so fast disks are kept busy.  WOF compressed
+system files are hashed as their real contents, with
+the chunks decompressed by a pool of processes.
+Create by Dr. Phil Polstra (@ppolstra)
+for PentesterAcademy.com.'''
+
+from mft import *
+import optparse
+import sys
+from vbr import Vbr
+from volumes import volumeOffset, addPartitionOption
+from mftreader import MftReader
+from stream import getStreams
+from paths import PathResolver
+from hashing import HashEngine, DEFAULT_ALGORITHMS, FUZZY_ALGORITHM
+from hashset import HashSet
+import wof
+
+def printHeader(algorithms=DEFAULT_ALGORITHMS):
+   '''Prints the header listing columns.'''
+   print('MftEntry;UpdateSequence;Path;Stream;FileSize;' +
+         ';'.join([a.upper() for a in algorithms]))
+
+def main():
+   parser=optparse.OptionParser()
+   parser.add_option("-f", "--file", dest="filename",
+               help="image filename")
+   parser.add_option("-o", "--offset", dest='offset',
+               help='offset in sectors to start of volume')
+   addPartitionOption(parser)
+   parser.add_option('-m', '--mft', dest='mftFile',
+               help='MFT file')
+   parser.add_option('-t', '--threads', dest='threads',
+               help='number of hashing threads (default 4)')
+   parser.add_option('-a', '--ads', dest='ads', action='store_true',
+               help='also hash alternate data streams')
+   parser.add_option('-D', '--deleted', dest='deleted', action='store_true',
+               help='include entries that are not in use')
+   parser.add_option('-k', '--known', dest='known',
+               help='hash set of known files to leave out of the output')
+   parser.add_option('-z', '--fuzzy', dest='fuzzy', action='store_true',
+               help='add an ssdeep fuzzy hash column (slow)')
+   parser.add_option('-p', '--processes', dest='processes',
+               help='number of WOF decompression processes (default one per CPU)')
+
+   (options, args)=parser.parse_args()
+   if not options.filename:
+      print('Sorry, this script requires an image file')
+      return -1
+   try:
+      offset=volumeOffset(options.filename, options.offset, options.partition)
+   except ValueError as e:
+      print(e)
+      return -1
+   threads=int(options.threads) if options.threads else 4
+   if options.processes:
+      wof.setWorkers(int(options.processes))
+
+   with open(options.filename, 'rb') as f:
+      f.seek(offset)
+      vbr=Vbr(f.read(512))
+   if options.mftFile:
+      reader=MftReader(mftFilename=options.mftFile)
+   else:
+      reader=MftReader(imageFilename=options.filename, vbr=vbr)
+
+   # one pass over the MFT for paths and a list of
+   # (first LCN, entry, sequence number, stream) to hash
+   resolver=PathResolver()
+   work=[]
+   for number, mftEntry in reader.entries():
+      resolver.addEntry(number, mftEntry)
+      if mftEntry.baseFileMft()!=0 or mftEntry.isDirectory():
+         continue
+      if not mftEntry.inUse() and not options.deleted:
+         continue
+      for name, stream in getStreams(mftEntry, reader.entry).items():
+         if stream.isNamed() and not options.ads:
+            continue
+         if stream.isCompressed() or stream.isEncrypted():
+            print('Skipping compressed or encrypted stream', number, name,
+                  file=sys.stderr)
+            continue
+         # WOF files are read from their compressed stream
+         if stream.isWofCompressed():
+            work.append((stream.wofData().firstLcn(), number, mftEntry.sequenceNumber(), stream))
+         else:
+            work.append((stream.firstLcn(), number, mftEntry.sequenceNumber(), stream))
+   # streams only hold their runs so keeping them all is
+   # cheaper than reading their records again
+   work.sort(key=lambda w: w[:2])
+
+   def jobs():
+      for lcn, number, seq, stream in work:
+         yield ((number, seq), stream)
+
+   knownSet=HashSet(options.known) if options.known else None
+   algorithms=DEFAULT_ALGORITHMS
+   if options.fuzzy:
+      # computed from the same reads as the other hashes
+      algorithms+=(FUZZY_ALGORITHM,)
+   printHeader(algorithms)
+   engine=HashEngine(options.filename, vbr, threads, algorithms)
+   try:
+      for (number, seq), stream, hasher in engine.hashStreams(jobs()):
+         if knownSet and hasher.hexdigest(knownSet.algorithm()) in knownSet:
+            continue
+         print(';'.join([str(number), str(seq), '"'+str(resolver.path(number))+'"',
+                  '"'+stream.name()+'"', str(hasher.size())] +
+                  hasher.hexdigests()))
+   finally:
+      engine.close()
+
+if __name__=='__main__':
+   main()
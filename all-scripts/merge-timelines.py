@@ -0,0 +1,104 @@
+#!/usr/bin/python3
+'''Simple script to merge time sorted timelines
+from several volumes (get-macs.py -t output) into
+one timeline.  Files are streamed through a heap
+so memory use does not depend on their size.
+Duplicate rows are dropped (only within a volume
+with -l) and an optional time window is applied during the merge.
+Every input must have the same header (get-macs.py
+-O adds Owner and Acl columns) and it is copied to
+the output.
+Create by Dr. Phil Polstra (@ppolstra)
+for PentesterAcademy.com.'''
+
+import optparse
+import heapq
+import os
+import sys
+
+def readHeader(filename):
+   '''Returns the header line of a timeline or None if
+   it does not start with one.'''
+   with open(filename, 'r', errors='replace') as f:
+      line=f.readline().rstrip('\r\n')
+   if line.startswith('Date;'):
+      return line
+   return None
+
+def timelineRows(filename, label=None):
+   '''Generator yielding (timestamp, row, label) for each
+   line of a sorted timeline.  Timestamps are the first
+   two columns as "YYYY-MM-DD HH:MM:SS" which sort
+   correctly as strings.'''
+   with open(filename, 'r', errors='replace') as f:
+      for line in f:
+         line=line.rstrip('\r\n')
+         if not line or line.startswith('Date;'):
+            continue
+         date, tm, rest=line.split(';', 2)
+         yield (date+' '+tm, line, label)
+
+def main():
+   parser=optparse.OptionParser('usage %prog [options] timeline...')
+   parser.add_option('-s', '--start', dest='start',
+               help='only rows at or after this time (YYYY-MM-DD [HH:MM:SS])')
+   parser.add_option('-e', '--end', dest='end',
+               help='only rows before this time (YYYY-MM-DD [HH:MM:SS])')
+   parser.add_option('-l', '--label', dest='label', action='store_true',
+               help='add a Volume column with the name of the input file')
+   parser.add_option('-w', '--write', dest='outFile',
+               help='output file (default stdout)')
+
+   (options, args)=parser.parse_args()
+   if len(args)==0:
+      parser.print_help()
+      return -1
+
+   # rows are copied as they are so the columns must match
+   header=None
+   for name in args:
+      thisHeader=readHeader(name)
+      if thisHeader==None:
+         print('Sorry,', name, 'does not start with a timeline header')
+         return -1
+      if header==None:
+         header=thisHeader
+      elif thisHeader!=header:
+         print('Sorry, the header of', name, 'does not match', args[0])
+         print('   ', thisHeader)
+         print('   ', header)
+         return -1
+
+   out=open(options.outFile, 'w') if options.outFile else sys.stdout
+   inputs=[timelineRows(name, os.path.basename(name) if options.label else None)
+           for name in args]
+   if options.label:
+      print('Volume;'+header, file=out)
+   else:
+      print(header, file=out)
+   # rows with the same timestamp are remembered so duplicates
+   # from overlapping inputs are dropped even if they are
+   # not next to each other.  With -l identical rows from
+   # different volumes are all kept, each with its label.
+   current=None
+   seen=set()
+   for stamp, line, label in heapq.merge(*inputs, key=lambda r: r[0]):
+      if options.start and stamp < options.start:
+         continue
+      if options.end and stamp >= options.end:
+         break
+      if stamp!=current:
+         current=stamp
+         seen=set()
+      if (label, line) in seen:
+         continue
+      seen.add((label, line))
+      if label:
+         print(label+';'+line, file=out)
+      else:
+         print(line, file=out)
+   if options.outFile:
+      out.close()
+
+if __name__=='__main__':
+   main()
@@ -0,0 +1,161 @@
+#!/usr/bin/python3
+'''Simple script to show what changed between two
+copies of the same $MFT (e.g. from two acquisitions
+of one host).  Each MFT is read once sequentially
+and every record is reduced to a short hash after
+the fixup is applied.  Only records whose hashes
+differ are decoded and compared field by field.
+The $LogFile sequence number and update sequence
+array change on every write so they are left out
+of the hash.
+Create by Dr. Phil Polstra (@ppolstra)
+for PentesterAcademy.com.'''
+
+from mft import *
+import optparse
+import hashlib
+import struct
+from mftreader import MftReader
+from paths import PathResolver, bestFilename
+from filetime import FileTimeFormatter
+from where import Record
+
+DIGEST_SIZE=8
+# digests compared at a time before looking at single records
+BLOCK_RECORDS=4096
+
+formatter=FileTimeFormatter()
+
+def recordDigest(buffer):
+   '''Short hash of a record with the fixup applied and
+   the fields that change on every write zeroed.'''
+   if buffer[0:4]!=b'FILE':
+      return hashlib.blake2b(buffer, digest_size=DIGEST_SIZE).digest()
+   data=bytearray(applyFixup(buffer, 0, len(buffer)))
+   usaOffset, usaSize=struct.unpack_from('<HH', data, 4)
+   data[8:16]=bytes(8)
+   data[usaOffset:usaOffset+2*usaSize]=bytes(2*usaSize)
+   return hashlib.blake2b(data, digest_size=DIGEST_SIZE).digest()
+
+def digestArray(reader):
+   '''One sequential pass.  Returns a bytearray with
+   DIGEST_SIZE bytes for every record.'''
+   digests=bytearray()
+   for number, buffer in reader.buffers():
+      digests+=recordDigest(buffer)
+   return digests
+
+def changedRecords(digests1, digests2):
+   '''Generator yielding the numbers of records whose
+   digests differ, including records in only one MFT.
+   Whole blocks of digests are compared first.'''
+   common=min(len(digests1), len(digests2)) // DIGEST_SIZE
+   view1=memoryview(digests1)
+   view2=memoryview(digests2)
+   blockBytes=BLOCK_RECORDS * DIGEST_SIZE
+   for start in range(0, common * DIGEST_SIZE, blockBytes):
+      end=min(start + blockBytes, common * DIGEST_SIZE)
+      if view1[start:end]==view2[start:end]:
+         continue
+      for pos in range(start, end, DIGEST_SIZE):
+         if view1[pos:pos+DIGEST_SIZE]!=view2[pos:pos+DIGEST_SIZE]:
+            yield pos // DIGEST_SIZE
+   for number in range(common, max(len(digests1), len(digests2)) // DIGEST_SIZE):
+      yield number
+
+def entryFields(number, mftEntry):
+   '''Dictionary of the fields that are compared.'''
+   if mftEntry==None or not mftEntry.isValid():
+      return {'Valid':False}
+   fields={'Valid':True,
+           'InUse':mftEntry.inUse(),
+           'Directory':mftEntry.isDirectory(),
+           'Sequence':mftEntry.sequenceNumber(),
+           'HardLinks':mftEntry.hardLinkCount(),
+           'BaseRecord':mftEntry.baseFileMft()}
+   fields['Names']=' '.join(sorted([str(f.parentMft()) + '/' + f.filename()
+                                   for f in mftEntry.attributesOfType(0x30)]))
+   stdInfos=mftEntry.attributesOfType(0x10)
+   if stdInfos:
+      si=stdInfos[0]
+      fields['SICreated']=formatter.dateTime(si.creationFileTime(), True)
+      fields['SIModified']=formatter.dateTime(si.modificationFileTime(), True)
+      fields['SIRecordChanged']=formatter.dateTime(si.recordChangeFileTime(), True)
+      fields['SIAccessed']=formatter.dateTime(si.accessFileTime(), True)
+      fields['SIFlags']='%04X' % si.flags()
+   fnameAttr=bestFilename(mftEntry)
+   if fnameAttr:
+      fields['FNCreated']=formatter.dateTime(fnameAttr.creationFileTime(), True)
+      fields['FNModified']=formatter.dateTime(fnameAttr.modificationFileTime(), True)
+      fields['FNRecordChanged']=formatter.dateTime(fnameAttr.recordChangeFileTime(), True)
+      fields['FNAccessed']=formatter.dateTime(fnameAttr.accessFileTime(), True)
+   fields['Size']=Record(number, mftEntry=mftEntry).size()
+   streams=[]
+   for attr in mftEntry.attributesOfType(0x80):
+      if attr.hasName():
+         size=attr.attributeLength() if attr.isResident() else attr.logicalSize()
+         streams.append(attr.nameString() + ':' + str(size))
+   fields['Streams']=' '.join(sorted(streams))
+   fields['Attributes']=' '.join(['%02X' % a.attributeType() for a in mftEntry.attributes()])
+   return fields
+
+def classify(old, new):
+   '''Short description of a change.'''
+   if not old['Valid'] and new['Valid']:
+      return 'Added'
+   if old['Valid'] and not new['Valid']:
+      return 'Removed'
+   if not old['Valid']:
+      return 'Modified'
+   if old['Sequence']!=new['Sequence']:
+      return 'Reallocated'
+   if old['InUse'] and not new['InUse']:
+      return 'Deleted'
+   if not old['InUse'] and new['InUse']:
+      return 'Undeleted'
+   return 'Modified'
+
+def main():
+   parser=optparse.OptionParser('usage %prog [options] old-MFT new-MFT')
+   parser.add_option('-s', '--summary', dest='summary', action='store_true',
+               help='one line per changed record instead of one per field')
+   (options, args)=parser.parse_args()
+   if len(args)!=2:
+      parser.print_help()
+      return -1
+
+   reader1=MftReader(mftFilename=args[0])
+   reader2=MftReader(mftFilename=args[1])
+   digests1=digestArray(reader1)
+   digests2=digestArray(reader2)
+   # paths come from the newer MFT unless the entry is gone
+   resolver1=PathResolver(reader1.entry)
+   resolver2=PathResolver(reader2.entry)
+
+   if options.summary:
+      print('MftEntry;Change;Fields;Path')
+   else:
+      print('MftEntry;Change;Field;Old;New;Path')
+   for number in changedRecords(digests1, digests2):
+      old=entryFields(number, reader1.entry(number))
+      new=entryFields(number, reader2.entry(number))
+      change=classify(old, new)
+      path=resolver2.path(number) if new['Valid'] else None
+      if path==None:
+         path=resolver1.path(number)
+      path='"' + str(path or '') + '"'
+      names=sorted(set(old.keys()) | set(new.keys()))
+      diffs=[(k, old.get(k, ''), new.get(k, '')) for k in names
+             if k!='Valid' and old.get(k, '')!=new.get(k, '')]
+      if not diffs:
+         # only bytes that are not decoded (slack, index
+         # entries, etc.) changed
+         diffs=[('Content', '', '')]
+      if options.summary:
+         print(number, change, ','.join([d[0] for d in diffs]), path, sep=';')
+      else:
+         for field, oldValue, newValue in diffs:
+            print(number, change, field, oldValue, newValue, path, sep=';')
+
+if __name__=='__main__':
+   main()
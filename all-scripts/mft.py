@@ -6,12 +6,14 @@ by passing in a 1024 byte binary string.
 Created by Dr. Phil Polstra
 for PentesterAcademy.com'''
 
-__all__=['MftHeader', 'DataRun', 'dataRuns', 'Attribute', 'StandardInfo', 'AttributeItem', 'AttributeList', 'Filename', 'Data', 'IndexRoot', 'IndexEntry', 'IndexAllocation', 'Bitmap', 'IndexBuffer', 'getAttribute', 'MftEntry']
+__all__=['MftHeader', 'DataRun', 'dataRuns', 'Attribute', 'StandardInfo', 'AttributeItem', 'AttributeList', 'Filename', 'Data', 'IndexRoot', 'IndexEntry', 'IndexAllocation', 'Bitmap', 'IndexBuffer', 'ReparsePoint', 'getAttribute', 'applyFixup', 'fixupStatus', 'slackAttributes', 'MftEntry',
+	'FIXUP_OK', 'FIXUP_TORN', 'FIXUP_BAD_MAGIC', 'FIXUP_BAAD', 'FIXUP_EMPTY']
 
 import struct 	# for interpreting entries
 import optparse # command line options
 import time		# time conversion functions
 from vbr import Vbr
+from volumes import volumeOffset, addPartitionOption
 
 class MftHeader:
 	def __init__(self, buffer):
@@ -101,10 +103,12 @@ class MftHeader:
 class DataRun:
 	'''This class represents a single data run.
 	it is little more than a wrapper around 
-	the range object.'''
-	def __init__(self, start, count):
+	the range object.  Sparse runs have no
+	starting cluster and read back as zeroes.'''
+	def __init__(self, start, count, sparse=False):
 		self._start=start
 		self._count=count
+		self._sparse=sparse
 		
 	def numberOfClusters(self):
 		return self._count
@@ -112,13 +116,20 @@ class DataRun:
 	def startingCluster(self):
 		return self._start
 		
+	def isSparse(self):
+		return self._sparse
+		
 	def clusterList(self):
+		if self._sparse:
+			return [None] * self._count
 		retList=[]
 		for i in range(self._start, self._start+self._count):
 			retList.append(i)
 		return retList
 		
 	def __str__(self):
+		if self._sparse:
+			return 'Data run sparse/count: ' + str(self.numberOfClusters())
 		return ('Data run start/count: ' + 
 					str(self.startingCluster()) + 
 					'/' + str(self.numberOfClusters()) )
@@ -154,7 +165,7 @@ def dataRuns(buff, offset=0):
 	retList=[]
 	startCluster=0	
 	# loop till size of next run is zero
-	while buff[pos]!=b'\x00' and pos < len(buff):
+	while pos < len(buff):
 		# get sizes for run
 		size=ord(buff[pos:pos+1])
 		if size==0:
@@ -164,6 +175,10 @@ def dataRuns(buff, offset=0):
 		pos+=1
 		count=bytesToUnsigned(buff, countSize, pos)
 		pos+=countSize
+		# no offset means a sparse run
+		if offsetSize==0:
+			retList.append(DataRun(None, count, True))
+			continue
 		startCluster+=bytesToSigned(buff, offsetSize, pos)
 		pos+=offsetSize
 		retList.append(DataRun(startCluster, count))
@@ -285,7 +300,14 @@ class Attribute:
 		return self.__headerTuple[3]!=0
 	
 	def name(self):
-		self.__name
+		return self.__name
+		
+	def nameString(self):
+		'''Returns the attribute name decoded
+		from UTF-16 or an empty string.'''
+		if self.__name:
+			return self.__name.decode('utf-16', errors='ignore')
+		return ''
 		
 	def flags(self):
 		return self.__headerTuple[5]
@@ -312,7 +334,8 @@ class Attribute:
 
 def convertFileTime(stupid):
 	'''Converts idiotic Win32 filetimes to something reasonable.'''
-	t = stupid * 100/ 1000000000
+	# integer math avoids float rounding errors
+	t = stupid // 10000000
 	t -= 11644473600
 	if t > 0:
 		return time.gmtime(t)
@@ -353,6 +376,19 @@ class StandardInfo(Attribute):
 	def accessTime(self):
 		return convertFileTime(self._10Tuple[3])
 		
+	def creationFileTime(self):
+		'''Raw FILETIME (100ns since 1601)'''
+		return self._10Tuple[0]
+		
+	def modificationFileTime(self):
+		return self._10Tuple[1]
+		
+	def recordChangeFileTime(self):
+		return self._10Tuple[2]
+		
+	def accessFileTime(self):
+		return self._10Tuple[3]
+		
 	def flags(self):
 		'''Flags are
 		0123456789ABCDE-bits
@@ -555,6 +591,19 @@ class Filename(Attribute):
    def accessTime(self):
       return convertFileTime(self._30Tuple[6])
 
+   def creationFileTime(self):
+      '''Raw FILETIME (100ns since 1601)'''
+      return self._30Tuple[3]
+
+   def modificationFileTime(self):
+      return self._30Tuple[4]
+
+   def recordChangeFileTime(self):
+      return self._30Tuple[5]
+
+   def accessFileTime(self):
+      return self._30Tuple[6]
+
    def physicalSize(self):
       return self._30Tuple[7]
 	
@@ -751,6 +800,19 @@ class IndexEntry:
 	def accessTime(self):
 		return convertFileTime(self._entryTuple[11])
 		
+	def creationFileTime(self):
+		'''Raw FILETIME (100ns since 1601)'''
+		return self._entryTuple[8]
+		
+	def modificationFileTime(self):
+		return self._entryTuple[9]
+		
+	def recordChangeFileTime(self):
+		return self._entryTuple[10]
+		
+	def accessFileTime(self):
+		return self._entryTuple[11]
+		
 	def physicalSize(self):
 		return self._entryTuple[12]
 		
@@ -1048,6 +1110,149 @@ class Bitmap(Attribute):
 		retStr+='\nClusters in use/bitmap: ' + str(self.clustersInUse()) + '/' + str(self.clustersInMap())
 		return retStr
 
+# reparse tags
+IO_REPARSE_TAG_MOUNT_POINT=0xA0000003
+IO_REPARSE_TAG_SYMLINK=0xA000000C
+IO_REPARSE_TAG_WOF=0x80000017
+IO_REPARSE_TAG_CLOUD=0x9000001A
+
+REPARSE_TAG_NAMES={0xA0000003:'junction', 0xA000000C:'symlink', 0x80000017:'WOF',
+	0x80000013:'dedup', 0x8000001B:'appexeclink', 0x80000023:'AF_UNIX socket',
+	0xA000001D:'LX symlink', 0x80000024:'LX FIFO', 0x80000025:'LX char device',
+	0x80000026:'LX block device', 0x80000008:'HSM', 0x80000009:'SIS',
+	0x80000012:'DFSR', 0x8000000A:'DFS', 0x80000014:'NFS', 0x8000001E:'projfs',
+	0x9000001A:'cloud'}
+
+WOF_PROVIDER_WIM=1
+WOF_PROVIDER_FILE=2
+WOF_ALGORITHMS={0:'XPRESS4K', 1:'LZX', 2:'XPRESS8K', 3:'XPRESS16K'}
+
+class ReparsePoint(Attribute):
+	'''This class represents the $REPARSE_POINT ($C0)
+	attribute.  The reparse data is only decoded when one
+	of the methods below is called.'''
+	def __init__(self, buffer, offset=0):
+		super(ReparsePoint, self).__init__(buffer, offset)
+		if self.isResident():
+			self._data=buffer[offset+self.attributeOffset():offset+self.attributeOffset()+self.attributeLength()]
+		else:
+			self._data=b''
+		self._names=None
+
+	def data(self):
+		return self._data
+
+	def tag(self):
+		if len(self._data) < 8:
+			return 0
+		return struct.unpack('<L', self._data[0:4])[0]
+
+	def tagName(self):
+		'''Readable name of the tag.  All the cloud tags
+		(0x9000X01A) are reported as cloud.'''
+		tag=self.tag()
+		if tag & 0xFFFF0FFF==IO_REPARSE_TAG_CLOUD:
+			tag=IO_REPARSE_TAG_CLOUD
+		return REPARSE_TAG_NAMES.get(tag, '%08X' % self.tag())
+
+	def isMicrosoft(self):
+		return (self.tag() & 0x80000000) != 0
+
+	def isNameSurrogate(self):
+		'''True for tags that point at another file or
+		directory (junctions and symbolic links).'''
+		return (self.tag() & 0x20000000) != 0
+
+	def isJunction(self):
+		return self.tag()==IO_REPARSE_TAG_MOUNT_POINT
+
+	def isSymlink(self):
+		return self.tag()==IO_REPARSE_TAG_SYMLINK
+
+	def isWof(self):
+		return self.tag()==IO_REPARSE_TAG_WOF
+
+	def isCloud(self):
+		return self.tag() & 0xFFFF0FFF==IO_REPARSE_TAG_CLOUD
+
+	def reparseData(self):
+		'''Tag specific data after the header (and the GUID
+		for third party tags).'''
+		start=8 if self.isMicrosoft() else 24
+		length=struct.unpack('<H', self._data[4:6])[0] if len(self._data) >= 8 else 0
+		return self._data[start:start+length]
+
+	def _decodeNames(self):
+		'''(substitute name, print name, flags) of a junction
+		or symbolic link.'''
+		if self._names==None:
+			self._names=('', '', 0)
+			data=self.reparseData()
+			if (self.isJunction() or self.isSymlink()) and len(data) >= 8:
+				subOffset, subLength, printOffset, printLength=struct.unpack('<HHHH', data[0:8])
+				flags=0
+				pathStart=8
+				if self.isSymlink() and len(data) >= 12:
+					flags=struct.unpack('<L', data[8:12])[0]
+					pathStart=12
+				path=data[pathStart:]
+				self._names=(path[subOffset:subOffset+subLength].decode('utf-16-le', errors='ignore'),
+					path[printOffset:printOffset+printLength].decode('utf-16-le', errors='ignore'),
+					flags)
+		return self._names
+
+	def substituteName(self):
+		'''Target used by the system e.g. \\??\\C:\\Users'''
+		return self._decodeNames()[0]
+
+	def printName(self):
+		return self._decodeNames()[1]
+
+	def isRelative(self):
+		'''True for a symbolic link with a relative target.'''
+		return self.isSymlink() and (self._decodeNames()[2] & 0x01) != 0
+
+	def target(self):
+		'''Best readable target of a junction or link.'''
+		return self.printName() or self.substituteName()
+
+	def wofProvider(self):
+		'''WOF_PROVIDER_WIM or WOF_PROVIDER_FILE for WOF
+		compressed files, None otherwise.'''
+		data=self.reparseData()
+		if not self.isWof() or len(data) < 8:
+			return None
+		return struct.unpack('<L', data[4:8])[0]
+
+	def wofAlgorithm(self):
+		'''Compression algorithm number of a file provider
+		WOF file or None.'''
+		data=self.reparseData()
+		if self.wofProvider()!=WOF_PROVIDER_FILE or len(data) < 16:
+			return None
+		return struct.unpack('<L', data[12:16])[0]
+
+	def details(self):
+		'''Short description of the reparse data.'''
+		if self.isJunction() or self.isSymlink():
+			retStr=self.target()
+			if self.isRelative():
+				retStr+=' (relative)'
+			return retStr
+		if self.isWof():
+			if self.wofProvider()==WOF_PROVIDER_FILE:
+				return 'file provider ' + WOF_ALGORITHMS.get(self.wofAlgorithm(), str(self.wofAlgorithm()))
+			if self.wofProvider()==WOF_PROVIDER_WIM:
+				return 'WIM provider'
+			return 'provider ' + str(self.wofProvider())
+		return str(len(self.reparseData())) + ' bytes'
+
+	def __str__(self):
+		retStr=Attribute.__str__(self)
+		retStr+='\nReparse tag: ' + '%08X' % self.tag() + ' ' + self.tagName()
+		retStr+='\nReparse data: ' + self.details()
+		return retStr
+
 def getAttribute(buffer, offset=0):
 	'''create a MFT attribute from
 	a buffer and offset.  Will create
@@ -1070,24 +1275,126 @@ def getAttribute(buffer, offset=0):
 		attr=IndexAllocation(buffer, offset)
 	elif attr.attributeType() == 0xB0:
 		attr=Bitmap(buffer, offset)
+	elif attr.attributeType() == 0xC0:
+		attr=ReparsePoint(buffer, offset)
 	return attr				
 
+# results of fixupStatus()
+FIXUP_OK='ok'
+FIXUP_TORN='torn'
+FIXUP_BAD_MAGIC='bad magic'
+FIXUP_BAAD='BAAD'
+FIXUP_EMPTY='empty'
+
+def fixupStatus(buffer, offset=0, recordSize=1024):
+	'''Checks a record before the fixup is applied.
+	Returns FIXUP_OK, FIXUP_TORN if a sector does not end
+	with the update sequence number (a write was torn),
+	FIXUP_BAAD if chkdsk marked the record bad, FIXUP_EMPTY
+	for a record of zeros or FIXUP_BAD_MAGIC.'''
+	magic=buffer[offset:offset+4]
+	if magic==b'FILE':
+		usaOffset, usaSize=struct.unpack_from('<HH', buffer, offset+4)
+		if usaSize==0 or usaOffset+2*usaSize > 512 or (usaSize-1)*512 > recordSize:
+			return FIXUP_TORN
+		usn=buffer[offset+usaOffset:offset+usaOffset+2]
+		for i in range(usaSize-1):
+			if buffer[offset+512*i+510:offset+512*i+512]!=usn:
+				return FIXUP_TORN
+		return FIXUP_OK
+	if magic==b'BAAD':
+		return FIXUP_BAAD
+	if magic==b'\x00\x00\x00\x00':
+		return FIXUP_EMPTY
+	return FIXUP_BAD_MAGIC
+
+def applyFixup(buffer, offset=0, recordSize=1024):
+	'''Returns a copy of the record at offset with the
+	update sequence array values put back at the end of
+	each sector.'''
+	usaOffset, usaSize=struct.unpack_from('<HH', buffer, offset+4)
+	data=bytearray(buffer[offset:offset+recordSize])
+	for i in range(min(usaSize-1, recordSize // 512)):
+		pos=usaOffset+2*i+2
+		data[512*i+510:512*i+512]=data[pos:pos+2]
+	return bytes(data)
+
+# attribute types that can turn up in record slack
+SLACK_TYPES=(0x10, 0x20, 0x30, 0x40, 0x50, 0x60, 0x70, 0x80,
+	0x90, 0xA0, 0xB0, 0xC0, 0xD0, 0xE0, 0xF0, 0x100)
+
+def attributeHeaderOk(buffer, pos, end):
+	'''Sanity checks an attribute header found at pos in
+	record slack.  Everything the header points to must
+	lie between pos and end.'''
+	if pos + 24 > end:
+		return False
+	attrType, length, nonResident, nameLength, nameOffset=struct.unpack_from('<LLBBH', buffer, pos)
+	if attrType not in SLACK_TYPES or nonResident > 1:
+		return False
+	if length < 24 or length % 8 or pos + length > end:
+		return False
+	headerSize=64 if nonResident else 24
+	if length < headerSize:
+		return False
+	if nameLength and (nameOffset < headerSize or nameOffset + 2*nameLength > length):
+		return False
+	if nonResident:
+		firstVcn, lastVcn, runOffset=struct.unpack_from('<QQH', buffer, pos+16)
+		physical, logical, initialized=struct.unpack_from('<QQQ', buffer, pos+40)
+		if runOffset < headerSize or runOffset >= length or lastVcn < firstVcn:
+			return False
+		return initialized <= logical <= physical
+	valueLength, valueOffset=struct.unpack_from('<LH', buffer, pos+16)
+	if valueOffset < 24 or valueOffset + valueLength > length:
+		return False
+	if attrType==0x10:
+		return valueLength in (48, 72)
+	if attrType==0x30:
+		# fixed part plus a name of at least one character
+		if valueLength < 68:
+			return False
+		return 66 + 2*buffer[pos+valueOffset+64] <= valueLength
+	return True
+
+def slackAttributes(buffer, offset=0):
+	'''Generator that yields (offset, attribute) for
+	attributes left in the slack of a record after the
+	end marker, decoded with the usual classes.  The
+	slack is searched on 8 byte boundaries up to the
+	physical record size.'''
+	header=MftHeader(buffer[offset:offset+1024])
+	if not header.isValid():
+		return
+	recordSize=header.physicalRecordSize() or 1024
+	data=applyFixup(buffer, offset, recordSize)
+	end=min(recordSize, len(data))
+	pos=(header.logicalRecordSize() + 7) & ~7
+	while pos + 24 <= end:
+		if attributeHeaderOk(data, pos, end):
+			try:
+				attr=getAttribute(data, pos)
+			except (struct.error, IndexError, ValueError):
+				attr=None
+			if attr:
+				yield (pos, attr)
+				pos+=attr.totalLength()
+				continue
+		pos+=8
+
 class MftEntry:
 	'''This class represents an MFT entry.
 	It is normally created by passing in
 	a 1024 byte buffer with the data stream.'''
 	def __init__(self, buffer, offset=0):
-		self._mftHeader=MftHeader(buffer)
-		pos = self._mftHeader.attributeStart()
+		self._mftHeader=MftHeader(buffer[offset:offset+1024])
 		self._attrList=[]
+		# torn records are still parsed but can be spotted
+		self._fixupStatus=fixupStatus(buffer, offset)
 		if self._mftHeader.isValid():
+			pos = self._mftHeader.attributeStart()
 			# apply the fixup at the end of sectors
-			data=buffer[offset:offset+1024]
-			for i in range(self._mftHeader.updateSequenceSize()-1):
-				data=(data[:512*i+510] +
-					buffer[offset+self._mftHeader.updateSequenceOffset()+2*i+2:
-					offset+self._mftHeader.updateSequenceOffset()+2*i+4] +
-					data[512*i+512:])
+			data=applyFixup(buffer, offset)
 			# get attributes		
 			while pos < self._mftHeader.logicalRecordSize():
 				attr=getAttribute(data, pos)
@@ -1096,6 +1403,17 @@ class MftEntry:
 				self._attrList.append(attr)
 				pos+=attr.totalLength()
 			
+	def isValid(self):
+		return self._mftHeader.isValid()
+		
+	def fixupStatus(self):
+		'''FIXUP_OK, FIXUP_TORN, FIXUP_BAAD, FIXUP_EMPTY
+		or FIXUP_BAD_MAGIC.'''
+		return self._fixupStatus
+		
+	def isTorn(self):
+		return self._fixupStatus==FIXUP_TORN
+		
 	def numberOfAttributes(self):
 		return len(self._attrList)
 		
@@ -1112,6 +1430,25 @@ class MftEntry:
 				retList.append(attr)
 		return retList
 		
+	def isReparsePoint(self):
+		'''True if the $10 attribute has the reparse point
+		flag set.'''
+		for attr in self._attrList:
+			if attr.attributeType()==0x10:
+				return attr.isReparsePoint()
+		return False
+		
+	def reparsePoint(self):
+		'''The $C0 attribute of an entry flagged as a reparse
+		point or None.  The flag is checked first so the
+		reparse data of other entries is never looked at.'''
+		if not self.isReparsePoint():
+			return None
+		for attr in self._attrList:
+			if attr.attributeType()==0xC0:
+				return attr
+		return None
+		
 	def __str__(self):
 		retStr=self._mftHeader.__str__()
 		for attr in self._attrList:
@@ -1135,7 +1472,7 @@ class MftEntry:
 		return self._mftHeader.sequenceNumber()
 		
 	def hardLinkCount(self):
-		return self._mftHeader.hardLinkCount
+		return self._mftHeader.hardLinkCount()
 		
 	def attributeStart(self):
 		return self._mftHeader.attributeStart()
@@ -1170,22 +1507,57 @@ class MftEntry:
 	def recordNumber(self):
 		return self._mftHeader.recordNumber()
 		
+def scanEntries(filename, offset, mftFile, expression):
+	'''Prints every MFT entry matching a filter
+	expression.  The whole MFT is read in bulk and
+	most records are rejected from the raw header.'''
+	# imported here as these modules import this one
+	from mftreader import MftReader
+	from paths import PathResolver
+	from where import Where, Record
+	try:
+		where=Where(expression)
+	except ValueError as e:
+		print(e)
+		return -1
+	if mftFile:
+		reader=MftReader(mftFilename=mftFile)
+	else:
+		with open(filename, 'rb') as f:
+			f.seek(offset)
+			vbr=Vbr(f.read(512))
+		reader=MftReader(imageFilename=filename, vbr=vbr)
+	resolver=PathResolver.fromReader(reader) if where.needsPaths() else None
+	for number, buffer in reader.buffers():
+		record=Record(number, buffer, resolver=resolver)
+		if where.matches(record):
+			print(record.entry())
+			print()
+
 def main():
 	parser=optparse.OptionParser()
 	parser.add_option("-f", "--file", dest="filename",
 					help="image filename")
 	parser.add_option("-o", "--offset", dest='offset',
 					help='offset in sectors to start of volume')
+	addPartitionOption(parser)
 					
 	parser.add_option("-e", "--entry", dest='entry',
 					help='MFT entry number')
+	parser.add_option('-m', '--mft', dest='mftFile',
+					help='MFT file (used with --where)')
+	parser.add_option('-w', '--where', dest='where',
+					help='print every entry matching this filter (see where.py)')
 					
 	(options, args)=parser.parse_args()
 	filename=options.filename
-	if options.offset:
-		offset=512 * int(options.offset)
-	else:
-		offset=0
+	try:
+		offset=volumeOffset(filename, options.offset, options.partition)
+	except ValueError as e:
+		print(e)
+		return -1
+	if options.where:
+		return scanEntries(filename, offset, options.mftFile, options.where)
 	if options.entry:
 		entry=int(options.entry)
 	else:
@@ -0,0 +1,219 @@
+#!/usr/bin/python3
+
+'''Bulk reader for MFT records.  Records can be
+read from an exported $MFT file or straight from
+an image, in which case the data runs of MFT
+entry 0 are followed so a fragmented MFT is
+handled correctly.  Records are read many at a
+time to keep the number of seeks down.  When the
+volume is available the first records (the system
+files) are checked and replaced by their copies in
+$MFTMirr if they are damaged.
+Created by Dr. Phil Polstra
+for PentesterAcademy.com'''
+
+__all__=['MftReader']
+
+from mft import MftEntry, fixupStatus, FIXUP_OK
+from stream import getStreams
+
+# $MFTMirr holds copies of $MFT, $MFTMirr, $LogFile and $Volume
+MIRROR_RECORDS=4
+
+class MftReader:
+	'''Reads MFT records from an exported $MFT file
+	(mftFilename) or from an image file with a Vbr
+	object describing the volume.  If both are given
+	the records come from the file and the image is
+	only used for $MFTMirr.'''
+	def __init__(self, mftFilename=None, imageFilename=None, vbr=None,
+					recordSize=1024, recordsPerRead=1024, useMirror=True):
+		self._mftFilename=mftFilename
+		self._imageFilename=imageFilename
+		self._vbr=vbr
+		self._recordSize=recordSize
+		self._recordsPerRead=recordsPerRead
+		self._useMirror=useMirror and imageFilename!=None and vbr!=None
+		self._mirror=None
+		self._substituted=set()
+		# list of (first record, record count, file offset)
+		self._extents=[]
+		if mftFilename:
+			with open(mftFilename, 'rb') as f:
+				f.seek(0, 2)
+				size=f.tell()
+			self._extents.append((0, size // recordSize, 0))
+			self._filename=mftFilename
+		else:
+			self._filename=imageFilename
+			self._extentsFromImage()
+
+	def _extentsFromImage(self):
+		'''Read MFT entry 0 and use its data runs
+		to find every piece of the MFT.'''
+		vbr=self._vbr
+		bpc=vbr.bytesPerCluster()
+		with open(self._imageFilename, 'rb') as f:
+			f.seek(vbr.clusterOffset(vbr.mftLcn()))
+			buffer=f.read(self._recordSize)
+		entry=MftEntry(self._checked(0, buffer))
+		# until the runs are known only the first extent can be read
+		self._extents=[(0, bpc // self._recordSize or 1, vbr.clusterOffset(vbr.mftLcn()))]
+		if not entry.isValid():
+			return
+		streams=getStreams(entry, self.entry)
+		if '' not in streams:
+			return
+		mftStream=streams['']
+		self._extents=[]
+		for vcn, lcn, count in mftStream.extents():
+			if lcn is None:
+				continue
+			self._extents.append((vcn * bpc // self._recordSize,
+					count * bpc // self._recordSize,
+					vbr.clusterOffset(lcn)))
+		# never report records past the end of $MFT
+		last=mftStream.logicalSize() // self._recordSize
+		trimmed=[]
+		for first, count, offset in self._extents:
+			if first >= last:
+				break
+			trimmed.append((first, min(count, last - first), offset))
+		self._extents=trimmed
+
+	def filename(self):
+		return self._filename
+
+	def recordSize(self):
+		return self._recordSize
+
+	def extents(self):
+		'''List of (first record, count, file offset) tuples.'''
+		return self._extents
+
+	def numberOfRecords(self):
+		total=0
+		for first, count, offset in self._extents:
+			total=max(total, first + count)
+		return total
+
+	def recordOffset(self, number):
+		'''Returns offset of a record in the file being read
+		or None if the record is not in the MFT.'''
+		for first, count, offset in self._extents:
+			if first <= number < first + count:
+				return offset + (number - first) * self._recordSize
+		return None
+
+	def mirrorOffset(self):
+		'''Offset of $MFTMirr in the image or None.'''
+		if self._imageFilename==None or self._vbr==None:
+			return None
+		return self._vbr.clusterOffset(self._vbr.mftMirrLcn())
+
+	def readMirror(self, count=MIRROR_RECORDS):
+		'''Returns the records in $MFTMirr with one read.'''
+		offset=self.mirrorOffset()
+		if offset==None:
+			return None
+		with open(self._imageFilename, 'rb') as f:
+			f.seek(offset)
+			return f.read(count * self._recordSize)
+
+	def readPrimary(self, count=MIRROR_RECORDS):
+		'''Returns the first records of $MFT, with one read
+		if they are contiguous, without the mirror check.'''
+		retList=[]
+		with open(self._filename, 'rb') as f:
+			number=0
+			while number < count:
+				offset=self.recordOffset(number)
+				if offset==None:
+					break
+				# records left in this extent
+				for first, extentCount, extentOffset in self._extents:
+					if first <= number < first + extentCount:
+						n=min(count - number, first + extentCount - number)
+				f.seek(offset)
+				retList.append(f.read(n * self._recordSize))
+				number+=n
+		return b''.join(retList)
+
+	def _mirrorRecord(self, number):
+		if self._mirror==None:
+			self._mirror=self.readMirror() or b''
+		start=number * self._recordSize
+		buffer=self._mirror[start:start + self._recordSize]
+		return buffer if len(buffer)==self._recordSize else None
+
+	def _checked(self, number, buffer):
+		'''Returns the $MFTMirr copy of a system record if
+		the primary copy fails the magic or fixup checks
+		and the copy does not.'''
+		if (not self._useMirror or number >= MIRROR_RECORDS or
+				fixupStatus(buffer, 0, self._recordSize)==FIXUP_OK):
+			return buffer
+		mirror=self._mirrorRecord(number)
+		if mirror and fixupStatus(mirror, 0, self._recordSize)==FIXUP_OK:
+			self._substituted.add(number)
+			return mirror
+		return buffer
+
+	def substitutions(self):
+		'''Record numbers that were read from $MFTMirr.'''
+		return sorted(self._substituted)
+
+	def readRecord(self, number):
+		offset=self.recordOffset(number)
+		if offset==None:
+			return None
+		with open(self._filename, 'rb') as f:
+			f.seek(offset)
+			return self._checked(number, f.read(self._recordSize))
+
+	def entry(self, number):
+		'''Returns an MftEntry for a single record
+		or None if it cannot be read.'''
+		buffer=self.readRecord(number)
+		if not buffer or len(buffer) < self._recordSize:
+			return None
+		return MftEntry(buffer)
+
+	def buffers(self, start=0, end=None):
+		'''Generator that yields (record number, buffer)
+		for each record.  Records are read in large
+		chunks in on-disk order.'''
+		if end==None:
+			end=self.numberOfRecords()
+		with open(self._filename, 'rb') as f:
+			for first, count, offset in sorted(self._extents, key=lambda e: e[2]):
+				lo=max(start, first)
+				hi=min(end, first + count)
+				number=lo
+				f.seek(offset + (lo - first) * self._recordSize)
+				while number < hi:
+					n=min(self._recordsPerRead, hi - number)
+					chunk=f.read(n * self._recordSize)
+					if not chunk:
+						break
+					for i in range(len(chunk) // self._recordSize):
+						buffer=chunk[i * self._recordSize:(i + 1) * self._recordSize]
+						if number + i < MIRROR_RECORDS:
+							buffer=self._checked(number + i, buffer)
+						yield (number + i, buffer)
+					number+=n
+
+	def records(self, start=0, end=None):
+		'''Generator that yields (record number, fixup
+		status, buffer) for each record.'''
+		size=self._recordSize
+		for number, buffer in self.buffers(start, end):
+			yield (number, fixupStatus(buffer, 0, size), buffer)
+
+	def entries(self, start=0, end=None):
+		'''Generator that yields (record number, MftEntry)
+		for every valid record.'''
+		for number, buffer in self.buffers(start, end):
+			entry=MftEntry(buffer)
+			if entry.isValid():
+				yield (number, entry)
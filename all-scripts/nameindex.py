@@ -0,0 +1,239 @@
+#!/usr/bin/python3
+
+'''Persistent filename index for an NTFS volume.
+The MFT is parsed once and the name, lowercase name,
+extension, parent, flags, size and full path of
+every file are stored in an SQLite database.  Later
+searches are answered from the database.  When
+SQLite has FTS5 the lowercase names and paths are
+also put in a trigram full text index so substring
+searches such as *password* do not scan the table.
+
+Index files are named after a fingerprint of the
+volume (its size, offset, boot sector and first
+MFT record) and are rebuilt automatically if the
+size or modification time of the source changes.
+Created by Dr. Phil Polstra
+for PentesterAcademy.com'''
+
+__all__=['NameIndex', 'openIndex', 'sourceKey']
+
+import os
+import re
+import sqlite3
+import hashlib
+import optparse
+import time
+from vbr import Vbr
+from volumes import volumeOffset, addPartitionOption
+from mftreader import MftReader
+from paths import PathResolver
+from where import Record
+
+INDEX_VERSION='1'
+DEFAULT_INDEX_DIR=os.path.join('~', '.cache', 'ntfs-index')
+
+def sourceKey(imageFilename=None, offset=0, mftFilename=None):
+	'''Fingerprint of a volume or MFT file.  Hashing a
+	whole image would take as long as parsing it so
+	only the size, offset and first metadata sectors
+	are used.'''
+	sha=hashlib.sha1()
+	if mftFilename:
+		sha.update(b'mft:')
+		sha.update(str(os.path.getsize(mftFilename)).encode())
+		with open(mftFilename, 'rb') as f:
+			sha.update(f.read(1024))
+	else:
+		sha.update(b'image:')
+		sha.update(('%d:%d' % (os.path.getsize(imageFilename), offset)).encode())
+		with open(imageFilename, 'rb') as f:
+			f.seek(offset)
+			buffer=f.read(512)
+			sha.update(buffer)
+			vbr=Vbr(buffer)
+			f.seek(offset + vbr.mftLcn() * vbr.bytesPerCluster())
+			sha.update(f.read(1024))
+	return sha.hexdigest()
+
+class NameIndex:
+	'''An index database.  Use openIndex() to get one
+	that is known to match its source.'''
+	def __init__(self, dbFilename):
+		self._db=sqlite3.connect(dbFilename)
+		self._db.execute('CREATE TABLE IF NOT EXISTS meta(key TEXT PRIMARY KEY, value TEXT)')
+
+	def close(self):
+		self._db.close()
+
+	def meta(self, key):
+		row=self._db.execute('SELECT value FROM meta WHERE key=?', (key,)).fetchone()
+		return row[0] if row else None
+
+	def hasFts(self):
+		return self.meta('fts')=='1'
+
+	def isCurrent(self, source):
+		'''True if the index was built from source and the
+		file has not changed since.'''
+		st=os.stat(source)
+		return (self.meta('version')==INDEX_VERSION and
+			self.meta('size')==str(st.st_size) and
+			self.meta('mtime')==str(st.st_mtime_ns))
+
+	def build(self, reader, source, offset=0):
+		'''(Re)builds the index with one pass of an
+		MftReader.  Names and parents are collected while
+		the paths are resolved, then written in a single
+		transaction.'''
+		db=self._db
+		db.execute('DROP TABLE IF EXISTS names')
+		db.execute('DROP TABLE IF EXISTS entries')
+		db.execute('DELETE FROM meta')
+		db.execute('CREATE TABLE entries(entry INTEGER PRIMARY KEY, seq INTEGER, '
+			'parent INTEGER, flags INTEGER, size INTEGER, name TEXT, lname TEXT, '
+			'ext TEXT, path TEXT)')
+		resolver=PathResolver()
+		rows=[]
+		for number, buffer in reader.buffers():
+			record=Record(number, buffer)
+			if not record.isValid():
+				continue
+			mftEntry=record.entry()
+			resolver.addEntry(number, mftEntry)
+			fnameAttr=record.filename()
+			if mftEntry.baseFileMft()!=0 or fnameAttr==None:
+				continue
+			name=fnameAttr.filename()
+			dot=name.rfind('.')
+			rows.append((number, mftEntry.sequenceNumber(), fnameAttr.parentMft(),
+				record.headerFlags(), record.size(), name, name.lower(),
+				name[dot+1:].lower() if dot > 0 else ''))
+		db.executemany('INSERT INTO entries VALUES(?,?,?,?,?,?,?,?,?)',
+			[row + (resolver.path(row[0]),) for row in rows])
+		db.execute('CREATE INDEX entries_ext ON entries(ext)')
+		db.execute('CREATE INDEX entries_lname ON entries(lname)')
+		fts='0'
+		try:
+			db.execute("CREATE VIRTUAL TABLE names USING fts5(lname, path, "
+				"content='entries', content_rowid='entry', tokenize='trigram')")
+			db.execute("INSERT INTO names(names) VALUES('rebuild')")
+			fts='1'
+		except sqlite3.OperationalError:
+			# no FTS5 or no trigram tokenizer, plain GLOB still works
+			pass
+		st=os.stat(source)
+		db.executemany('INSERT INTO meta VALUES(?,?)', [('version', INDEX_VERSION),
+			('source', os.path.abspath(source)), ('offset', str(offset)),
+			('size', str(st.st_size)), ('mtime', str(st.st_mtime_ns)),
+			('fts', fts), ('built', time.strftime('%Y-%m-%d %H:%M:%S'))])
+		db.commit()
+		return len(rows)
+
+	def search(self, pattern=None, extension=None, deleted=True, directories=True):
+		'''Returns a list of (entry, seq, flags, size, path)
+		tuples.  pattern is a case insensitive glob that is
+		matched against the name, or the full path if it
+		contains a slash.'''
+		clauses=[]
+		params=[]
+		table='entries'
+		if pattern:
+			pattern=pattern.lower()
+			column='lower(path)' if '/' in pattern else 'lname'
+			# *.ext is answered from the extension index, which
+			# only holds the text after the last dot
+			match=re.match(r'^\*\.([^*?\[\].]+)$', pattern)
+			if match and '/' not in pattern and not extension:
+				extension=match.group(1)
+			elif self.hasFts() and '/' not in pattern:
+				table='names JOIN entries ON entries.entry=names.rowid'
+				clauses.append('names.lname GLOB ?')
+				params.append(pattern)
+			else:
+				clauses.append(column + ' GLOB ?')
+				params.append(pattern)
+		if extension:
+			extension=extension.lower().lstrip('.')
+			if '.' in extension:
+				# tar.gz: the index narrows it to gz, the name does the rest
+				clauses.append('entries.lname GLOB ?')
+				params.append('*.' + extension)
+				extension=extension.rsplit('.', 1)[1]
+			clauses.append('entries.ext=?')
+			params.append(extension)
+		if not deleted:
+			clauses.append('(entries.flags & 1)=1')
+		if not directories:
+			clauses.append('(entries.flags & 2)=0')
+		sql=('SELECT entries.entry, entries.seq, entries.flags, entries.size, '
+			'entries.path FROM ' + table)
+		if clauses:
+			sql+=' WHERE ' + ' AND '.join(clauses)
+		sql+=' ORDER BY entries.entry'
+		return self._db.execute(sql, params).fetchall()
+
+def openIndex(imageFilename=None, offset=0, mftFilename=None, indexDir=None,
+				rebuild=False, verbose=False):
+	'''Returns a NameIndex for a volume, building it
+	first if there is none or the source has changed.'''
+	indexDir=os.path.expanduser(indexDir or DEFAULT_INDEX_DIR)
+	if not os.path.isdir(indexDir):
+		os.makedirs(indexDir)
+	source=mftFilename or imageFilename
+	key=sourceKey(imageFilename, offset, mftFilename)
+	index=NameIndex(os.path.join(indexDir, key + '.sqlite'))
+	if rebuild or not index.isCurrent(source):
+		if verbose:
+			print('Building index for', source)
+		if mftFilename:
+			reader=MftReader(mftFilename=mftFilename)
+		else:
+			with open(imageFilename, 'rb') as f:
+				f.seek(offset)
+				vbr=Vbr(f.read(512))
+			reader=MftReader(imageFilename=imageFilename, vbr=vbr)
+		count=index.build(reader, source, offset)
+		if verbose:
+			print('Indexed', count, 'entries')
+	return index
+
+def main():
+	parser=optparse.OptionParser('usage %prog [options] [pattern...]')
+	parser.add_option('-f', '--file', dest='filename',
+					help='image filename')
+	parser.add_option('-o', '--offset', dest='offset',
+					help='offset in sectors to start of volume')
+	addPartitionOption(parser)
+	parser.add_option('-m', '--mft', dest='mftFile',
+					help='MFT file')
+	parser.add_option('-i', '--index-dir', dest='indexDir',
+					help='directory holding index files (default ~/.cache/ntfs-index)')
+	parser.add_option('-x', '--ext', dest='extension',
+					help='only files with this extension')
+	parser.add_option('-D', '--deleted', dest='deleted', action='store_true',
+					help='include entries that are not in use')
+	parser.add_option('-F', '--files', dest='files', action='store_true',
+					help='leave out directories')
+	parser.add_option('-r', '--rebuild', dest='rebuild', action='store_true',
+					help='rebuild the index even if it is current')
+	(options, args)=parser.parse_args()
+	if not options.filename and not options.mftFile:
+		parser.print_help()
+		return -1
+	try:
+		offset=volumeOffset(options.filename, options.offset, options.partition)
+	except ValueError as e:
+		print(e)
+		return -1
+	index=openIndex(options.filename, offset, options.mftFile, options.indexDir,
+		options.rebuild, True)
+	print('MftEntry;UpdateSequence;InUse;Directory;FileSize;Path')
+	for pattern in (args or [None]):
+		for entry, seq, flags, size, path in index.search(pattern, options.extension,
+				options.deleted, not options.files):
+			print(entry, seq, (flags & 1)!=0, (flags & 2)!=0, size, '"'+path+'"', sep=';')
+	index.close()
+
+if __name__=='__main__':
+	main()
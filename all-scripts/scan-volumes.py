@@ -0,0 +1,288 @@
+#!/usr/bin/python3
+'''Simple script to find NTFS and FAT volumes on a disk
+image whose MBR or GPT has been wiped or damaged.  The
+image is read through large mmap windows, split among
+a pool of processes, looking for boot sectors (and the
+NTFS backup boot sector in the last sector of a volume,
+or the FAT32 copy in sector 6).  Every candidate has
+its geometry checked: the sector and cluster sizes,
+total sectors and where $MFT or the first FAT should
+be.  A volume whose first sector was destroyed is
+found from its backup boot sector.
+
+The result is printed as a partition table.  With -w a
+MBR holding it is written to a file, never to the
+image, so it can be checked before being put back.
+Create by Dr. Phil Polstra (@ppolstra)
+for PentesterAcademy.com.'''
+
+import optparse
+import os
+import sys
+import mmap
+import struct
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from vbr import Vbr
+from volumes import openVolumeSystem, filesystemType, MBR_TYPES, SECTOR_SIZE
+
+# bytes mapped at a time, a multiple of the mmap granularity
+WINDOW_SIZE=64 * 1048576
+# (string, offset in the boot sector) the scan looks for
+SIGNATURES=[(b'NTFS    ', 3), (b'FAT32   ', 82), (b'FAT12   ', 54),
+            (b'FAT16   ', 54), (b'FAT     ', 54)]
+SECTOR_SIZES=(512, 1024, 2048, 4096)
+MBR_CODES={'NTFS':0x07, 'FAT32':0x0C, 'FAT16':0x0E, 'FAT12':0x01, 'FAT':0x0E}
+
+def scanRange(imageFilename, start, end):
+   '''Returns (offset, sector) for every sector from start
+   up to end that might be a NTFS or FAT boot sector.'''
+   found={}
+   with open(imageFilename, 'rb') as f:
+      end=min(end, os.fstat(f.fileno()).st_size)
+      pos=start
+      while pos < end:
+         length=min(WINDOW_SIZE, end - pos)
+         with mmap.mmap(f.fileno(), length, offset=pos, access=mmap.ACCESS_READ) as window:
+            for pattern, fieldOffset in SIGNATURES:
+               i=window.find(pattern)
+               while i!=-1:
+                  sectorStart=i - fieldOffset
+                  if (sectorStart >= 0 and sectorStart % SECTOR_SIZE==0 and
+                        sectorStart + SECTOR_SIZE <= length):
+                     sector=window[sectorStart:sectorStart+SECTOR_SIZE]
+                     if filesystemType(sector):
+                        found[pos + sectorStart]=sector
+                  i=window.find(pattern, i + 1)
+         pos+=length
+   return sorted(found.items())
+
+def scanImage(imageFilename, processes=None):
+   '''Scans the whole image, in parallel if it is bigger
+   than one window.'''
+   size=os.path.getsize(imageFilename)
+   if size <= WINDOW_SIZE:
+      return scanRange(imageFilename, 0, size)
+   workers=processes or os.cpu_count() or 1
+   # a few pieces per process keeps them all busy to the end
+   pieces=workers * 4
+   pieceSize=max(WINDOW_SIZE, -(-size // pieces // WINDOW_SIZE) * WINDOW_SIZE)
+   found=[]
+   done=0
+   with ProcessPoolExecutor(max_workers=workers) as pool:
+      jobs=[pool.submit(scanRange, imageFilename, start, start + pieceSize)
+            for start in range(0, size, pieceSize)]
+      for job in as_completed(jobs):
+         found+=job.result()
+         done+=1
+         sys.stderr.write('\rScanned %d of %d parts' % (done, len(jobs)))
+         sys.stderr.flush()
+   sys.stderr.write('\n')
+   return sorted(found)
+
+class FoundVolume:
+   '''A volume rebuilt from one or more boot sectors.'''
+   def __init__(self, start, size, filesystem, serial, label, evidence):
+      self.start=start
+      self.size=size
+      self.filesystem=filesystem
+      self.serial=serial
+      self.label=label
+      self.evidence=evidence
+
+   def end(self):
+      return self.start + self.size
+
+   def startSector(self):
+      return self.start // SECTOR_SIZE
+
+   def sectors(self):
+      return self.size // SECTOR_SIZE
+
+def readAt(fd, offset, size):
+   if offset < 0:
+      return b''
+   return os.pread(fd, size, offset)
+
+def ntfsGeometry(sector):
+   '''(bytes/sector, bytes/cluster, total sectors) of a
+   NTFS boot sector or None if they do not make sense.'''
+   vbr=Vbr(sector)
+   bytesPerSector=vbr.bytesPerSector()
+   sectorsPerCluster=vbr.sectorsPerCluster()
+   # large clusters are stored as a negative power of two
+   if sectorsPerCluster > 0x80:
+      sectorsPerCluster=1 << (256 - sectorsPerCluster)
+   if (bytesPerSector not in SECTOR_SIZES or sectorsPerCluster==0 or
+         sectorsPerCluster & (sectorsPerCluster - 1)):
+      return None
+   totalSectors=vbr.totalSectors()
+   clusters=totalSectors // sectorsPerCluster
+   if clusters==0 or vbr.mftLcn() >= clusters or vbr.mftMirrLcn() >= clusters:
+      return None
+   return (bytesPerSector, bytesPerSector * sectorsPerCluster, totalSectors)
+
+def ntfsVolumes(sectors, fd):
+   '''Volumes from the NTFS boot sectors found.  A sector
+   is a primary if its backup or $MFT is where it says,
+   otherwise it may be the backup of a wiped primary.'''
+   volumes=[]
+   for offset, sector in sorted(sectors.items()):
+      geometry=ntfsGeometry(sector)
+      if geometry==None:
+         continue
+      bytesPerSector, bytesPerCluster, totalSectors=geometry
+      vbr=Vbr(sector)
+      serial=vbr.volumeSerialNumber()
+      span=totalSectors * bytesPerSector
+      other=sectors.get(offset - span)
+      if other and Vbr(other).volumeSerialNumber()==serial:
+         # the backup of a primary that was found
+         continue
+      mftOffset=vbr.mftLcn() * bytesPerCluster
+      start=offset
+      evidence=['boot sector']
+      other=sectors.get(offset + span)
+      if other and Vbr(other).volumeSerialNumber()==serial:
+         evidence.append('backup boot sector')
+      if readAt(fd, offset + mftOffset, 4)==b'FILE':
+         evidence.append('$MFT')
+      elif len(evidence)==1 and readAt(fd, offset - span + mftOffset, 4)==b'FILE':
+         start=offset - span
+         evidence=['backup boot sector only', '$MFT']
+      if vbr.hiddenSectors()==start // SECTOR_SIZE:
+         evidence.append('hidden sectors')
+      volumes.append(FoundVolume(start, span + bytesPerSector, 'NTFS',
+                                 serial[::-1].hex().upper(), '', evidence))
+   return volumes
+
+def fatGeometry(sector):
+   '''Dictionary of the BPB fields of a FAT boot sector
+   or None if they do not make sense.  These are the
+   fields the FAT Vbr class of chapter 6 reads.'''
+   (bytesPerSector, sectorsPerCluster, reserved, fats, rootEntries, totalSectors16,
+      media, fatSize16)=struct.unpack_from('<HBHBHHBH', sector, 11)
+   totalSectors32=struct.unpack_from('<L', sector, 32)[0]
+   fatSize32, flags, version, rootCluster, fsInfo, backupBoot=struct.unpack_from(
+      '<LHHLHH', sector, 36)
+   filesystem=filesystemType(sector)
+   fat32=(filesystem=='FAT32')
+   totalSectors=totalSectors16 or totalSectors32
+   fatSize=fatSize32 if fat32 else fatSize16
+   if (bytesPerSector not in SECTOR_SIZES or sectorsPerCluster==0 or
+         sectorsPerCluster & (sectorsPerCluster - 1) or reserved==0 or
+         fats not in (1, 2) or media < 0xF0 or fatSize==0 or
+         reserved + fats * fatSize >= totalSectors):
+      return None
+   # volume ID and label follow the extended BPB
+   ebpb=64 if fat32 else 36
+   return {'filesystem':filesystem, 'bytesPerSector':bytesPerSector, 'reserved':reserved,
+           'media':media, 'totalSectors':totalSectors,
+           'backupBoot':backupBoot if fat32 else 0,
+           'serial':'%08X' % struct.unpack_from('<L', sector, ebpb + 3)[0],
+           'label':sector[ebpb+7:ebpb+18].decode('ascii', 'replace').strip()}
+
+def fatVolumes(sectors, fd):
+   '''Volumes from the FAT boot sectors found.  The first
+   FAT must start with the media descriptor.'''
+   volumes=[]
+   for offset, sector in sorted(sectors.items()):
+      geometry=fatGeometry(sector)
+      if geometry==None:
+         continue
+      bytesPerSector=geometry['bytesPerSector']
+      backup=geometry['backupBoot'] * bytesPerSector
+      other=sectors.get(offset - backup) if backup else None
+      if other and fatGeometry(other) and fatGeometry(other)['serial']==geometry['serial']:
+         # the FAT32 copy of a boot sector that was found
+         continue
+      fatOffset=geometry['reserved'] * bytesPerSector
+      start=offset
+      evidence=['boot sector']
+      if backup and offset + backup in sectors:
+         evidence.append('backup boot sector')
+      if readAt(fd, offset + fatOffset, 1)==bytes([geometry['media']]):
+         evidence.append('FAT')
+      elif backup and readAt(fd, offset - backup + fatOffset, 1)==bytes([geometry['media']]):
+         start=offset - backup
+         evidence=['backup boot sector only', 'FAT']
+      volumes.append(FoundVolume(start, geometry['totalSectors'] * bytesPerSector,
+                                 geometry['filesystem'], geometry['serial'],
+                                 geometry['label'], evidence))
+   return volumes
+
+def buildTable(volumes):
+   '''Volumes that do not start inside an earlier one,
+   preferring those with the most evidence.'''
+   table=[]
+   for volume in sorted(volumes, key=lambda v: (v.start, -len(v.evidence))):
+      if table and volume.start < table[-1].end():
+         continue
+      table.append(volume)
+   return table
+
+def mbrSector(table):
+   '''A MBR with (up to four of) the volumes as primary
+   partitions using LBA only addressing.'''
+   sector=bytearray(SECTOR_SIZE)
+   for i, volume in enumerate(table[:4]):
+      struct.pack_into('<B3sB3sLL', sector, 446 + 16*i, 0, b'\xFE\xFF\xFF',
+                       MBR_CODES.get(volume.filesystem, 0x07), b'\xFE\xFF\xFF',
+                       volume.startSector(), min(volume.sectors(), 0xFFFFFFFF))
+   sector[510:512]=b'\x55\xAA'
+   return bytes(sector)
+
+def main():
+   parser=optparse.OptionParser()
+   parser.add_option("-f", "--file", dest="filename",
+               help="image filename")
+   parser.add_option('-p', '--processes', dest='processes',
+               help='number of scanning processes (default one per CPU)')
+   parser.add_option('-a', '--all', dest='all', action='store_true',
+               help='list every volume found, including ones inside others')
+   parser.add_option('-w', '--write-mbr', dest='mbrFile',
+               help='write a MBR with the reconstructed table to this file')
+
+   (options, args)=parser.parse_args()
+   if not options.filename:
+      print('Sorry, this script requires an image file')
+      return -1
+   processes=int(options.processes) if options.processes else None
+   found=scanImage(options.filename, processes)
+   ntfsSectors={}
+   fatSectors={}
+   for offset, sector in found:
+      if filesystemType(sector)=='NTFS':
+         ntfsSectors[offset]=sector
+      else:
+         fatSectors[offset]=sector
+
+   fd=os.open(options.filename, os.O_RDONLY)
+   try:
+      volumes=ntfsVolumes(ntfsSectors, fd) + fatVolumes(fatSectors, fd)
+   finally:
+      os.close(fd)
+   imageSize=os.path.getsize(options.filename)
+   table=buildTable(volumes)
+
+   # volumes the existing partition table already knows about
+   volumeSystem=openVolumeSystem(options.filename)
+   known=set([p.offset() for p in volumeSystem.volumes()])
+   print('Partition table:', volumeSystem.scheme())
+   print('Number;Type;StartSector;Sectors;Filesystem;Serial;Label;InTable;Evidence')
+   listed=volumes if options.all else table
+   for volume in sorted(listed, key=lambda v: v.start):
+      number=table.index(volume) + 1 if volume in table else ''
+      evidence=list(volume.evidence)
+      if volume.end() > imageSize:
+         evidence.append('truncated')
+      print(number, '"'+MBR_TYPES.get(MBR_CODES.get(volume.filesystem, 0x07))+'"',
+            volume.startSector(), volume.sectors(), volume.filesystem, volume.serial,
+            '"'+volume.label+'"', volume.start in known, '"'+', '.join(evidence)+'"', sep=';')
+   if options.mbrFile:
+      if len(table) > 4:
+         print('Only the first four volumes fit in a MBR')
+      with open(options.mbrFile, 'wb') as f:
+         f.write(mbrSector(table))
+
+if __name__=='__main__':
+   main()
@@ -0,0 +1,99 @@
+#!/usr/bin/python3
+'''Simple script to carve attributes from the slack
+of MFT records.  Bytes after the end marker are not
+cleared when a record shrinks or is reused, so old
+$FILE_NAME, $STANDARD_INFORMATION and small resident
+$DATA attributes are often still there.  The MFT is
+read once in bulk and every record's slack is checked
+as it goes by.  Resident data can be saved with -d.
+Create by Dr. Phil Polstra (@ppolstra)
+for PentesterAcademy.com.'''
+
+from mft import *
+import optparse
+import os
+from vbr import Vbr
+from volumes import volumeOffset, addPartitionOption
+from mftreader import MftReader
+from filetime import FileTimeFormatter
+
+formatter=FileTimeFormatter()
+
+def printHeader():
+   '''Prints the header listing columns.'''
+   print('MftEntry;UpdateSequence;InUse;Offset;Type;Resident;Name;Details')
+
+def details(attr):
+   '''Short description of a carved attribute.'''
+   attrType=attr.attributeType()
+   if attrType==0x30:
+      return ('parent ' + str(attr.parentMft()) + '/' + str(attr.parentSequenceNumber()) +
+              ' created ' + formatter.dateTime(attr.creationFileTime()) +
+              ' modified ' + formatter.dateTime(attr.modificationFileTime()) +
+              ' size ' + str(attr.logicalSize()))
+   if attrType==0x10:
+      return ('created ' + formatter.dateTime(attr.creationFileTime()) +
+              ' modified ' + formatter.dateTime(attr.modificationFileTime()) +
+              ' changed ' + formatter.dateTime(attr.recordChangeFileTime()) +
+              ' accessed ' + formatter.dateTime(attr.accessFileTime()))
+   if not attr.isResident():
+      runs=attr.dataRuns()
+      first=runs[0].startingCluster() if runs else ''
+      return ('size ' + str(attr.logicalSize()) + ' first LCN ' + str(first) +
+              ' clusters ' + str(sum([r.numberOfClusters() for r in runs])))
+   return 'bytes ' + str(attr.attributeLength())
+
+def main():
+   parser=optparse.OptionParser()
+   parser.add_option("-f", "--file", dest="filename",
+               help="image filename")
+   parser.add_option("-o", "--offset", dest='offset',
+               help='offset in sectors to start of volume')
+   addPartitionOption(parser)
+   parser.add_option('-m', '--mft', dest='mftFile',
+               help='MFT file')
+   parser.add_option('-d', '--dir', dest='outDir',
+               help='save carved resident $DATA in this directory')
+
+   (options, args)=parser.parse_args()
+   if options.mftFile:
+      reader=MftReader(mftFilename=options.mftFile)
+   elif options.filename:
+      try:
+         offset=volumeOffset(options.filename, options.offset, options.partition)
+      except ValueError as e:
+         print(e)
+         return -1
+      with open(options.filename, 'rb') as f:
+         f.seek(offset)
+         vbr=Vbr(f.read(512))
+      reader=MftReader(imageFilename=options.filename, vbr=vbr)
+   else:
+      print('Sorry, this script requires an MFT file or an image file')
+      return -1
+   if options.outDir and not os.path.isdir(options.outDir):
+      os.makedirs(options.outDir)
+
+   printHeader()
+   for number, status, buffer in reader.records():
+      # torn records are carved too, their slack is as good as any
+      if status!=FIXUP_OK and status!=FIXUP_TORN:
+         continue
+      header=MftHeader(buffer)
+      for pos, attr in slackAttributes(buffer):
+         name=''
+         if attr.attributeType()==0x30:
+            name=attr.filename()
+         elif attr.hasName():
+            name=attr.nameString()
+         print(number, header.sequenceNumber(), header.inUse(), pos,
+               '%02X' % attr.attributeType(), attr.isResident(),
+               '"'+name+'"', details(attr), sep=';')
+         if (options.outDir and attr.attributeType()==0x80
+               and attr.isResident() and attr.data()):
+            outName=os.path.join(options.outDir, str(number) + '-' + str(pos) + '.bin')
+            with open(outName, 'wb') as f:
+               f.write(attr.data())
+
+if __name__=='__main__':
+   main()
@@ -0,0 +1,215 @@
+#!/usr/bin/python3
+'''Simple script to find files whose timestamps
+have probably been altered (timestomped).  The
+four $STANDARD_INFORMATION and $FILE_NAME times
+of every entry are collected into compact arrays
+in one pass over the MFT and the rules are then
+applied to whole columns at once with NumPy, or to
+each entry in turn if NumPy is not installed.  A
+modification time before the creation time is only
+listed in the Notes column since every copied file
+has one.
+Create by Dr. Phil Polstra (@ppolstra)
+for PentesterAcademy.com.'''
+
+from mft import *
+import optparse
+import time
+from array import array
+try:
+   import numpy
+except ImportError:
+   numpy=None
+from vbr import Vbr
+from volumes import volumeOffset, addPartitionOption
+from mftreader import MftReader
+from paths import PathResolver, bestFilename
+from filetime import FileTimeFormatter, EPOCH_AS_FILETIME
+
+# column order used for the timestamp matrices
+CREATE, MODIFY, CHANGE, ACCESS=range(4)
+TICKS_PER_SECOND=10000000
+
+def printHeader():
+   '''Prints the header listing columns.'''
+   print('MftEntry;UpdateSequence;InUse;Rules;Notes;SICreate;FNCreate;'
+         'SIModify;FNModify;SIRecordChange;FNRecordChange;Path')
+
+def collectTimes(reader, resolver, deleted=False):
+   '''One pass over the MFT.  Returns (entries, sequences,
+   inUse, si, fn) arrays.  si and fn hold four times per
+   entry: creation, modification, record change and
+   access.  Entries without both attributes are left out.'''
+   entries=array('Q')
+   sequences=array('H')
+   inUse=array('B')
+   si=array('Q')
+   fn=array('Q')
+   for number, mftEntry in reader.entries():
+      resolver.addEntry(number, mftEntry)
+      if mftEntry.baseFileMft()!=0:
+         continue
+      if not mftEntry.inUse() and not deleted:
+         continue
+      siAttrs=mftEntry.attributesOfType(0x10)
+      fnameAttr=bestFilename(mftEntry)
+      if len(siAttrs)==0 or fnameAttr==None:
+         continue
+      siAttr=siAttrs[0]
+      entries.append(number)
+      sequences.append(mftEntry.sequenceNumber())
+      inUse.append(1 if mftEntry.inUse() else 0)
+      si.extend((siAttr.creationFileTime(), siAttr.modificationFileTime(),
+                 siAttr.recordChangeFileTime(), siAttr.accessFileTime()))
+      fn.extend((fnameAttr.creationFileTime(), fnameAttr.modificationFileTime(),
+                 fnameAttr.recordChangeFileTime(), fnameAttr.accessFileTime()))
+   return (entries, sequences, inUse, si, fn)
+
+def checkRules(si, fn, volumeCreated, now):
+   '''Names of the timestomping rules one entry breaks.
+   si and fn are its four times.'''
+   hits=[]
+   # SI times are easy to set, FN times are not so a file
+   # created before its own FN creation was likely backdated
+   if si[CREATE] and si[CREATE] < fn[CREATE]:
+      hits.append('SICreateBeforeFN')
+   # many tools only set whole seconds
+   if (si[CREATE] and si[MODIFY] and si[CREATE] % TICKS_PER_SECOND==0 and
+         si[MODIFY] % TICKS_PER_SECOND==0):
+      hits.append('SIZeroFraction')
+   if si[CHANGE] and si[CHANGE] < si[CREATE]:
+      hits.append('SIChangeBeforeCreate')
+   if si[CREATE] and si[CREATE] < volumeCreated:
+      hits.append('SICreateBeforeVolume')
+   if max(si) > now:
+      hits.append('SIInFuture')
+   return hits
+
+def checkNotes(si, fn):
+   '''Things worth knowing that are not timestomping on
+   their own.  A copied file keeps its modification time
+   and gets a new creation time so both of these are
+   normal for copies.'''
+   notes=[]
+   if si[MODIFY] < si[CREATE]:
+      notes.append('SIModifyBeforeCreate')
+   if si[MODIFY] and si[MODIFY] < fn[MODIFY]:
+      notes.append('SIModifyBeforeFN')
+   return notes
+
+RULES=('SICreateBeforeFN', 'SIZeroFraction', 'SIChangeBeforeCreate',
+       'SICreateBeforeVolume', 'SIInFuture')
+
+def applyRules(si, fn, volumeCreated, now):
+   '''NumPy version of checkRules().  si and fn are Nx4
+   uint64 arrays.  Returns a dictionary of rule name to
+   boolean column, every rule is a whole array expression.'''
+   present=(si!=0)
+   fraction=(si % TICKS_PER_SECOND)==0
+   return {
+      'SICreateBeforeFN': present[:, CREATE] & (si[:, CREATE] < fn[:, CREATE]),
+      'SIZeroFraction': (present[:, CREATE] & present[:, MODIFY] &
+                         fraction[:, CREATE] & fraction[:, MODIFY]),
+      'SIChangeBeforeCreate': present[:, CHANGE] & (si[:, CHANGE] < si[:, CREATE]),
+      'SICreateBeforeVolume': present[:, CREATE] & (si[:, CREATE] < volumeCreated),
+      'SIInFuture': (si > now).any(axis=1),
+   }
+
+def flaggedEntries(entries, si, fn, volumeCreated, now, wanted, system=False):
+   '''Generator that yields (index, rule names) for every
+   entry breaking one of the wanted rules.  System files
+   are left out unless system is set.'''
+   if numpy:
+      # unsigned so FILETIMEs with the top bit set still compare as huge
+      numbers=numpy.frombuffer(entries, dtype=numpy.uint64)
+      rules=applyRules(numpy.frombuffer(si, dtype=numpy.uint64).reshape(-1, 4),
+                       numpy.frombuffer(fn, dtype=numpy.uint64).reshape(-1, 4),
+                       volumeCreated, now)
+      rules=[(name, rules[name]) for name in RULES if name in wanted]
+      flagged=numpy.zeros(len(entries), dtype=bool)
+      for name, hits in rules:
+         flagged|=hits
+      if not system:
+         flagged&=numbers >= 16
+      for i in numpy.flatnonzero(flagged):
+         yield (int(i), [name for name, hits in rules if hits[i]])
+      return
+   for i in range(len(entries)):
+      if not system and entries[i] < 16:
+         continue
+      names=[name for name in checkRules(si[4*i:4*i+4], fn[4*i:4*i+4], volumeCreated, now)
+             if name in wanted]
+      if names:
+         yield (i, names)
+
+def main():
+   parser=optparse.OptionParser()
+   parser.add_option("-f", "--file", dest="filename",
+               help="image filename")
+   parser.add_option("-o", "--offset", dest='offset',
+               help='offset in sectors to start of volume')
+   addPartitionOption(parser)
+   parser.add_option('-m', '--mft', dest='mftFile',
+               help='MFT file')
+   parser.add_option('-D', '--deleted', dest='deleted', action='store_true',
+               help='include entries that are not in use')
+   parser.add_option('-r', '--rules', dest='rules',
+               help='comma separated list of rules to report (default all)')
+   parser.add_option('-s', '--system', dest='system', action='store_true',
+               help='include the NTFS system files and $Extend')
+   parser.add_option('-p', '--precise', dest='precise', action='store_true',
+               help='print times with 100ns precision')
+
+   (options, args)=parser.parse_args()
+   if options.mftFile:
+      reader=MftReader(mftFilename=options.mftFile)
+   elif options.filename:
+      try:
+         offset=volumeOffset(options.filename, options.offset, options.partition)
+      except ValueError as e:
+         print(e)
+         return -1
+      with open(options.filename, 'rb') as f:
+         f.seek(offset)
+         vbr=Vbr(f.read(512))
+      reader=MftReader(imageFilename=options.filename, vbr=vbr)
+   else:
+      print('Sorry, this script requires an MFT file or an image file')
+      return -1
+
+   wanted=RULES
+   if options.rules:
+      wanted=options.rules.split(',')
+      for name in wanted:
+         if name not in RULES:
+            print('Unknown rule', name, 'choose from', ','.join(RULES))
+            return -1
+
+   resolver=PathResolver()
+   entries, sequences, inUse, si, fn=collectTimes(reader, resolver, options.deleted)
+   if len(entries)==0:
+      return
+   # $MFT is created when the volume is formatted
+   volumeCreated=0
+   if entries[0]==0:
+      volumeCreated=si[CREATE]
+   now=int(time.time()) * TICKS_PER_SECOND + EPOCH_AS_FILETIME
+
+   formatter=FileTimeFormatter()
+   printHeader()
+   for i, names in flaggedEntries(entries, si, fn, volumeCreated, now, wanted,
+                                  options.system):
+      siTimes=si[4*i:4*i+4]
+      fnTimes=fn[4*i:4*i+4]
+      path=resolver.path(entries[i])
+      if not options.system and path.startswith('/$Extend/'):
+         continue
+      times=[formatter.dateTime(t, options.precise) for t in
+             (siTimes[CREATE], fnTimes[CREATE], siTimes[MODIFY], fnTimes[MODIFY],
+              siTimes[CHANGE], fnTimes[CHANGE])]
+      print(';'.join([str(entries[i]), str(sequences[i]), str(bool(inUse[i])),
+                      '|'.join(names), '|'.join(checkNotes(siTimes, fnTimes))] +
+                     times + ['"'+path+'"']))
+
+if __name__=='__main__':
+   main()
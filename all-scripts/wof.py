@@ -0,0 +1,448 @@
+#!/usr/bin/python3
+
+'''Decompression of files compressed by the Windows
+Overlay Filter (WOF).  Windows 10 compresses many
+system files this way: the file is a reparse point
+with tag 0x80000017, the unnamed $DATA stream is
+sparse and the compressed data is kept in the
+WofCompressedData stream.  That stream starts with a
+table of chunk end offsets followed by the chunks,
+each compressed on its own with XPRESS Huffman (4K,
+8K or 16K chunks) or LZX (32K chunks).  A chunk whose
+compressed size equals its real size is stored as is.
+
+Since every chunk stands alone, large reads are split
+across a pool of worker processes.
+Created by Dr. Phil Polstra
+for PentesterAcademy.com'''
+
+__all__=['WofDecoder', 'decompressXpressHuffman', 'decompressLzx',
+	'WOF_CHUNK_SIZES', 'setWorkers']
+
+import os
+import sys
+import struct
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# chunk size for each algorithm number in the reparse data
+WOF_CHUNK_SIZES={0:4096, 1:32768, 2:8192, 3:16384}
+WOF_LZX=1
+
+# chunks decompressed in the calling process when fewer
+# than this many are wanted, the pool is not worth it
+MIN_PARALLEL_CHUNKS=8
+
+_pool=None
+_workers=None
+_poolLock=threading.Lock()
+
+def setWorkers(workers):
+	'''Sets the number of decompression processes.  0 or
+	1 decompresses everything in the calling process.'''
+	global _pool, _workers
+	if _pool!=None:
+		_pool.shutdown()
+		_pool=None
+	_workers=workers
+
+def _getPool():
+	'''The pool is started on first use, which may be in
+	one of the hash-files.py threads.  Forking a process
+	with live threads can deadlock the children so the
+	workers come from a forkserver (spawn where there is
+	none).'''
+	global _pool
+	with _poolLock:
+		if _pool==None:
+			workers=_workers if _workers!=None else (os.cpu_count() or 1)
+			if workers > 1:
+				method=('forkserver' if 'forkserver' in multiprocessing.get_all_start_methods()
+					else 'spawn')
+				_pool=ProcessPoolExecutor(max_workers=workers,
+					mp_context=multiprocessing.get_context(method))
+	return _pool
+
+def _decodeTable(lengths):
+	'''Builds a lookup table for a canonical Huffman code.
+	Returns (table, bits) where table is indexed by the
+	next bits bits of input and holds symbol << 5 | length.
+	Codes are assigned in order of length then symbol.'''
+	bits=max(lengths) if lengths else 0
+	if bits==0:
+		return (None, 0)
+	table=[None] * (1 << bits)
+	code=0
+	lastLength=0
+	for length, symbol in sorted([(l, s) for s, l in enumerate(lengths) if l]):
+		code<<=length - lastLength
+		lastLength=length
+		if code >= (1 << length):
+			raise ValueError('Bad Huffman code lengths')
+		start=code << (bits - length)
+		end=(code + 1) << (bits - length)
+		table[start:end]=[(symbol << 5) | length] * (end - start)
+		code+=1
+	return (table, bits)
+
+def _copyMatch(out, offset, length):
+	start=len(out) - offset
+	if offset > len(out) or offset <= 0:
+		raise ValueError('Match offset before start of data')
+	if offset >= length:
+		out+=out[start:start+length]
+	else:
+		# overlapping match repeats the last offset bytes
+		pattern=out[start:]
+		out+=(pattern * (length // offset + 1))[:length]
+
+def _read16(data, pos):
+	if pos + 1 < len(data):
+		return data[pos] | (data[pos+1] << 8)
+	return 0
+
+def decompressXpressHuffman(data, size):
+	'''Decompresses LZXPRESS Huffman data (MS-XCA) to
+	size bytes.  Each 64K of output has its own table of
+	512 4-bit code lengths followed by a stream of 16-bit
+	little endian words read from the top bit down.'''
+	out=bytearray()
+	pos=0
+	while len(out) < size:
+		if pos + 260 > len(data):
+			raise ValueError('XPRESS data is truncated')
+		lengths=[]
+		for b in data[pos:pos+256]:
+			lengths.append(b & 0x0F)
+			lengths.append(b >> 4)
+		table, tableBits=_decodeTable(lengths)
+		if table==None:
+			raise ValueError('Empty XPRESS Huffman table')
+		pos+=256
+		bitBuf=(_read16(data, pos) << 16) | _read16(data, pos + 2)
+		pos+=4
+		# bits in bitBuf beyond the 16 that are always there
+		extra=16
+		blockEnd=min(size, len(out) + 65536)
+		while len(out) < blockEnd:
+			entry=table[bitBuf >> (32 - tableBits)]
+			if entry==None:
+				raise ValueError('Bad XPRESS Huffman code')
+			symbol=entry >> 5
+			n=entry & 0x1F
+			bitBuf=(bitBuf << n) & 0xFFFFFFFF
+			extra-=n
+			if extra < 0:
+				bitBuf|=_read16(data, pos) << -extra
+				extra+=16
+				pos+=2
+			if symbol < 256:
+				out.append(symbol)
+				continue
+			symbol-=256
+			length=symbol & 0x0F
+			offsetBits=symbol >> 4
+			if length==15:
+				if pos >= len(data):
+					raise ValueError('XPRESS data is truncated')
+				length=data[pos]
+				pos+=1
+				if length==255:
+					length=_read16(data, pos)
+					pos+=2
+					if length==0:
+						length=struct.unpack_from('<L', data, pos)[0]
+						pos+=4
+					if length < 15:
+						raise ValueError('Bad XPRESS match length')
+					length-=15
+				length+=15
+			length+=3
+			offset=1 << offsetBits
+			if offsetBits:
+				offset|=bitBuf >> (32 - offsetBits)
+				bitBuf=(bitBuf << offsetBits) & 0xFFFFFFFF
+				extra-=offsetBits
+				if extra < 0:
+					bitBuf|=_read16(data, pos) << -extra
+					extra+=16
+					pos+=2
+			_copyMatch(out, offset, min(length, size - len(out)))
+	return bytes(out[:size])
+
+# LZX as used by WIM and WOF: 32K window, 30 offset slots
+LZX_NUM_CHARS=256
+LZX_OFFSET_SLOTS=30
+LZX_MAIN_SYMBOLS=LZX_NUM_CHARS + 8 * LZX_OFFSET_SLOTS
+LZX_LENGTH_SYMBOLS=249
+LZX_PRETREE_SYMBOLS=20
+LZX_DEFAULT_BLOCK_SIZE=32768
+LZX_E8_FILESIZE=12000000
+LZX_VERBATIM=1
+LZX_ALIGNED=2
+LZX_UNCOMPRESSED=3
+
+LZX_FOOTER_BITS=[max(0, slot // 2 - 1) for slot in range(LZX_OFFSET_SLOTS)]
+LZX_OFFSET_BASE=[0]
+for _bits in LZX_FOOTER_BITS[:-1]:
+	LZX_OFFSET_BASE.append(LZX_OFFSET_BASE[-1] + (1 << _bits))
+
+class _LzxBits:
+	'''Bit reader for LZX.  Input is 16-bit little endian
+	words read from the top bit down.  Reads past the end
+	return zeroes.'''
+	def __init__(self, data):
+		self._data=data
+		self._pos=0
+		self._bitBuf=0
+		self._bitsLeft=0
+
+	def _ensure(self, n):
+		while self._bitsLeft < n:
+			self._bitBuf=(self._bitBuf << 16) | _read16(self._data, self._pos)
+			self._pos+=2
+			self._bitsLeft+=16
+
+	def read(self, n):
+		if n==0:
+			return 0
+		self._ensure(n)
+		self._bitsLeft-=n
+		value=self._bitBuf >> self._bitsLeft
+		self._bitBuf&=(1 << self._bitsLeft) - 1
+		return value
+
+	def decode(self, tree):
+		table, bits=tree
+		if table==None:
+			raise ValueError('LZX symbol from an empty tree')
+		self._ensure(bits)
+		entry=table[self._bitBuf >> (self._bitsLeft - bits)]
+		if entry==None:
+			raise ValueError('Bad LZX Huffman code')
+		self._bitsLeft-=entry & 0x1F
+		self._bitBuf&=(1 << self._bitsLeft) - 1
+		return entry >> 5
+
+	def align(self):
+		'''Skips the 1 to 16 bits of padding before the
+		header of an uncompressed block.'''
+		if self._bitsLeft % 16==0:
+			self._ensure(16)
+			self._bitsLeft-=16
+		else:
+			self._bitsLeft-=self._bitsLeft % 16
+		# give back whole words that were read ahead
+		self._pos-=self._bitsLeft // 8
+		self._bitBuf=0
+		self._bitsLeft=0
+
+	def readBytes(self, n):
+		data=self._data[self._pos:self._pos+n]
+		if len(data) < n:
+			raise ValueError('LZX data is truncated')
+		self._pos+=n
+		return data
+
+def _readLengths(bits, lengths, start, end):
+	'''Reads code lengths start..end-1 coded as changes
+	from the previous block with a pretree.'''
+	pretree=_decodeTable([bits.read(4) for i in range(LZX_PRETREE_SYMBOLS)])
+	i=start
+	while i < end:
+		symbol=bits.decode(pretree)
+		if symbol <= 16:
+			lengths[i]=(lengths[i] - symbol) % 17
+			i+=1
+			continue
+		if symbol==17:
+			count=4 + bits.read(4)
+			value=0
+		elif symbol==18:
+			count=20 + bits.read(5)
+			value=0
+		else:
+			count=4 + bits.read(1)
+			value=(lengths[i] - bits.decode(pretree)) % 17
+		count=min(count, end - i)
+		lengths[i:i+count]=[value] * count
+		i+=count
+
+def _undoE8(out):
+	'''Reverses the translation of x86 CALL targets
+	to absolute addresses done before compression.'''
+	end=len(out) - 10
+	i=out.find(0xE8, 0, end) if end > 0 else -1
+	while i >= 0:
+		absOffset=struct.unpack_from('<l', out, i + 1)[0]
+		if -i <= absOffset < LZX_E8_FILESIZE:
+			if absOffset >= 0:
+				relOffset=absOffset - i
+			else:
+				relOffset=absOffset + LZX_E8_FILESIZE
+			struct.pack_into('<l', out, i + 1, relOffset)
+		i=out.find(0xE8, i + 5, end)
+
+def decompressLzx(data, size):
+	'''Decompresses one WIM style LZX chunk to size bytes.'''
+	bits=_LzxBits(data)
+	out=bytearray()
+	mainLengths=[0] * LZX_MAIN_SYMBOLS
+	lengthLengths=[0] * LZX_LENGTH_SYMBOLS
+	recent=[1, 1, 1]
+	while len(out) < size:
+		blockType=bits.read(3)
+		if bits.read(1):
+			blockSize=LZX_DEFAULT_BLOCK_SIZE
+		else:
+			blockSize=bits.read(16)
+		if blockSize==0:
+			raise ValueError('Empty LZX block')
+		blockEnd=min(size, len(out) + blockSize)
+		if blockType==LZX_UNCOMPRESSED:
+			bits.align()
+			recent=list(struct.unpack('<LLL', bits.readBytes(12)))
+			out+=bits.readBytes(blockEnd - len(out))
+			if blockSize % 2:
+				bits.readBytes(1)
+			continue
+		if blockType not in (LZX_VERBATIM, LZX_ALIGNED):
+			raise ValueError('Bad LZX block type ' + str(blockType))
+		alignedTree=None
+		if blockType==LZX_ALIGNED:
+			alignedTree=_decodeTable([bits.read(3) for i in range(8)])
+		_readLengths(bits, mainLengths, 0, LZX_NUM_CHARS)
+		_readLengths(bits, mainLengths, LZX_NUM_CHARS, LZX_MAIN_SYMBOLS)
+		mainTree=_decodeTable(mainLengths)
+		_readLengths(bits, lengthLengths, 0, LZX_LENGTH_SYMBOLS)
+		lengthTree=_decodeTable(lengthLengths)
+		while len(out) < blockEnd:
+			symbol=bits.decode(mainTree)
+			if symbol < LZX_NUM_CHARS:
+				out.append(symbol)
+				continue
+			symbol-=LZX_NUM_CHARS
+			length=symbol & 7
+			slot=symbol >> 3
+			if length==7:
+				length+=bits.decode(lengthTree)
+			length+=2
+			if slot < 3:
+				# one of the three most recent offsets
+				offset=recent[slot]
+				recent[slot]=recent[0]
+				recent[0]=offset
+			else:
+				footerBits=LZX_FOOTER_BITS[slot]
+				if alignedTree and footerBits >= 3:
+					offset=(LZX_OFFSET_BASE[slot] + (bits.read(footerBits - 3) << 3) +
+						bits.decode(alignedTree))
+				else:
+					offset=LZX_OFFSET_BASE[slot] + bits.read(footerBits)
+				offset-=2
+				recent[2]=recent[1]
+				recent[1]=recent[0]
+				recent[0]=offset
+			_copyMatch(out, offset, min(length, blockEnd - len(out)))
+	_undoE8(out)
+	return bytes(out[:size])
+
+def _decompressChunk(job):
+	'''Decompresses one chunk.  Module level so it can be
+	run in a worker process.  Returns (data, ok); bad
+	chunks come back as zeroes.'''
+	algorithm, data, size=job
+	if len(data)==size:
+		return (data, True)
+	try:
+		if algorithm==WOF_LZX:
+			return (decompressLzx(data, size), True)
+		return (decompressXpressHuffman(data, size), True)
+	except (ValueError, IndexError, struct.error):
+		return (b'\x00' * size, False)
+
+class WofDecoder:
+	'''Random access to the uncompressed contents of a
+	WOF file.  compressed is a file-like object for the
+	WofCompressedData stream (a StreamReader), size is
+	the size of the unnamed stream and algorithm comes
+	from the reparse data.  The last chunks decompressed
+	are kept so sequential reads only decompress each
+	chunk once.'''
+	def __init__(self, compressed, size, algorithm):
+		if algorithm not in WOF_CHUNK_SIZES:
+			raise ValueError('Unknown WOF algorithm ' + str(algorithm))
+		self._compressed=compressed
+		self._size=size
+		self._algorithm=algorithm
+		self._chunkSize=WOF_CHUNK_SIZES[algorithm]
+		self._badChunks=0
+		# cache of (first byte, data)
+		self._cached=(0, b'')
+		chunks=(size + self._chunkSize - 1) // self._chunkSize
+		entrySize=8 if size > 0xFFFFFFFF else 4
+		compressed.seek(0)
+		tableSize=entrySize * max(0, chunks - 1)
+		table=compressed.read(tableSize)
+		# a short table leaves the missing chunks empty so
+		# they are reported as bad rather than failing
+		table=table[:len(table) - len(table) % entrySize]
+		table+=(table[-entrySize:] or bytes(entrySize)) * ((tableSize - len(table)) // entrySize)
+		tableStart=tableSize
+		ends=struct.unpack('<%d%s' % (max(0, chunks - 1), 'Q' if entrySize==8 else 'L'), table)
+		# offsets of each chunk in the stream, plus its end
+		self._offsets=[tableStart] + [tableStart + e for e in ends]
+		self._offsets.append(None)
+
+	def size(self):
+		return self._size
+
+	def badChunks(self):
+		'''Number of chunks that could not be decompressed
+		and were replaced with zeroes.'''
+		return self._badChunks
+
+	def _chunks(self, first, last):
+		'''Decompresses chunks first..last-1.'''
+		self._compressed.seek(self._offsets[first])
+		if self._offsets[last]==None:
+			raw=self._compressed.read()
+		else:
+			raw=self._compressed.read(max(0, self._offsets[last] - self._offsets[first]))
+		jobs=[]
+		for i in range(first, last):
+			start=self._offsets[i] - self._offsets[first]
+			end=len(raw) if self._offsets[i+1]==None else self._offsets[i+1] - self._offsets[first]
+			size=min(self._chunkSize, self._size - i * self._chunkSize)
+			jobs.append((self._algorithm, raw[start:end], size))
+		pool=_getPool() if len(jobs) >= MIN_PARALLEL_CHUNKS else None
+		if pool:
+			results=pool.map(_decompressChunk, jobs, chunksize=max(1, len(jobs) // 16))
+		else:
+			results=map(_decompressChunk, jobs)
+		parts=[]
+		for data, ok in results:
+			if not ok:
+				self._badChunks+=1
+			parts.append(data)
+		return b''.join(parts)
+
+	def read(self, pos, size):
+		'''Returns up to size bytes at pos.'''
+		end=min(pos + size, self._size)
+		if pos >= end:
+			return b''
+		start, data=self._cached
+		if start <= pos and end <= start + len(data):
+			return data[pos-start:end-start]
+		first=pos // self._chunkSize
+		last=(end + self._chunkSize - 1) // self._chunkSize
+		bad=self._badChunks
+		data=self._chunks(first, last)
+		if self._badChunks > bad:
+			sys.stderr.write('Warning: %d WOF chunks could not be decompressed\n' %
+				(self._badChunks - bad))
+		self._cached=(first * self._chunkSize, data)
+		start=first * self._chunkSize
+		return data[pos-start:end-start]